@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""Planilha falsa em memória com a interface do gspread usada pelo app.
+
+Permite rodar GoogleSheetsBackend, IncrementalSheetSync e a fila de escrita
+sem rede. `latency` simula o tempo de ida e volta de cada chamada à API;
+`quota_per_min` responde 429 acima da cota (janela deslizante de 60 s, como a
+API) e `error_rate` sorteia 503, para exercitar o controle de cota offline.
+"""
+
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+
+import requests
+from gspread.exceptions import APIError
+from gspread.utils import a1_range_to_grid_range
+
+def api_error(status, message='', retry_after=None):
+    """APIError do gspread com a resposta HTTP que a API devolveria"""
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps({'error': {'code': status, 'message': message,
+                                              'status': 'RESOURCE_EXHAUSTED' if status == 429 else 'UNAVAILABLE'}}).encode()
+    if retry_after is not None:
+        response.headers['Retry-After'] = str(retry_after)
+    return APIError(response)
+
+class FakeWorksheet:
+    """Aba do Google Sheets guardada como lista de linhas (linha física 1 = cabeçalho)"""
+
+    def __init__(self, values, latency=0.0, title='solardaily', quota_per_min=None, error_rate=0.0,
+                 seed=0, clock=time.monotonic):
+        self.values = [list(row) for row in values]
+        self.latency = latency
+        self.title = title
+        self.quota_per_min = quota_per_min
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self.rejected = Counter()     # chamadas recusadas: 429 (cota) e 503 (erro sorteado)
+        self._recent = deque()        # instantes das chamadas aceitas no último minuto
+        self._rng = random.Random(seed)
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def _call(self, name):
+        self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            if self.quota_per_min is not None:
+                now = self._clock()
+                while self._recent and now - self._recent[0] >= 60:
+                    self._recent.popleft()
+                if len(self._recent) >= self.quota_per_min:
+                    self.rejected[429] += 1
+                    raise api_error(429, "Quota exceeded for quota metric 'Read requests'",
+                                    retry_after=int(60 - (now - self._recent[0])) + 1 if self._recent else 60)
+                self._recent.append(now)
+            if self.error_rate and self._rng.random() < self.error_rate:
+                self.rejected[503] += 1
+                raise api_error(503, "The service is currently unavailable.")
+
+    def _grid(self, range_name):
+        grid = a1_range_to_grid_range(range_name)
+        start = grid.get('startRowIndex', 0)
+        end = grid.get('endRowIndex', len(self.values))
+        return start, end, grid.get('startColumnIndex', 0), grid.get('endColumnIndex')
+
+    def row_values(self, row):
+        self._call('row_values')
+        with self._lock:
+            return list(self.values[row - 1]) if row <= len(self.values) else []
+
+    def get_all_values(self):
+        self._call('get_all_values')
+        with self._lock:
+            return [list(row) for row in self.values]
+
+    def get(self, range_name):
+        self._call('get')
+        start, end, c0, c1 = self._grid(range_name)
+        with self._lock:
+            return [list(row[c0:c1]) for row in self.values[start:end]]
+
+    def batch_get(self, ranges):
+        self._call('batch_get')
+        result = []
+        with self._lock:
+            for range_name in ranges:
+                start, end, c0, c1 = self._grid(range_name)
+                block = [list(row[c0:c1]) for row in self.values[start:end]]
+                while block and not block[-1]:     # como a API: só as linhas vazias do fim somem
+                    block.pop()
+                result.append(block)
+        return result
+
+    def append_rows(self, rows, value_input_option=None):
+        self._call('append_rows')
+        with self._lock:
+            self.values.extend(list(row) for row in rows)
+
+    def _write(self, range_name, values):
+        start, _, c0, _ = self._grid(range_name)
+        for i, row in enumerate(values):
+            while len(self.values) <= start + i:
+                self.values.append([])
+            target = self.values[start + i]
+            target.extend([''] * (c0 + len(row) - len(target)))
+            target[c0:c0 + len(row)] = row
+
+    def update(self, range_name=None, values=None, value_input_option=None):
+        self._call('update')
+        with self._lock:
+            self._write(range_name, values)
+
+    def batch_update(self, data, value_input_option=None):
+        self._call('batch_update')
+        with self._lock:
+            for item in data:
+                self._write(item['range'], item['values'])
+
+    def delete_rows(self, start, end=None):
+        self._call('delete_rows')
+        end = start if end is None else end
+        with self._lock:
+            del self.values[start - 1:end]
+
+class FakeSpreadsheet:
+    def __init__(self, worksheets):
+        self._worksheets = {ws.title: ws for ws in worksheets}
+
+    def worksheet(self, title):
+        return self._worksheets[title]
+
+class FakeClient:
+    """Substitui o cliente gspread: open_by_key devolve planilhas em memória"""
+
+    def __init__(self, spreadsheets):
+        self._spreadsheets = spreadsheets
+
+    def open_by_key(self, key):
+        return self._spreadsheets[key]
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks dos caminhos quentes do SolarAnalytics, sem rede e sem Streamlit.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/run.py                      # compara com benchmarks/baseline.json
+    python benchmarks/run.py --anos 10,50 --casos carga,heatmap
+    python benchmarks/run.py --salvar             # grava os resultados como nova baseline
+    python benchmarks/run.py --verificar          # sai com erro se algum caso regredir
+
+Cada caso reporta a mediana e o mínimo de várias repetições e o pico de memória
+alocada (tracemalloc, numa execução separada para não distorcer o tempo).
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import pandas as pd
+
+from solar_core import (
+    GoogleSheetsBackend, IncrementalSheetSync, RollupCube, calendar_grid, filtrar_periodo, parse_sheet_values,
+    projetar_cenarios, sensibilidade_payback, pools_mensais, simular_caminhos_geracao, faixas_monte_carlo,
+    export_chunks, write_export, iter_import_chunks, planejar_importacao,
+    parse_intraday_values, integrar_diario, curva_intraday,
+)
+from solar_charts import CHART_BUILDERS
+from benchmarks.fake_sheet import FakeWorksheet
+from benchmarks.synthetic import gerar_diario, gerar_frota, gerar_intraday
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+FINANCEIRO = dict(tarifa_cheia=0.9555, tarifa_fio_b=0.49, simultaneidade_percent=30,
+                  investimento=15000.0, degradacao=0.005, ano_inicio=2025,
+                  reajuste_tarifa=0.05)
+
+def carregar(rows, latency=0.0):
+    """Leitura completa e validação da planilha (o que load_data faz na primeira carga)"""
+    return IncrementalSheetSync(GoogleSheetsBackend(FakeWorksheet(rows, latency))).sync()
+
+def casos_por_tamanho(anos, args):
+    """Casos que dependem do tamanho do histórico; nome -> função sem argumentos"""
+    rows = gerar_diario(anos, seed=anos)
+    df = carregar(rows)
+    cube = RollupCube(df)
+    ultimo = max(cube.years)
+    mes = cube.month_list(ultimo)[-1]
+    anos_heatmap = tuple(sorted(cube.years)[-3:])
+
+    sheet = FakeWorksheet(rows)
+    incremental = IncrementalSheetSync(GoogleSheetsBackend(sheet))
+    incremental.sync()
+
+    def carga_incremental():
+        sheet.append_rows([[datetime(2100, 1, 1).strftime('%d/%m/%Y'), '10,0']])
+        incremental.sync()
+
+    def graficos():
+        specs = [
+            CHART_BUILDERS['diario'](cube, ultimo, mes),
+            CHART_BUILDERS['acumulado_mes'](cube, ultimo, mes),
+            CHART_BUILDERS['acumulado_ano'](cube, ultimo),
+            CHART_BUILDERS['mensal'](cube, ultimo),
+            CHART_BUILDERS['heatmap'](cube, anos_heatmap),
+        ]
+        return [chart.to_dict() for chart in specs]
+
+    # Edição no lugar pelo índice data -> linha (conferência de uma linha, sem recarga completa)
+    editada = df['Data'].iloc[len(df) // 2].strftime('%d/%m/%Y')
+
+    def edicao_por_data():
+        incremental.write_batch(moves=[(editada, [editada, '12,5'])])
+        incremental.sync()
+
+    frota = gerar_frota(args.usinas, anos, seed=anos)
+
+    def carga_frota():
+        with ThreadPoolExecutor(max_workers=min(8, len(frota))) as pool:
+            return list(pool.map(lambda r: carregar(r, args.latencia / 1000), frota.values()))
+
+    # Arquivo de backfill com o histórico inteiro, comparado com a primeira metade já registrada
+    arquivo_csv = '\n'.join(';'.join(r) for r in rows).encode('utf-8')
+    metade = df.iloc[:len(df) // 2]
+
+    pools = pools_mensais(cube)
+    return {
+        'carga_completa': lambda: carregar(rows),
+        'carga_incremental': carga_incremental,
+        'edicao_por_data': edicao_por_data,
+        'importacao_csv': lambda: planejar_importacao(
+            iter_import_chunks(io.BytesIO(arquivo_csv), 'historico.csv'), metade),
+        'exportacao_diaria_csv': lambda: write_export(export_chunks(cube, 'Usina', 'diario'), io.BytesIO()),
+        'exportacao_diaria_parquet': lambda: write_export(export_chunks(cube, 'Usina', 'diario'), io.BytesIO(),
+                                                          'parquet'),
+        'filtro_ano': lambda: filtrar_periodo(df, datetime(ultimo, 1, 1), datetime(ultimo, 12, 31)),
+        'filtro_mes': lambda: cube.month_frame(ultimo, mes),
+        'cubo': lambda: RollupCube(df),
+        'resumo_mensal': lambda: [cube.monthly_summary(y) for y in cube.years],
+        'heatmap': lambda: calendar_grid(cube, anos_heatmap),
+        'graficos': graficos,
+        'monte_carlo_5k': lambda: faixas_monte_carlo(
+            simular_caminhos_geracao(pools, 5000, 25), **FINANCEIRO),
+        f'frota_{args.usinas}': carga_frota,
+    }
+
+def casos_fixos(args):
+    """Casos que não dependem do histórico"""
+    geracao = np.linspace(3000, 9000, 10000)
+    base = {'geracao_anual': 5500.0, 'tarifa_cheia': 0.9555, 'tarifa_fio_b': 0.49,
+            'simultaneidade_percent': 30.0, 'investimento': 15000.0}
+    diario = gerar_diario(50)
+    milhao = (diario[1:] * (1_000_000 // (len(diario) - 1) + 1))[:1_000_000]
+    casos = {
+        'parser_1m_linhas': lambda: parse_sheet_values(diario[0], milhao),
+        'projecao': lambda: projetar_cenarios(5500.0, **FINANCEIRO, taxa_desconto=0.08),
+        'projecao_10k_cenarios': lambda: projetar_cenarios(geracao, **FINANCEIRO, taxa_desconto=0.08),
+        'sensibilidade': lambda: sensibilidade_payback(base, 0.2, degradacao=0.005, ano_inicio=2025,
+                                                       reajuste_tarifa=0.05),
+    }
+    if args.intraday_dias:
+        leituras = gerar_intraday(args.intraday_dias)
+
+        def intraday_diario():
+            df, _ = parse_intraday_values(leituras[0], leituras[1:])
+            return integrar_diario(df['Instante'], df['Potência (kW)'])
+
+        casos[f'intraday_{args.intraday_dias}d'] = intraday_diario
+
+    # Curva de um ano de leituras de 5 min (~105 mil pontos) reduzida para o navegador
+    ano, _ = parse_intraday_values(*(lambda r: (r[0], r[1:]))(gerar_intraday(365)))
+    casos['intraday_lttb_1a'] = lambda: curva_intraday(ano['Instante'], ano['Potência (kW)'])
+    return casos
+
+def medir(fn, repeticoes):
+    fn()  # aquecimento (caches de layout, imports tardios)
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        fn()
+        tempos.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        fn()
+        pico = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'mediana_s': statistics.median(tempos), 'min_s': min(tempos), 'pico_bytes': pico}
+
+def carregar_baseline(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f).get('casos', {})
+    except (OSError, ValueError):
+        return {}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks dos caminhos quentes do SolarAnalytics")
+    parser.add_argument('--anos', default='10,50', help="tamanhos do histórico, em anos (padrão: %(default)s)")
+    parser.add_argument('--usinas', type=int, default=8, help="usinas no caso de frota (padrão: %(default)s)")
+    parser.add_argument('--latencia', type=float, default=0.0,
+                        help="latência simulada por chamada à planilha, em ms (padrão: %(default)s)")
+    parser.add_argument('--intraday-dias', type=int, default=30,
+                        help="dias de leituras de 5 min no caso intraday (0 desativa)")
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--casos', help="só os casos cujo nome contém um destes trechos (separados por vírgula)")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--salvar', action='store_true', help="grava os resultados como baseline")
+    parser.add_argument('--tolerancia', type=float, default=1.5,
+                        help="razão tempo/baseline acima da qual o caso conta como regressão")
+    parser.add_argument('--folga-ms', type=float, default=1.0,
+                        help="diferença absoluta mínima para contar como regressão (ruído em casos rápidos)")
+    parser.add_argument('--verificar', action='store_true', help="sai com código 1 se houver regressão")
+    args = parser.parse_args(argv)
+
+    filtros = [f for f in (args.casos or '').split(',') if f]
+    casos = {}
+    for anos in (int(a) for a in args.anos.split(',') if a):
+        for nome, fn in casos_por_tamanho(anos, args).items():
+            casos[f'{nome}[{anos}a]'] = fn
+    casos.update(casos_fixos(args))
+    if filtros:
+        casos = {nome: fn for nome, fn in casos.items() if any(f in nome for f in filtros)}
+
+    baseline = carregar_baseline(args.baseline)
+    resultados, regressoes = {}, []
+    print(f"{'caso':<28} {'mediana':>10} {'mínimo':>10} {'pico':>10} {'baseline':>10} {'razão':>7}")
+    for nome, fn in casos.items():
+        r = resultados[nome] = medir(fn, args.repeticoes)
+        ref = baseline.get(nome)
+        razao = r['mediana_s'] / ref['mediana_s'] if ref else None
+        marca = ''
+        if (razao is not None and razao > args.tolerancia
+                and (r['mediana_s'] - ref['mediana_s']) * 1000 > args.folga_ms):
+            regressoes.append(nome)
+            marca = '  ⚠'
+        ref_txt = f"{ref['mediana_s'] * 1000:.2f}ms" if ref else '—'
+        razao_txt = f"{razao:.2f}x" if razao is not None else '—'
+        print(f"{nome:<28} {r['mediana_s'] * 1000:>8.2f}ms {r['min_s'] * 1000:>8.2f}ms "
+              f"{r['pico_bytes'] / 2**20:>7.2f}MiB {ref_txt:>10} {razao_txt:>7}{marca}")
+
+    if args.salvar:
+        baseline.update(resultados)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                'ambiente': {
+                    'python': platform.python_version(),
+                    'numpy': np.__version__,
+                    'pandas': pd.__version__,
+                    'maquina': platform.machine(),
+                    'gerado_em': datetime.now().strftime('%Y-%m-%d'),
+                },
+                'casos': dict(sorted(baseline.items())),
+            }, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        print(f"\nBaseline gravada em {args.baseline}")
+
+    if regressoes:
+        print(f"\nRegressões (> {args.tolerancia:.2f}x a baseline): {', '.join(regressoes)}")
+        if args.verificar:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Gerador de dados sintéticos de geração solar no formato da planilha.
+
+A geração diária segue a sazonalidade do hemisfério sul (pico no verão),
+com nebulosidade aleatória, dias sem leitura, dias lançados duas vezes e
+algumas linhas inválidas, como acontece numa planilha preenchida à mão.
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+HEADER = ['data', 'gerado']
+
+def _geracao_diaria(dates, kwp, rng):
+    """kWh por dia: irradiação sazonal × nebulosidade × potência instalada"""
+    dia_do_ano = dates.dayofyear.to_numpy()
+    sazonal = 4.8 + 1.2 * np.cos(2 * np.pi * (dia_do_ano - 15) / 365.25)
+    nuvens = rng.beta(5, 1.6, size=len(dates))
+    return kwp * sazonal * nuvens * 0.8
+
+def _formatar_kwh(valores):
+    return np.char.replace(np.char.mod('%.2f', valores), '.', ',')
+
+def gerar_diario(anos=10, inicio=datetime(2000, 1, 1), kwp=5.0, seed=0,
+                 falhas=0.02, duplicadas=0.002, invalidas=0.001):
+    """Cabeçalho + linhas ['dd/mm/aaaa', '12,34'] de `anos` anos de registros diários"""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(inicio, periods=int(round(anos * 365.25)), freq='D')
+    kwh = _geracao_diaria(dates, kwp, rng)
+
+    keep = rng.random(len(dates)) >= falhas
+    dates, kwh = dates[keep], kwh[keep]
+    rows = np.column_stack([dates.strftime('%d/%m/%Y').to_numpy(), _formatar_kwh(kwh)]).tolist()
+
+    # Relançamentos do mesmo dia (o app mantém o último) e linhas com lixo
+    for i in np.flatnonzero(rng.random(len(rows)) < duplicadas)[::-1]:
+        rows.insert(i + 1, [rows[i][0], str(_formatar_kwh(kwh[i] * rng.uniform(0.9, 1.1)))])
+    for i in np.flatnonzero(rng.random(len(rows)) < invalidas)[::-1]:
+        rows.insert(i, [str(rng.choice(['', 'sem leitura', '31/02/2020'])), str(rng.choice(['', 'n/d', '-1']))])
+    return [list(HEADER)] + rows
+
+def gerar_frota(n_usinas=8, anos=10, seed=0):
+    """{nome: linhas} para várias usinas de portes e inícios diferentes"""
+    rng = np.random.default_rng(seed)
+    frota = {}
+    for i in range(n_usinas):
+        inicio = datetime(2000 + int(rng.integers(0, 5)), int(rng.integers(1, 13)), 1)
+        frota[f'Usina {i + 1:03d}'] = gerar_diario(anos, inicio, kwp=float(rng.uniform(3, 75)), seed=seed + i + 1)
+    return frota
+
+def gerar_intraday(dias=30, inicio=datetime(2024, 1, 1), kwp=5.0, seed=0, passo_min=5):
+    """Leituras de potência (kW) a cada `passo_min` minutos: ['dd/mm/aaaa HH:MM', '1,23']"""
+    rng = np.random.default_rng(seed)
+    instantes = pd.date_range(inicio, periods=dias * 24 * 60 // passo_min, freq=f'{passo_min}min')
+    hora = (instantes.hour + instantes.minute / 60).to_numpy()
+    sol = np.clip(np.sin(np.pi * (hora - 6) / 12), 0, None) ** 1.3
+    # Mesma sazonalidade/nebulosidade do diário, com variação rápida dentro do dia
+    por_dia = np.repeat(_geracao_diaria(pd.date_range(inicio, periods=dias, freq='D'), 1.0, rng) / 4.8,
+                        24 * 60 // passo_min)
+    potencia = kwp * sol * np.clip(por_dia * rng.normal(1, 0.08, len(instantes)), 0, None)
+    rows = np.column_stack([instantes.strftime('%d/%m/%Y %H:%M').to_numpy(), _formatar_kwh(potencia)])
+    return [['data', 'potencia']] + rows.tolist()
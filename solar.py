@@ -4,18 +4,40 @@ import pandas as pd
 import numpy as np
 import streamlit as st
 import gspread
-import time
+import os
+import json
+import tempfile
+import threading
+import re
+from collections import OrderedDict
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from google.oauth2.service_account import Credentials
 import warnings
 import altair as alt
 import locale
 
+# Lógica sem interface (armazenamento, agregados, finanças) fica em solar_core
+from solar_core import (
+    SPREADSHEET_ID, WORKSHEET_NAME, WRITE_JOURNAL_PATH, FLEET_MAX_WORKERS, MONTH_NAMES, VIDA_UTIL_ANOS,
+    COMPACT_MIN_DUPLICATES,
+    plant_configs, authorize_gspread, open_worksheet, SQLiteBackend, GoogleSheetsBackend,
+    IncrementalSheetSync, DatasetRevision, resumo_usina,
+    WriteBehindQueue, apply_pending_writes, pending_effects, RollupCube, format_number_br,
+    projetar_cenarios, sensibilidade_payback, indicadores_financeiros,
+    pools_mensais, simular_caminhos_geracao, faixas_monte_carlo,
+    PROFILER, configure_perf_logging, serve_metrics, SHEETS_QUOTA,
+    diff_registros, iter_import_chunks, planejar_importacao, filtrar_periodo, export_chunks, write_export,
+    IntradayStore, read_intraday_csv, integrar_diario, curva_intraday, dias_para_lancar,
+)
+from solar_charts import CHART_BUILDERS
+
 # Ignora avisos futuros do pandas
 warnings.filterwarnings('ignore', category=FutureWarning, message='.*observed=False.*')
 
-# Configuração do Altair para melhor performance
-alt.data_transformers.enable('json')
+# Dados dos gráficos vão embutidos na especificação (nada é gravado em disco); os gráficos em
+# cache guardam só referências para o ChartDataStore
+alt.data_transformers.enable('default')
 
 # Tenta configurar a localidade para português
 try:
@@ -26,10 +48,6 @@ except:
     except:
         pass
 
-# — Constantes de Configuração —
-SPREADSHEET_ID = '1WI2tZ94lVV9GfaaWerdSfuChFLzWfMbU4v2m6QrwTdY'
-WORKSHEET_NAME = 'solardaily'
-
 # — Configuração da Página —
 st.set_page_config(
     layout="wide",
@@ -41,11 +59,27 @@ st.set_page_config(
 # — Inicialização do Session State —
 if 'edit_mode' not in st.session_state:
     st.session_state.edit_mode = False
+if 'grid_nonce' not in st.session_state:
+    st.session_state.grid_nonce = 0
 
 # Inicializa o tema (padrão: claro)
 if 'dark_mode' not in st.session_state:
     st.session_state.dark_mode = False
 
+# — Instrumentação —
+# Spans desta execução: ligados pelo painel de desempenho da sidebar (ou SOLAR_PROFILE=1)
+METRICS_PORT = os.environ.get('SOLAR_METRICS_PORT')
+
+@st.cache_resource
+def start_metrics_server(port):
+    """Endpoint /metrics (OpenMetrics) do processo, iniciado uma única vez"""
+    return serve_metrics(PROFILER, port)
+
+configure_perf_logging()
+if METRICS_PORT:
+    start_metrics_server(int(METRICS_PORT))
+perf_run = PROFILER.start_run(st.session_state.get('perf_debug', False))
+
 # Função para obter as cores do tema
 def get_theme_colors():
     if st.session_state.dark_mode:
@@ -304,12 +338,12 @@ header {{visibility: hidden;}}
 """, unsafe_allow_html=True)
 
 # — TEMA DOS GRÁFICOS —
-def configure_altair_theme():
-    """Configura um tema global para todos os gráficos Altair baseado no tema atual."""
+def altair_theme_config(dark_mode):
+    """Configuração do tema dos gráficos para o modo claro ou escuro"""
     font = "Nunito"
-    
+
     # Cores baseadas no tema
-    if st.session_state.dark_mode:
+    if dark_mode:
         bg_color = "#374151"
         text_color = "#f3f4f6"
         grid_color = "#4b5563"
@@ -319,50 +353,54 @@ def configure_altair_theme():
         text_color = "#1f2937"
         grid_color = "#e2e8f0"
         tick_color = "#6b7280"
+
+    return {
+        "background": bg_color,
+        "view": {
+            "fill": bg_color,
+            "strokeWidth": 0
+        },
+        "title": {
+            "font": font,
+            "fontSize": 0,
+            "fontWeight": 0,
+            "anchor": "middle",
+            "color": "transparent"
+        },
+        "axis": {
+            "labelFont": font,
+            "titleFont": font,
+            "labelFontSize": 11,
+            "titleFontSize": 0,
+            "gridColor": grid_color,
+            "domain": False,
+            "tickColor": tick_color,
+            "labelColor": tick_color,
+            "titleColor": "transparent",
+            "titleFontWeight": 0,
+            "labelFontWeight": 400,
+            "title": None
+        },
+        "legend": {
+            "labelFont": font,
+            "titleFont": font,
+            "labelFontSize": 11,
+            "titleFontSize": 12,
+            "titleFontWeight": 600,
+            "labelColor": tick_color,
+            "titleColor": text_color
+        }
+    }
+
+def configure_altair_theme():
+    """Configura um tema global para todos os gráficos Altair baseado no tema atual."""
+    config = altair_theme_config(st.session_state.dark_mode)
     
     # Desativa o tema padrão para começar do zero
     alt.themes.enable('none')
     
     # Registra e ativa o tema customizado
-    alt.themes.register("custom_theme", lambda: {
-        "config": {
-            "background": bg_color,
-            "view": {
-                "fill": bg_color,
-                "strokeWidth": 0
-            },
-            "title": {
-                "font": font,
-                "fontSize": 0,
-                "fontWeight": 0,
-                "anchor": "middle",
-                "color": "transparent"
-            },
-            "axis": {
-                "labelFont": font,
-                "titleFont": font,
-                "labelFontSize": 11,
-                "titleFontSize": 0,
-                "gridColor": grid_color,
-                "domain": False,
-                "tickColor": tick_color,
-                "labelColor": tick_color,
-                "titleColor": "transparent",
-                "titleFontWeight": 0,
-                "labelFontWeight": 400,
-                "title": None
-            },
-            "legend": {
-                "labelFont": font,
-                "titleFont": font,
-                "labelFontSize": 11,
-                "titleFontSize": 12,
-                "titleFontWeight": 600,
-                "labelColor": tick_color,
-                "titleColor": text_color
-            }
-        }
-    })
+    alt.themes.register("custom_theme", lambda: {"config": config})
     alt.themes.enable("custom_theme")
 
 # Aplica o tema aos gráficos
@@ -384,43 +422,38 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+# — Usinas —
+def load_plant_configs():
+    """Usinas configuradas em st.secrets['usinas'] (ou a usina única das constantes)"""
+    try:
+        configured = st.secrets.get('usinas')
+    except Exception:
+        configured = None
+    return plant_configs(configured)
+
+PLANTS = load_plant_configs()
+
 # — Conexão com Google Sheets —
+@st.cache_resource
+def get_gspread_client():
+    """Cliente gspread autorizado uma única vez e compartilhado por todas as usinas"""
+    return authorize_gspread(st.secrets["gcp_service_account"])
+
 @st.cache_resource(show_spinner="🔌 Conectando ao Google Sheets…")
-def connect_to_gsheets():
+@PROFILER.timed('planilha.conexao')
+def connect_to_gsheets(spreadsheet_id=SPREADSHEET_ID, worksheet_name=WORKSHEET_NAME):
     """Conecta ao Google Sheets com tratamento robusto de erros"""
     try:
-        scopes = [
-            'https://spreadsheets.google.com/feeds',
-            'https://www.googleapis.com/auth/drive'
-        ]
-        creds_dict = st.secrets["gcp_service_account"]
-        creds = Credentials.from_service_account_info(creds_dict, scopes=scopes)
-        client = gspread.authorize(creds)
-
-        spreadsheet = client.open_by_key(SPREADSHEET_ID)
-        sheet = spreadsheet.worksheet(WORKSHEET_NAME)
-        
-        try:
-            headers = sheet.row_values(1)
-            if not headers:
-                st.error("⚠️ **Erro**: A planilha está vazia ou sem cabeçalhos.")
-                return None
-                
-            headers_lower = [h.lower().strip() for h in headers]
-            if 'data' not in headers_lower or 'gerado' not in headers_lower:
-                st.error("⚠️ **Erro de Configuração**: A planilha deve conter as colunas 'data' e 'gerado'.")
-                st.info("💡 **Dica**: Certifique-se de que a primeira linha da planilha contém os cabeçalhos 'data' e 'gerado'.")
-                return None
-        except Exception as e:
-            st.error(f"❌ **Erro ao verificar cabeçalhos**: {str(e)}")
-            return None
-        
-        return sheet
+        return open_worksheet(get_gspread_client(), spreadsheet_id, worksheet_name)
+    except ValueError as e:
+        st.error(f"⚠️ **Erro de Configuração**: {str(e)}")
+        st.info("💡 **Dica**: Certifique-se de que a primeira linha da planilha contém os cabeçalhos 'data' e 'gerado'.")
+        return None
     except gspread.exceptions.SpreadsheetNotFound:
         st.error("📋 **Planilha não encontrada**: Verifique se o SPREADSHEET_ID está correto e se você tem permissão de acesso.")
         return None
     except gspread.exceptions.WorksheetNotFound:
-        st.error(f"📊 **Aba não encontrada**: A aba '{WORKSHEET_NAME}' não existe na planilha.")
+        st.error(f"📊 **Aba não encontrada**: A aba '{worksheet_name}' não existe na planilha.")
         return None
     except KeyError:
         st.error("🔑 **Erro de Credenciais**: Configuração do Google Sheets não encontrada no st.secrets.")
@@ -429,11 +462,30 @@ def connect_to_gsheets():
         st.error(f"🚨 **Erro de Conexão**: {str(e)}")
         return None
 
-sheet = connect_to_gsheets()
+# — Backends de Armazenamento —
+@st.cache_resource(show_spinner="🔌 Conectando ao armazenamento…")
+def connect_storage(plant):
+    """Cria o backend de armazenamento configurado para a usina"""
+    cfg = PLANTS[plant]
+    if cfg['backend'] == 'sqlite':
+        try:
+            return SQLiteBackend(cfg['path'])
+        except Exception as e:
+            st.error(f"🚨 **Erro ao abrir o banco local**: {str(e)}")
+            return None
+
+    sheet = connect_to_gsheets(cfg['spreadsheet_id'], cfg['worksheet'])
+    return GoogleSheetsBackend(sheet, cfg['decimal']) if sheet else None
+
+if len(PLANTS) > 1:
+    plant = st.sidebar.selectbox("🏭 Usina", options=list(PLANTS))
+else:
+    plant = next(iter(PLANTS))
+storage = connect_storage(plant)
 
-if sheet:
+if storage:
     st.sidebar.markdown(
-        '<span class="status-badge status-connected">✅ Conectado</span>',
+        f'<span class="status-badge status-connected">✅ Conectado ({storage.name})</span>',
         unsafe_allow_html=True
     )
 else:
@@ -441,113 +493,322 @@ else:
         '<span class="status-badge status-disconnected">❌ Erro de conexão</span>',
         unsafe_allow_html=True
     )
-    st.error("⚠️ **Sistema Offline**: Não foi possível conectar ao Google Sheets.")
+    st.error("⚠️ **Sistema Offline**: Não foi possível conectar ao armazenamento de dados.")
     st.stop()
 
 # — Funções de Dados —
-@st.cache_data(ttl=300, show_spinner="📊 Carregando dados…")
-def load_data():
-    """Carrega e processa os dados da planilha"""
-    try:
-        values = sheet.get_all_values()
-
-        if len(values) < 2: 
-            return pd.DataFrame()
-        
-        df = pd.DataFrame(values[1:], columns=values[0])
-        df.columns = [col.lower().strip() for col in df.columns]
-        
-        if 'data' not in df.columns or 'gerado' not in df.columns:
-            st.error("⚠️ **Erro de Configuração**: A planilha deve conter as colunas 'data' e 'gerado'.")
-            return pd.DataFrame()
-        
-        df.rename(columns={
-            'data': 'Data', 
-            'gerado': 'Energia Gerada (kWh)'
-        }, inplace=True)
-        
-        df['Data'] = pd.to_datetime(df['Data'], format='%d/%m/%Y', errors='coerce')
-        if df['Data'].isna().any():
-            df['Data'] = pd.to_datetime(df['Data'], errors='coerce')
-        
-        df['Energia Gerada (kWh)'] = df['Energia Gerada (kWh)'].astype(str).str.replace(',', '.', regex=False)
-        df['Energia Gerada (kWh)'] = pd.to_numeric(df['Energia Gerada (kWh)'], errors='coerce')
-        
-        df.dropna(subset=['Data', 'Energia Gerada (kWh)'], inplace=True)
-        df = df[df['Energia Gerada (kWh)'] >= 0]
-        df = df.sort_values(by='Data').drop_duplicates(subset=['Data'], keep='last')
-        
-        return df.reset_index(drop=True)
-        
-    except Exception as e:
+@st.cache_resource
+def get_sheet_sync(plant):
+    """Sincronizador incremental da usina, compartilhado entre sessões"""
+    return IncrementalSheetSync(connect_storage(plant), get_dataset_revision(plant))
+
+@st.cache_resource
+def get_dataset_revision(plant):
+    """Revisões do conjunto de dados da usina, compartilhadas entre sessões"""
+    return DatasetRevision()
+
+@st.cache_data(max_entries=4, show_spinner="📊 Carregando dados…")
+def load_data(plant, revision):
+    """Dados processados da usina (snapshot revalidado em segundo plano).
+
+    Falhas sobem como exceção: o st.cache_data não guarda exceções, então a próxima
+    execução tenta de novo em vez de servir um DataFrame vazio até a próxima revisão.
+    """
+    return get_sheet_sync(plant).get()
+
+def show_load_error(e):
+    """Mensagem de falha na carga dos dados da usina"""
+    if isinstance(e, ValueError):
+        st.error(f"⚠️ **Erro de Configuração**: {str(e)}")
+    else:
         st.error(f"🚨 **Erro ao carregar dados**: {str(e)}")
-        return pd.DataFrame()
 
+# — Frota (várias usinas) —
+@st.cache_data(max_entries=32, show_spinner=False)
+def load_plant_summary(plant, revision):
+    """Resumo de uma usina da frota por revisão (falhas sobem e não ficam em cache)"""
+    return resumo_usina(plant, get_sheet_sync(plant).get())
+
+def load_fleet(revisions):
+    """Sincroniza todas as usinas em paralelo e resume cada uma.
+
+    As sincronizações rodam num pool de threads sobre o mesmo cliente gspread, então
+    o tempo total fica próximo ao da usina mais lenta, e não à soma de todas. Cada
+    resumo fica em cache pela revisão da usina; uma usina que falhou é tentada de novo
+    na execução seguinte sem recarregar as outras.
+    """
+    revisions = [(p, revision) for p, revision in revisions if connect_storage(p)]
+    if not revisions:
+        return pd.DataFrame(), pd.DataFrame()
+    with ThreadPoolExecutor(max_workers=min(FLEET_MAX_WORKERS, len(revisions))) as pool:
+        futures = {p: pool.submit(load_plant_summary, p, revision) for p, revision in revisions}
+
+    resumo, anual = [], []
+    for p, future in futures.items():
+        try:
+            linha, por_ano = future.result()
+        except Exception as e:
+            resumo.append({'Usina': p, 'Status': f"❌ {str(e)}"})
+            continue
+        resumo.append(linha)
+        if not por_ano.empty:
+            anual.append(por_ano)
+    return pd.DataFrame(resumo), (pd.concat(anual, ignore_index=True) if anual else pd.DataFrame())
+
+# — Fila de Escrita em Segundo Plano —
+def write_journal_path(plant):
+    """Diário de escritas pendentes da usina"""
+    if len(PLANTS) == 1:
+        return WRITE_JOURNAL_PATH
+    root, ext = os.path.splitext(WRITE_JOURNAL_PATH)
+    return f"{root}.{re.sub(r'[^0-9A-Za-z_-]+', '_', plant)}{ext}"
+
+@st.cache_resource
+def get_write_queue(plant):
+    """Fila de escrita da usina, compartilhada entre sessões"""
+    return WriteBehindQueue(connect_storage(plant), get_sheet_sync(plant), get_dataset_revision(plant),
+                            write_journal_path(plant))
+
+@PROFILER.timed('escrita.novo')
 def append_data(date, energy):
-    """Adiciona um novo registro à planilha"""
+    """Enfileira o registro do dia para gravação (substitui o do mesmo dia, se houver)"""
     try:
         formatted_date = date.strftime('%d/%m/%Y')
         energy_str = str(energy).replace('.', ',')
-        sheet.append_row([formatted_date, energy_str], value_input_option='USER_ENTERED')
-        st.cache_data.clear()
+        get_write_queue(plant).enqueue({
+            'op': 'append', 'values': [formatted_date, energy_str], 'dates': [formatted_date]
+        })
         return True
     except Exception as e:
         st.error(f"🚨 **Erro ao salvar**: {str(e)}")
         return False
 
-def update_data(row_index, date, energy):
-    """Atualiza um registro existente"""
+@PROFILER.timed('escrita.lote')
+def append_days(days):
+    """Enfileira vários dias de uma vez (gravados juntos: dias novos num único append_rows)"""
     try:
-        formatted_date = date.strftime('%d/%m/%Y')
-        energy_str = str(energy).replace('.', ',')
-        sheet.update_cell(row_index + 2, 1, formatted_date)
-        sheet.update_cell(row_index + 2, 2, energy_str)
-        st.cache_data.clear()
+        ops = []
+        for date, energy in zip(days['Data'], days['Energia Gerada (kWh)']):
+            formatted_date = date.strftime('%d/%m/%Y')
+            ops.append({'op': 'append', 'values': [formatted_date, str(round(float(energy), 4)).replace('.', ',')],
+                        'dates': [formatted_date]})
+        get_write_queue(plant).enqueue_many(ops)
         return True
     except Exception as e:
-        st.error(f"🚨 **Erro ao atualizar**: {str(e)}")
+        st.error(f"🚨 **Erro ao salvar**: {str(e)}")
         return False
 
-def delete_data(row_index):
-    """Exclui um registro da planilha"""
+@PROFILER.timed('escrita.grade')
+def save_grid_edits(diff):
+    """Enfileira as mudanças da grade como uma única operação (um lote e uma invalidação)"""
     try:
-        sheet.delete_rows(row_index + 2)
-        st.cache_data.clear()
+        dates = list(dict.fromkeys(
+            diff['deletes'] + [d for old, values in diff['moves'] for d in (old, values[0])]
+            + [values[0] for values in diff['upserts']]
+        ))
+        get_write_queue(plant).enqueue({'op': 'edit', 'upserts': diff['upserts'], 'moves': diff['moves'],
+                                        'deletes': diff['deletes'], 'dates': dates})
         return True
     except Exception as e:
-        st.error(f"🚨 **Erro ao excluir**: {str(e)}")
+        st.error(f"🚨 **Erro ao salvar**: {str(e)}")
         return False
 
-def format_number_br(number, decimals=2):
-    """Formata números no padrão brasileiro"""
-    return f"{number:,.{decimals}f}".replace(",", "X").replace(".", ",").replace("X", ".")
-
-# — NOVA FUNÇÃO: Cálculo Financeiro Lei 14.300 —
-def calcular_economia_lei14300(geracao_total, tarifa_cheia, tarifa_fio_b, simultaneidade_percent):
-    """Calcula a economia real considerando a taxação progressiva do Fio B."""
-    fator = simultaneidade_percent / 100.0
-    
-    # 1. Energia Autoconsumida (Isenta)
-    autoconsumo = geracao_total * fator
-    economia_autoconsumo = autoconsumo * tarifa_cheia
-    
-    # 2. Energia Injetada (Taxada)
-    injecao = geracao_total * (1 - fator)
-    
-    # Regra de Transição: % cobrado sobre o Fio B
-    ano_atual = datetime.now().year
-    tabela = {2023: 0.15, 2024: 0.30, 2025: 0.45, 2026: 0.60, 2027: 0.75, 2028: 0.90}
-    percentual_taxa = tabela.get(ano_atual, 1.0)
-    
-    custo_pedagio = injecao * (tarifa_fio_b * percentual_taxa)
-    economia_injecao = (injecao * tarifa_cheia) - custo_pedagio
-    
-    return {
-        "economia_reais": economia_autoconsumo + economia_injecao,
-        "taxa_paga": custo_pedagio,
-        "kwh_autoconsumo": autoconsumo,
-        "percentual_taxa": percentual_taxa * 100
-    }
+# — Cubo de Agregados (dia → mês → ano) —
+@st.cache_data(max_entries=4)
+def build_rollup(plant, revision):
+    """Cubo de agregados construído uma vez por revisão dos dados"""
+    return RollupCube(load_data(plant, revision))
+
+# — Simulação de Monte Carlo —
+@st.cache_data(max_entries=8, show_spinner="🎲 Sorteando trajetórias de geração…")
+def caminhos_monte_carlo(plant, revision, n_caminhos, anos, seed=42):
+    """Trajetórias sorteadas, em cache por revisão dos dados (independem das tarifas)"""
+    return simular_caminhos_geracao(pools_mensais(build_rollup(plant, revision)), n_caminhos, anos, seed)
+
+@st.cache_data(max_entries=32)
+def simular_monte_carlo(plant, revision, n_caminhos, anos, tarifa_cheia, tarifa_fio_b,
+                        simultaneidade_percent, investimento, degradacao, ano_inicio=None,
+                        reajuste_tarifa=0.0, seed=42):
+    """Faixas P10/P50/P90 de payback e economia acumulada a partir das trajetórias sorteadas"""
+    return faixas_monte_carlo(caminhos_monte_carlo(plant, revision, n_caminhos, anos, seed),
+                              tarifa_cheia, tarifa_fio_b, simultaneidade_percent, investimento,
+                              degradacao, ano_inicio, reajuste_tarifa)
+
+# — Leituras Intraday do Inversor —
+@st.cache_resource
+def get_intraday_store(plant):
+    """Leituras de potência da usina (SQLite local), compartilhadas entre sessões"""
+    return IntradayStore(PLANTS[plant]['intraday_path'], plant)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def intraday_curve(plant, revision, inicio, fim):
+    """Curva reduzida por LTTB e energia diária integrada do período, em cache por revisão"""
+    instantes, potencia, energia = get_intraday_store(plant).samples(inicio, fim)
+    ms, kw = curva_intraday(instantes, potencia)
+    return (tuple(ms.tolist()), tuple(kw.tolist()), len(instantes),
+            integrar_diario(instantes, potencia, energia=energia))
+
+# — Exportação —
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+# Até este tamanho o relatório é montado em memória; acima, num arquivo temporário
+EXPORT_SPOOL_BYTES = int(os.environ.get('SOLAR_EXPORT_SPOOL_BYTES', 8 * 1024 * 1024))
+
+def export_source(p):
+    """Leitor do histórico da usina com as escritas pendentes, para uso fora da execução do script"""
+    sync, queue = get_sheet_sync(p), get_write_queue(p)
+    return lambda: apply_pending_writes(sync.get(), queue.pending())
+
+def export_file(sources, inicio, fim, nivel, formato, tarifas):
+    """Relatório das usinas em `sources` (nome -> leitor), gravado bloco a bloco (um por ano).
+
+    Roda no clique do botão de download, fora da execução do script: não chama o
+    Streamlit e só lê dados quando o arquivo é de fato pedido. Os blocos vão para um
+    arquivo temporário (em disco acima de EXPORT_SPOOL_BYTES) à medida que são gerados.
+    O download não é em streaming: o Streamlit recebe o arquivo pronto, em bytes, e o
+    guarda em memória para servi-lo; relatórios grandes saem melhor pelo CLI
+    (--exportar), que grava direto no destino.
+    """
+    def chunks():
+        for nome, read in sources.items():
+            cube = RollupCube(filtrar_periodo(read(), inicio, fim))
+            yield from export_chunks(cube, nome, nivel, *tarifas)
+
+    with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES) as spool:
+        write_export(chunks(), spool, formato)
+        spool.seek(0)
+        return spool.read()
+
+# — Gráficos (especificações Vega-Lite em cache) —
+def data_cube(plant, revision, pending_json):
+    """Cubo de agregados da revisão com as escritas pendentes aplicadas"""
+    cube = build_rollup(plant, revision)
+    cube.apply_pending(json.loads(pending_json))
+    return cube
+
+def chart_months(params):
+    """Partições (ano, mês) que um gráfico lê: o mês, o ano ou os anos pedidos"""
+    if 'month' in params:
+        return ((params['year'], params['month']),)
+    years = params['years'] if 'years' in params else (params['year'],)
+    return tuple((year, month) for year in years for month in range(1, 13))
+
+def chart_version(data_version, params):
+    """Chave de cache de um gráfico: revisão das partições que ele lê e as escritas pendentes nelas.
+
+    Uma escrita num mês só invalida os gráficos que mostram esse mês; os demais continuam
+    servidos do cache mesmo com a revisão global nova.
+    """
+    if data_version is None:
+        return None  # gráfico que não lê o histórico (só os parâmetros)
+    plant, revision, pending_json = data_version
+    revisions = get_dataset_revision(plant)
+    months = chart_months(params)
+    partitions = tuple(revisions.partition(year, month) for year, month in months)
+    if revisions.current() != revision:
+        return data_version  # dados mudaram durante a execução: a chave global é sempre coerente
+    wanted = set(months)
+    pendentes = []
+    for op in json.loads(pending_json):
+        for effect in pending_effects(op):
+            date = datetime.strptime(effect[1] if effect[0] == 'remove' else effect[1][0], '%d/%m/%Y')
+            if (date.year, date.month) in wanted:
+                pendentes.append(effect)
+    return plant, partitions, json.dumps(pendentes)
+
+CHART_DATA_MAX_BYTES = int(os.environ.get('SOLAR_CHART_DATA_MAX_BYTES', 64 * 1024 * 1024))
+
+class ChartDataStore:
+    """Linhas dos gráficos endereçadas pelo conteúdo, compartilhadas entre sessões
+
+    O Altair consolida os dados de cada gráfico em datasets nomeados pelo hash do conteúdo
+    ('data-<sha256>'); o mesmo conjunto de linhas é guardado aqui uma única vez, não importa
+    quantos gráficos ou sessões o usem. Acima do limite de bytes, os menos usados são descartados.
+    """
+
+    def __init__(self, max_bytes=CHART_DATA_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = OrderedDict()  # nome -> (linhas, tamanho)
+        self._lock = threading.Lock()
+
+    def put(self, name, values):
+        with self._lock:
+            if name in self._entries:
+                self._entries.move_to_end(name)
+                return
+            size = len(json.dumps(values, default=str))
+            self._entries[name] = (values, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+
+    def get(self, name):
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                return None
+            self._entries.move_to_end(name)
+            return entry[0]
+
+    def __len__(self):
+        return len(self._entries)
+
+@st.cache_resource
+def get_chart_data_store():
+    """Depósito único de dados dos gráficos para o processo"""
+    return ChartDataStore()
+
+def build_chart_spec(kind, data_version, dark_mode, **params):
+    """Monta a especificação Vega-Lite e move os datasets para o ChartDataStore
+
+    Devolve a especificação sem os dados e os nomes dos datasets que ela referencia.
+    """
+    with PROFILER.span(f'grafico.{kind}.montagem'):
+        cube = data_cube(*data_version) if data_version is not None else None
+        chart = CHART_BUILDERS[kind](cube, **params)
+    with PROFILER.span(f'grafico.{kind}.serializacao'), alt.themes.enable('none'):
+        spec = chart.to_dict()
+
+    store = get_chart_data_store()
+    datasets = spec.pop('datasets', {})
+    for name, values in datasets.items():
+        store.put(name, values)
+
+    # Aplica o tema explicitamente (o tema global do Altair é compartilhado entre sessões)
+    config = altair_theme_config(dark_mode)
+    for key, value in spec.get('config', {}).items():
+        if isinstance(value, dict) and isinstance(config.get(key), dict):
+            config[key] = {**config[key], **value}
+        else:
+            config[key] = value
+    spec['config'] = config
+    return spec, tuple(datasets)
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def cached_chart_spec(kind, chart_key, dark_mode, _data_version, **params):
+    """Especificação Vega-Lite de um gráfico, em cache por tipo, visão, tema e partições lidas
+
+    `_data_version` (fora da chave) só indica de qual revisão montar o gráfico na falta.
+    """
+    return build_chart_spec(kind, _data_version, dark_mode, **params)
+
+def render_chart(kind, data_version, **params):
+    """Exibe um gráfico a partir da especificação em cache e dos dados do ChartDataStore"""
+    dark_mode = st.session_state.dark_mode
+    with PROFILER.span(f'grafico.{kind}'):
+        spec, names = cached_chart_spec(kind, chart_version(data_version, params), dark_mode, data_version,
+                                        **params)
+        store = get_chart_data_store()
+        datasets = {name: store.get(name) for name in names}
+        if any(values is None for values in datasets.values()):
+            # Dados descartados do depósito: remonta o gráfico, o que os recoloca lá
+            spec, names = build_chart_spec(kind, data_version, dark_mode, **params)
+            datasets = {name: store.get(name) for name in names}
+        st.vega_lite_chart({**spec, 'datasets': datasets}, use_container_width=True)
 
 # — Formulário de Cadastro —
 st.markdown("""
@@ -586,15 +847,128 @@ with st.form("entry_form", clear_on_submit=True):
                 if append_data(input_date, input_energy):
                     st.success("✅ Dados salvos com sucesso!")
                     st.balloons()
-                    time.sleep(1)
-                    st.rerun()
                 else:
                     st.error("❌ Falha ao salvar os dados.")
         else:
             st.warning("💡 Digite um valor maior que zero.")
 
+with st.expander("📥 Importar histórico (CSV/XLSX)"):
+    st.caption("Colunas 'data' e 'gerado', como na planilha. O arquivo é lido em blocos e validado com as "
+               "mesmas regras da carga; tudo é gravado de uma vez, numa única chamada.")
+    arquivo_historico = st.file_uploader("Arquivo de histórico", type=['csv', 'txt', 'xlsx'], key='history_upload')
+    if arquivo_historico is not None:
+        # O plano depende do arquivo e do histórico atual; recalcula só quando um dos dois muda
+        plan_key = (plant, arquivo_historico.file_id, get_dataset_revision(plant).current(),
+                    len(get_write_queue(plant).pending()))
+        if st.session_state.get('import_plan_key') != plan_key:
+            try:
+                registrados = load_data(plant, get_dataset_revision(plant).current())
+            except Exception as e:
+                # Sem o histórico atual não há como separar dias novos de conflitos
+                registrados = st.session_state.import_plan = None
+                show_load_error(e)
+            if registrados is not None:
+                try:
+                    with PROFILER.span('importacao.validacao'):
+                        existentes = apply_pending_writes(registrados, get_write_queue(plant).pending())
+                        st.session_state.import_plan = planejar_importacao(
+                            iter_import_chunks(arquivo_historico, arquivo_historico.name), existentes
+                        )
+                    st.session_state.import_plan_key = plan_key
+                except ValueError as e:
+                    st.session_state.import_plan = None
+                    st.error(f"⚠️ **Arquivo inválido**: {str(e)}")
+        plano = st.session_state.get('import_plan')
+        if plano is not None:
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("🆕 Dias novos", len(plano['novos']))
+            col2.metric("⚠️ Conflitos", len(plano['conflitos']))
+            col3.metric("✔️ Já registrados", plano['iguais'])
+            col4.metric("🚫 Linhas inválidas", len(plano['rejeitadas']))
+            if plano['duplicadas']:
+                st.caption(f"{plano['duplicadas']} lançamento(s) repetido(s) no arquivo: vale o último de cada dia.")
+
+            substituir = False
+            if not plano['conflitos'].empty:
+                st.markdown("**Dias já registrados com outro valor:**")
+                st.dataframe(plano['conflitos'], hide_index=True, use_container_width=True,
+                             column_config={'Data': st.column_config.DateColumn(format="DD/MM/YYYY")})
+                substituir = st.checkbox("Substituir os valores registrados pelos do arquivo", key='import_overwrite')
+            if len(plano['rejeitadas']):
+                with st.popover("Ver linhas inválidas"):
+                    st.dataframe(plano['rejeitadas'], hide_index=True, use_container_width=True)
+
+            importar = pd.concat([plano['novos'], plano['conflitos'][['Data', 'Energia Gerada (kWh)']]]) \
+                if substituir else plano['novos']
+            if importar.empty:
+                st.info("Nada a importar: todos os dias do arquivo já estão no histórico.")
+            elif st.button(f"💾 Importar {len(importar)} registro(s)", key='import_commit'):
+                # Um único lote na fila: dias substituídos reescritos no lugar, os novos num append_rows
+                if append_days(importar.sort_values('Data')):
+                    st.session_state.pop('import_plan_key', None)
+                    st.success(f"✅ {len(importar)} registro(s) enfileirados para gravação!")
+                    st.rerun()
+
+# — Visão da Frota —
+for p in PLANTS:
+    if connect_storage(p):
+        get_sheet_sync(p).refresh_if_stale()
+
+if len(PLANTS) > 1:
+    st.markdown("""
+    <div class="subheader-container teal">
+        <h2>🏭 Visão da Frota</h2>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    with PROFILER.span('dados.frota'), st.spinner("🏭 Carregando usinas…"):
+        fleet_summary, fleet_yearly = load_fleet(
+            tuple((p, get_dataset_revision(p).current()) for p in PLANTS)
+        )
+    if not fleet_summary.empty:
+        st.dataframe(
+            fleet_summary,
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                col: st.column_config.NumberColumn(format="%.2f")
+                for col in fleet_summary.columns if col.endswith('(kWh)')
+            }
+        )
+    if not fleet_yearly.empty:
+        fleet_chart = alt.Chart(fleet_yearly).mark_bar(
+            cornerRadiusTopLeft=2,
+            cornerRadiusTopRight=2
+        ).encode(
+            x=alt.X('Ano:O', title=''),
+            xOffset='Usina:N',
+            y=alt.Y('Energia Gerada (kWh):Q', title=''),
+            color=alt.Color('Usina:N', legend=alt.Legend(title="Usina")),
+            tooltip=[
+                alt.Tooltip('Usina:N'),
+                alt.Tooltip('Ano:O'),
+                alt.Tooltip('Energia Gerada (kWh):Q', title='Total', format=',.2f')
+            ]
+        ).properties(height=300)
+        st.altair_chart(fleet_chart, use_container_width=True)
+    st.divider()
+
 # — Análise de Dados —
-df = load_data()
+pending_writes = get_write_queue(plant).pending()
+with PROFILER.span('dados.carregar'):
+    try:
+        stored_df = load_data(plant, get_dataset_revision(plant).current())
+        load_failed = False
+    except Exception as e:
+        show_load_error(e)
+        stored_df, load_failed = pd.DataFrame(), True
+with PROFILER.span('dados.pendentes'):
+    df = apply_pending_writes(stored_df, pending_writes)
+with PROFILER.span('agregacao.cubo'):
+    rollup = RollupCube(stored_df) if load_failed else build_rollup(plant, get_dataset_revision(plant).current())
+    rollup.apply_pending(pending_writes)
+# Versão dos dados exibidos: chave dos gráficos em cache
+data_version = (plant, get_dataset_revision(plant).current(), json.dumps(pending_writes))
 
 if df.empty:
     st.info("📊 **Nenhum dado encontrado**. Comece registrando sua primeira geração de energia solar!")
@@ -608,6 +982,12 @@ else:
     fator_simultaneidade = st.sidebar.slider("Fator de Simultaneidade (%)", 0, 100, 30)
     
     investimento_inicial = st.sidebar.number_input("Investimento (R$)", value=15000.0)
+    degradacao_anual = st.sidebar.number_input("Degradação Anual (%)", value=0.5, min_value=0.0,
+                                               max_value=5.0, step=0.1, format="%.2f")
+    reajuste_tarifa = st.sidebar.number_input("Reajuste Tarifário (% a.a.)", value=5.0, min_value=0.0,
+                                              max_value=30.0, step=0.5, format="%.1f")
+    taxa_desconto = st.sidebar.number_input("Taxa de Desconto (% a.a.)", value=8.0, min_value=0.0,
+                                            max_value=50.0, step=0.5, format="%.1f")
     data_instalacao = st.sidebar.date_input("Data Instalação", datetime(2025, 5, 1))
 
     # — Filtros —
@@ -621,7 +1001,7 @@ else:
 
     with col1:
         # Lógica para pré-selecionar o ano atual
-        years = sorted(df['Data'].dt.year.unique(), reverse=True)
+        years = rollup.year_list()
         current_year = datetime.now().year
         year_index = 0 
         if current_year in years:
@@ -631,12 +1011,8 @@ else:
         
     with col2:
         # Lógica para pré-selecionar o mês atual
-        months = sorted(df[df['Data'].dt.year == selected_year]['Data'].dt.month.unique())
-        month_names = {
-            1: 'Janeiro', 2: 'Fevereiro', 3: 'Março', 4: 'Abril', 
-            5: 'Maio', 6: 'Junho', 7: 'Julho', 8: 'Agosto', 
-            9: 'Setembro', 10: 'Outubro', 11: 'Novembro', 12: 'Dezembro'
-        }
+        months = rollup.month_list(selected_year)
+        month_names = MONTH_NAMES
         
         selected_month_num = None
         if months:
@@ -656,17 +1032,13 @@ else:
             st.info("Nenhum dado disponível para este ano")
 
     if selected_month_num is not None:
-        filtered_df = df[
-            (df['Data'].dt.year == selected_year) & 
-            (df['Data'].dt.month == selected_month_num)
-        ].copy()
+        # Fatia do mês direto da série diária do cubo (já com as escritas pendentes)
+        with PROFILER.span('agregacao.mes'):
+            filtered_df = rollup.month_frame(selected_year, selected_month_num)
         
         if not filtered_df.empty:
             # --- Métricas do Mês ---
-            total = filtered_df['Energia Gerada (kWh)'].sum()
-            avg = filtered_df['Energia Gerada (kWh)'].mean()
-            best = filtered_df.loc[filtered_df['Energia Gerada (kWh)'].idxmax()]
-            worst = filtered_df.loc[filtered_df['Energia Gerada (kWh)'].idxmin()]
+            month_stats = rollup.months[(selected_year, selected_month_num)]
             
             st.markdown(f"""
             <div class="subheader-container orange">
@@ -677,135 +1049,39 @@ else:
             col1, col2, col3, col4 = st.columns(4)
             
             with col1:
-                st.metric("🔋 Total no Mês", f"{format_number_br(total)} kWh")
+                st.metric("🔋 Total no Mês", f"{format_number_br(month_stats['total'])} kWh")
             with col2:
-                st.metric("📈 Média Diária", f"{format_number_br(avg)} kWh")
+                st.metric("📈 Média Diária", f"{format_number_br(month_stats['mean'])} kWh")
             with col3:
-                st.metric("⭐ Melhor Dia", f"{format_number_br(best['Energia Gerada (kWh)'])} kWh", 
-                          delta=best['Data'].strftime('%d/%m'))
+                st.metric("⭐ Melhor Dia", f"{format_number_br(month_stats['max'])} kWh", 
+                          delta=month_stats['max_date'].strftime('%d/%m'))
             with col4:
-                st.metric("⚠️ Menor Dia", f"{format_number_br(worst['Energia Gerada (kWh)'])} kWh",
-                          delta=worst['Data'].strftime('%d/%m'), delta_color="inverse")
+                st.metric("⚠️ Menor Dia", f"{format_number_br(month_stats['min'])} kWh",
+                          delta=month_stats['min_date'].strftime('%d/%m'), delta_color="inverse")
             
             # --- Abas de Análise ---
             tab1, tab2, tab3, tab4 = st.tabs(["📊 Produção Diária", "📈 Geração Acumulada", "📅 Acumulada Anual", "📋 Dados"])
             
             with tab1:
                 # --- GRÁFICO DE GERAÇÃO DIÁRIA (BARRAS LARGAS) ---
-                bar_chart = alt.Chart(filtered_df).mark_bar(
-                    color="green",
-                    cornerRadiusTopLeft=3,
-                    cornerRadiusTopRight=3,
-                    stroke="black",
-                    strokeWidth=1,
-                ).encode(
-                    x=alt.X(
-                        'Data:O',  # Ordinal
-                        timeUnit='date', # Dia (1, 2, 3...)
-                        title='', 
-                        axis=alt.Axis(labelAngle=0), 
-                        scale=alt.Scale(padding=0.05) # 0.05 = Barras largas
-                    ),
-                    y=alt.Y('Energia Gerada (kWh):Q', title=''),
-                    tooltip=[
-                        alt.Tooltip('Data:T', title='Data', format='%d/%m/%Y'), 
-                        alt.Tooltip('Energia Gerada (kWh):Q', title='Energia', format='.2f')
-                    ]
-                )
-                
-                media_diaria = filtered_df['Energia Gerada (kWh)'].mean()
-                linha_media = alt.Chart(pd.DataFrame({'media': [media_diaria]})).mark_rule(
-                    color='red',
-                    strokeWidth=2,
-                ).encode(
-                    y=alt.Y('media:Q'),
-                    tooltip=alt.value(f'Média: {format_number_br(media_diaria)} kWh')
-                )
-                
-                final_chart = (bar_chart + linha_media).properties(
-                    height=400,
-                    title=''
-                )
-                
-                st.altair_chart(final_chart, use_container_width=True)
+                render_chart('diario', data_version, year=selected_year, month=selected_month_num)
                 st.divider()
             
             with tab2:
-                filtered_df_sorted = filtered_df.sort_values('Data').copy()
-                filtered_df_sorted['Acumulado'] = filtered_df_sorted['Energia Gerada (kWh)'].cumsum()
-                
-                area_chart = alt.Chart(filtered_df_sorted).mark_area(
-                    line={'color':'darkgreen'},
-                    color=alt.Gradient(
-                        gradient='linear',
-                        stops=[alt.GradientStop(color='white', offset=0),
-                               alt.GradientStop(color='darkgreen', offset=1)],
-                        x1=1,
-                        x2=1,
-                        y1=1,
-                        y2=0
-                    ),
-                    interpolate='monotone'
-                ).encode(
-                    x=alt.X('Data:T', title=''),
-                    y=alt.Y('Acumulado:Q', title=''),
-                    tooltip=[
-                        alt.Tooltip('Data:T', title='Data', format='%d/%m/%Y'),
-                        alt.Tooltip('Energia Gerada (kWh):Q', title='Geração', format='.2f'),
-                        alt.Tooltip('Acumulado:Q', title='Acumulado', format='.2f')
-                    ]
-                ).properties(
-                    height=400,
-                    title=''
-                )
-                
-                st.altair_chart(area_chart, use_container_width=True)
+                render_chart('acumulado_mes', data_version, year=selected_year, month=selected_month_num)
                 st.divider()
             
             with tab3:
                 # --- ABA 3: ACUMULADA ANUAL ---
-                year_df = df[df['Data'].dt.year == selected_year].copy()
-                year_df_sorted = year_df.sort_values('Data').copy()
-                year_df_sorted['Acumulado Anual'] = year_df_sorted['Energia Gerada (kWh)'].cumsum()
-                
-                area_chart_annual = alt.Chart(year_df_sorted).mark_area(
-                    line={'color':'#8b5cf6'},
-                    color=alt.Gradient(
-                        gradient='linear',
-                        stops=[alt.GradientStop(color='white', offset=0),
-                               alt.GradientStop(color='#8b5cf6', offset=1)],
-                        x1=1,
-                        x2=1,
-                        y1=1,
-                        y2=0
-                    ),
-                    interpolate='monotone'
-                ).encode(
-                    x=alt.X('Data:T', title=''),
-                    y=alt.Y('Acumulado Anual:Q', title=''),
-                    tooltip=[
-                        alt.Tooltip('Data:T', title='Data', format='%d/%m/%Y'),
-                        alt.Tooltip('Energia Gerada (kWh):Q', title='Geração do Dia', format='.2f'),
-                        alt.Tooltip('Acumulado Anual:Q', title='Acumulado no Ano', format='.2f')
-                    ]
-                ).properties(
-                    height=400,
-                    title=''
-                )
-                
-                st.altair_chart(area_chart_annual, use_container_width=True)
+                render_chart('acumulado_ano', data_version, year=selected_year)
                 
                 # Métricas do acumulado anual
                 col1, col2, col3 = st.columns(3)
                 
-                current_date = datetime(selected_year, selected_month_num, 1)
-                end_of_month = datetime(selected_year, selected_month_num, 
-                                        pd.Timestamp(selected_year, selected_month_num, 1).days_in_month)
-                
-                acumulado_ate_mes = year_df[year_df['Data'] <= end_of_month]['Energia Gerada (kWh)'].sum()
-                total_year = year_df['Energia Gerada (kWh)'].sum()
+                acumulado_ate_mes = rollup.total_until(selected_year, selected_month_num)
+                total_year = rollup.years[selected_year]['total']
                 
-                meses_completos = len(year_df.groupby(year_df['Data'].dt.month))
+                meses_completos = len(rollup.month_list(selected_year))
                 if meses_completos > 0:
                     media_mensal = acumulado_ate_mes / meses_completos
                     projecao_anual = media_mensal * 12
@@ -841,70 +1117,97 @@ else:
                 with col2:
                     if st.button("✏️ Editar Registros", use_container_width=True):
                         st.session_state.edit_mode = not st.session_state.edit_mode
-                
+
+                with st.expander("📤 Exportar dados"):
+                    exp_col1, exp_col2, exp_col3 = st.columns([2, 1, 1])
+                    with exp_col1:
+                        export_period = st.date_input(
+                            "📅 Período", value=(df['Data'].min(), df['Data'].max()),
+                            format="DD/MM/YYYY", key='export_period'
+                        )
+                    with exp_col2:
+                        export_level = st.selectbox(
+                            "Nível", options=['diario', 'mensal', 'anual'], key='export_level',
+                            format_func={'diario': "Diário", 'mensal': "Mensal", 'anual': "Anual"}.get
+                        )
+                    with exp_col3:
+                        export_format = st.radio("Formato", options=list(EXPORT_FORMATS), key='export_format')
+                    export_all = len(PLANTS) > 1 and st.checkbox("🏭 Todas as usinas", key='export_all')
+
+                    if len(export_period) == 2:
+                        # A usina aberta já está carregada; as demais só são lidas no clique
+                        export_sources = {plant: lambda: df}
+                        if export_all:
+                            export_sources.update(
+                                (p, export_source(p)) for p in PLANTS if p != plant and connect_storage(p)
+                            )
+                        ext, mime = EXPORT_FORMATS[export_format]
+                        st.download_button(
+                            "📥 Baixar relatório",
+                            data=partial(export_file, export_sources, export_period[0], export_period[1],
+                                         export_level, ext, (tarifa_cheia, tarifa_fio_b, fator_simultaneidade)),
+                            file_name=f"solar_{export_level}_{export_period[0]:%Y%m%d}_{export_period[1]:%Y%m%d}.{ext}",
+                            mime=mime,
+                            key='export_download',
+                        )
+
                 if st.session_state.edit_mode:
                     st.divider()
                     st.subheader("✏️ Editar Registros")
                     
-                    if len(filtered_df) > 0:
-                        selected_index = st.selectbox(
-                            "Selecione o registro", 
-                            options=range(len(filtered_df)),
-                            format_func=lambda x: f"{filtered_df.iloc[x]['Data'].strftime('%d/%m/%Y')} - {format_number_br(filtered_df.iloc[x]['Energia Gerada (kWh)'])} kWh"
+                    month_start = pd.Timestamp(selected_year, selected_month_num, 1)
+                    edit_period = st.date_input(
+                        "📅 Período", format="DD/MM/YYYY",
+                        value=(month_start, month_start + pd.Timedelta(days=month_start.days_in_month - 1))
+                    )
+                    if len(edit_period) == 2:
+                        grid_df = filtrar_periodo(df, *edit_period)[['Data', 'Energia Gerada (kWh)']]
+                        st.caption("Altere valores ou datas, inclua linhas no fim da grade ou exclua as selecionadas; "
+                                   "tudo é gravado de uma vez.")
+                        # A chave muda a cada gravação: o editor recomeça sobre os dados já atualizados
+                        edited_df = st.data_editor(
+                            grid_df,
+                            num_rows="dynamic",
+                            hide_index=True,
+                            use_container_width=True,
+                            key=f"grid_{edit_period[0]}_{edit_period[1]}_{st.session_state.grid_nonce}",
+                            column_config={
+                                'Data': st.column_config.DateColumn("📅 Data", format="DD/MM/YYYY", required=True),
+                                'Energia Gerada (kWh)': st.column_config.NumberColumn(
+                                    "⚡ Energia (kWh)", min_value=0.0, step=0.01, format="%.2f", required=True
+                                ),
+                            },
                         )
+                        grid_diff = diff_registros(grid_df, edited_df)
                         
-                        col1, col2, col3 = st.columns(3)
-                        
-                        with col1:
-                            edit_date = st.date_input("📅 Data", 
-                                value=filtered_df.iloc[selected_index]['Data'], 
-                                format="DD/MM/YYYY")
-                            
-                        with col2:
-                            edit_energy = st.number_input("⚡ Energia (kWh)", 
-                                value=float(filtered_df.iloc[selected_index]['Energia Gerada (kWh)']), 
-                                min_value=0.0, step=0.1, format="%.2f")
+                        if len(grid_diff['invalidas']):
+                            st.warning(f"⚠️ {len(grid_diff['invalidas'])} linha(s) sem data ou com valor inválido.")
+                        if grid_diff['repetidas']:
+                            st.warning("⚠️ Dia(s) repetido(s) na grade: " +
+                                       ", ".join(d.strftime('%d/%m/%Y') for d in grid_diff['repetidas']))
                         
-                        with col3:
-                            st.write("")
-                            save_col, delete_col = st.columns(2)
-                            
-                            with save_col:
-                                if st.button("💾 Salvar", use_container_width=True):
-                                    original_index = filtered_df.index[selected_index]
-                                    if update_data(original_index, edit_date, edit_energy):
-                                        st.success("✅ Atualizado!")
-                                        st.session_state.edit_mode = False
-                                        time.sleep(1)
-                                        st.rerun()
-                            
-                            with delete_col:
-                                if st.button("🗑️ Excluir", use_container_width=True):
-                                    original_index = filtered_df.index[selected_index]
-                                    if delete_data(original_index):
-                                        st.success("✅ Excluído!")
-                                        st.session_state.edit_mode = False
-                                        time.sleep(1)
-                                        st.rerun()
+                        n_changes = grid_diff['alterados'] + grid_diff['incluidos'] + grid_diff['excluidos']
+                        st.caption(f"✏️ {grid_diff['alterados']} alterado(s) · ➕ {grid_diff['incluidos']} incluído(s) · "
+                                   f"🗑️ {grid_diff['excluidos']} excluído(s)")
+                        blocked = bool(len(grid_diff['invalidas']) or grid_diff['repetidas'])
+                        if st.button("💾 Gravar alterações", disabled=not n_changes or blocked,
+                                     use_container_width=True, key='grid_commit'):
+                            if save_grid_edits(grid_diff):
+                                st.session_state.grid_nonce += 1
+                                st.success(f"✅ {n_changes} alteração(ões) enfileirada(s) para gravação!")
+                                st.rerun()
     
     # --- RESUMO ANUAL COMPLETO (Métricas + Gráfico Largo) ---
-    year_df = df[df['Data'].dt.year == selected_year].copy()
-    
-    if not year_df.empty:
-        # Cálculos para as métricas anuais
-        monthly_summary = year_df.groupby(
-            year_df['Data'].dt.month
-        )['Energia Gerada (kWh)'].sum().reset_index()
-        
-        monthly_summary.rename(columns={'Data': 'Mês'}, inplace=True)
-        monthly_summary['Nome Mês'] = monthly_summary['Mês'].apply(
-            lambda m: month_names[m][:3]
-        )
+    if selected_year in rollup.years:
+        # Cálculos para as métricas anuais (direto do cubo de agregados)
+        year_stats = rollup.years[selected_year]
+        monthly_summary = rollup.monthly_summary(selected_year)
+        monthly_summary['Nome Mês'] = monthly_summary['Mês'].map(lambda m: month_names[m][:3])
 
-        total_ano = year_df['Energia Gerada (kWh)'].sum()
-        media_mensal = monthly_summary['Energia Gerada (kWh)'].mean()
-        melhor_mes = monthly_summary.loc[monthly_summary['Energia Gerada (kWh)'].idxmax()]
-        pior_mes = monthly_summary.loc[monthly_summary['Energia Gerada (kWh)'].idxmin()]
+        total_ano = year_stats['total']
+        media_mensal = year_stats['monthly_mean']
+        melhor_mes = monthly_summary.set_index('Mês').loc[year_stats['best_month']]
+        pior_mes = monthly_summary.set_index('Mês').loc[year_stats['worst_month']]
 
         st.markdown(f"""
         <div class="subheader-container purple">
@@ -927,40 +1230,7 @@ else:
                       delta=pior_mes['Nome Mês'], delta_color="inverse")
         
         # --- GRÁFICO MENSAL (BARRAS LARGAS) ---
-        monthly_bars = alt.Chart(monthly_summary).mark_bar(
-            color="#f59e0b",
-            cornerRadiusTopLeft=2,
-            cornerRadiusTopRight=2,
-            stroke="black",
-            strokeWidth=1,
-        ).encode(
-            x=alt.X(
-                'Nome Mês:N', 
-                title='',
-                sort=[m[:3] for m in month_names.values()],
-                scale=alt.Scale(padding=0.05) # Barras largas
-            ),
-            y=alt.Y('Energia Gerada (kWh):Q', title=''),
-            tooltip=[
-                alt.Tooltip('Nome Mês:N', title='Mês'), 
-                alt.Tooltip('Energia Gerada (kWh):Q', title='Total', format='.2f')
-            ]
-        )
-        
-        linha_media_mensal = alt.Chart(pd.DataFrame({'media': [media_mensal]})).mark_rule(
-            color='red',
-            strokeWidth=2,
-        ).encode(
-            y=alt.Y('media:Q'),
-            tooltip=alt.value(f'Média Mensal: {format_number_br(media_mensal)} kWh')
-        )
-        
-        monthly_chart = (monthly_bars + linha_media_mensal).properties(
-            height=400,
-            title=''
-        )
-        
-        st.altair_chart(monthly_chart, use_container_width=True)
+        render_chart('mensal', data_version, year=selected_year)
         st.divider()
         
         # --- HEATMAP ATUALIZADO ---
@@ -970,96 +1240,10 @@ else:
         </div>
         """, unsafe_allow_html=True)
         
-        # Criação do calendário do ano inteiro
-        start_date = datetime(selected_year, 1, 1)
-        end_date = datetime(selected_year, 12, 31)
-        all_dates = pd.date_range(start=start_date, end=end_date, freq='D')
-        heatmap_df = pd.DataFrame({'date': all_dates})
-        
-        year_data_heat = year_df.copy()
-        year_data_heat['date'] = pd.to_datetime(year_data_heat['Data'])
-        heatmap_df = pd.merge(
-            heatmap_df,
-            year_data_heat[['date', 'Energia Gerada (kWh)']],
-            on='date', how='left'
-        ).fillna(0)
-        
-        # Colunas auxiliares
-        heatmap_df['day_of_week'] = heatmap_df['date'].dt.dayofweek
-        heatmap_df['month'] = heatmap_df['date'].dt.month
-        heatmap_df['week_num'] = heatmap_df['date'].dt.isocalendar().week
-        
-        # Ajustes para semanas quebradas
-        heatmap_df.loc[(heatmap_df['week_num'] >= 52) & (heatmap_df['month'] == 1), 'week_num'] = 0
-        heatmap_df.loc[(heatmap_df['week_num'] == 1) & (heatmap_df['month'] == 12), 'week_num'] = 54
-        
-        # Heatmap (retângulos dos dias)
-        heatmap_grid = alt.Chart(heatmap_df).mark_rect(
-            cornerRadius=2,
-            stroke='#d3d3d3',
-            strokeWidth=0.5
-        ).encode(
-            x=alt.X(
-                'week_num:O',
-                title=None,
-                axis=alt.Axis(labels=False, ticks=False, domain=False),
-                scale=alt.Scale(padding=0.02)
-            ),
-            y=alt.Y(
-                'day_of_week:O',
-                title=None,
-                axis=alt.Axis(
-                    labelExpr="['Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom'][datum.value]",
-                    ticks=False,
-                    domain=False 
-                ),
-                scale=alt.Scale(padding=0.04)
-            ),
-            color=alt.condition(
-                alt.datum['Energia Gerada (kWh)'] > 0,
-                alt.Color(
-                    'Energia Gerada (kWh):Q',
-                    scale=alt.Scale(
-                        scheme='yellowgreen', # Corrigido para yellowgreen (seguro)
-                        domainMin=7, # Ajustado para 7 (claro)
-                        domainMax=28 # Ajustado para 28 (escuro)
-                    ),
-                    legend=alt.Legend(title="kWh Gerado")
-                ),
-                alt.value('#eeeeee')
-            ),
-            tooltip=[
-                alt.Tooltip('date:T', title='Data', format='%d/%m/%Y'),
-                alt.Tooltip('Energia Gerada (kWh):Q', title='Geração', format='.2f')
-            ]
-        ).properties(height=250)
-        
-        # Rótulos dos meses acima do primeiro dia de cada mês
-        month_starts = heatmap_df.groupby('month').agg(first_week=('week_num', 'min')).reset_index()
-        month_starts['month_name'] = month_starts['month'].apply(lambda m: month_names[m][:3])
-        
-        month_labels_chart = alt.Chart(month_starts).mark_text(
-            align='left', baseline='bottom', dx=1,
-            font='Nunito', fontSize=11, color='#6b7280'
-        ).encode(
-            x=alt.X('first_week:O', title=None, axis=None),
-            text='month_name:N'
-        ).properties(height=15)
-        
-        # Combinação final
-        final_heatmap = alt.vconcat(
-            month_labels_chart,
-            heatmap_grid,
-            spacing=25
-        ).properties(
-            title=''
-        ).resolve_scale(
-            x='shared'
-        ).configure_view(
-            strokeWidth=0
-        )
-        
-        st.altair_chart(final_heatmap, use_container_width=True)
+        heatmap_years = st.multiselect(
+            "Anos exibidos", options=years, default=[selected_year]
+        ) or [selected_year]
+        render_chart('heatmap', data_version, years=tuple(sorted(heatmap_years)))
         st.divider()
         
         # --- Análise de Viabilidade Econômica (ATUALIZADA COM LEI 14.300) ---
@@ -1070,47 +1254,36 @@ else:
         """, unsafe_allow_html=True)
         
         # Cálculos básicos
-        year_total = year_df['Energia Gerada (kWh)'].sum()
-        
-        # LÓGICA FINANCEIRA FIO B
-        financas_periodo = calcular_economia_lei14300(year_total, tarifa_cheia, tarifa_fio_b, fator_simultaneidade)
-        economia_anual_reais = financas_periodo['economia_reais']
-        
-        # Payback simples (anos)
-        payback_simples = investimento_inicial / economia_anual_reais if economia_anual_reais > 0 else 0
-        
-        # Economia total em 25 anos
-        vida_util = 25
-        economia_total_25_anos = economia_anual_reais * vida_util
+        year_total = year_stats['total']
         
-        # ROI
-        roi_percentual = ((economia_total_25_anos - investimento_inicial) / investimento_inicial) * 100 if investimento_inicial > 0 else 0
-        
-        # Tempo decorrido desde instalação
-        hoje = datetime.now()
-        meses_funcionamento = max(1, (hoje.year - data_instalacao.year) * 12 + (hoje.month - data_instalacao.month))
-        
-        # Valor já economizado (Considerando todo o histórico do DF principal)
-        total_historico = df['Energia Gerada (kWh)'].sum()
-        financas_historico = calcular_economia_lei14300(total_historico, tarifa_cheia, tarifa_fio_b, fator_simultaneidade)
-        valor_ja_economizado = financas_historico['economia_reais']
-        
-        percentual_recuperado = (valor_ja_economizado / investimento_inicial) * 100
-        
-        # TIR estimada
-        tir_anual = (economia_anual_reais / investimento_inicial) * 100
+        # LÓGICA FINANCEIRA FIO B (os mesmos indicadores do CLI, calculados em solar_core)
+        vida_util = VIDA_UTIL_ANOS
+        with PROFILER.span('financeiro.indicadores'):
+            indicadores = indicadores_financeiros(
+                year_total, {y: s['total'] for y, s in rollup.years.items()}, tarifa_cheia, tarifa_fio_b,
+                fator_simultaneidade, investimento_inicial, degradacao_anual / 100, data_instalacao,
+                reajuste_tarifa=reajuste_tarifa / 100, taxa_desconto=taxa_desconto / 100, anos=vida_util,
+                ano=selected_year
+            )
+        economia_anual_reais = indicadores['economia_reais']
+        payback_simples = indicadores['payback_simples']
+        economia_total_25_anos = indicadores['economia_vida_util']
+        roi_percentual = indicadores['roi']
+        valor_ja_economizado = indicadores['ja_economizado']
+        percentual_recuperado = indicadores['percentual_recuperado']
+        tir_anual = indicadores['tir'] * 100
         
         col1, col2, col3 = st.columns(3)
         
         with col1:
             st.metric("💰 Economia Líquida (Ano)", f"R$ {format_number_br(economia_anual_reais)}")
             st.metric("⏱️ Payback Simples", f"{payback_simples:.1f} anos")
-            st.metric("💸 Taxa Paga (Fio B)", f"R$ {format_number_br(financas_periodo['taxa_paga'])}")
+            st.metric("💸 Taxa Paga (Fio B)", f"R$ {format_number_br(indicadores['taxa_paga'])}")
         
         with col2:
             st.metric("📈 ROI (25 anos)", f"{roi_percentual:.1f}%")
             st.metric("⚡ Fator Simultaneidade", f"{fator_simultaneidade}%")
-            st.metric("🎯 TIR Estimada", f"{tir_anual:.1f}% a.a.")
+            st.metric("🎯 TIR", f"{tir_anual:.1f}% a.a." if np.isfinite(tir_anual) else "—")
         with col3:
             st.metric("💵 Já Economizado (Total)", f"R$ {format_number_br(valor_ja_economizado)}")
             st.metric("🔄 Investimento Recuperado", f"{percentual_recuperado:.1f}%")
@@ -1125,6 +1298,8 @@ else:
                 <li><strong>⚡ Fator Simultaneidade:</strong> Porcentagem da energia consumida instantaneamente (não paga taxa). Quanto maior, melhor.</li>
                 <li><strong>⏱️ Payback Simples:</strong> Tempo para o sistema se pagar com a economia atual.</li>
                 <li><strong>📈 ROI:</strong> Retorno sobre o investimento em 25 anos.</li>
+                <li><strong>🎯 TIR:</strong> Taxa que zera o VPL do fluxo de 25 anos, com reajuste tarifário e a transição do Fio B ano a ano.</li>
+                <li><strong>💎 VPL:</strong> Soma dos fluxos descontados pela taxa de desconto, menos o investimento.</li>
             </ul>
         </div>
         """, unsafe_allow_html=True)
@@ -1133,50 +1308,132 @@ else:
         st.markdown("##### 📈 Fluxo de Caixa Projetado (25 anos)")
         
         # Criando dados para o gráfico de fluxo de caixa
-        anos = list(range(0, vida_util + 1))
-        fluxo_caixa_acumulado = [-investimento_inicial]
-        
-        for ano in range(1, vida_util + 1):
-            # Degradação dos painéis (0.5% ao ano)
-            fator_degradacao = (1 - 0.005) ** ano
-            economia_ano = economia_anual_reais * fator_degradacao
-            fluxo_caixa_acumulado.append(fluxo_caixa_acumulado[-1] + economia_ano)
-        
         fluxo_df = pd.DataFrame({
-            'Ano': anos,
-            'Fluxo de Caixa Acumulado': fluxo_caixa_acumulado
+            'Ano': np.arange(vida_util + 1),
+            'Fluxo de Caixa Acumulado': indicadores['fluxo_acumulado']
         })
         
-        # Gráfico de linha para fluxo de caixa
-        fluxo_chart = alt.Chart(fluxo_df).mark_line(
-            color='#10b981',
-            strokeWidth=2,
-            point={'filled': True, 'size': 50}
-        ).encode(
-            x=alt.X('Ano:O', title=''),
-            y=alt.Y('Fluxo de Caixa Acumulado:Q', title=''),
-            tooltip=[
-                alt.Tooltip('Ano:O', title='Ano'),
-                alt.Tooltip('Fluxo de Caixa Acumulado:Q', title='Acumulado', format=',.0f')
-            ]
-        )
+        render_chart('fluxo', None, fluxo=tuple(fluxo_df['Fluxo de Caixa Acumulado'].round(2)))
         
-        # Linha do zero (break-even)
-        linha_zero = alt.Chart(pd.DataFrame({'zero': [0]})).mark_rule(
-            color='red',
-            strokeWidth=1,
-            strokeDash=[5, 5]
-        ).encode(
-            y=alt.Y('zero:Q'),
-            tooltip=alt.value('Break-even')
-        )
-        
-        fluxo_final = (fluxo_chart + linha_zero).properties(
-            height=350,
-            title=''
-        )
+        # Análise de Sensibilidade (todos os cenários numa única chamada vetorizada)
+        with st.expander("🎛️ Análise de Sensibilidade do Payback"):
+            variacao = st.slider("Variação dos parâmetros (±%)", 5, 50, 20, step=5) / 100
+            parametros_base = {
+                'geracao_anual': year_total,
+                'tarifa_cheia': tarifa_cheia,
+                'tarifa_fio_b': tarifa_fio_b,
+                'simultaneidade_percent': fator_simultaneidade,
+                'investimento': investimento_inicial,
+                'degradacao': degradacao_anual / 100,
+            }
+            rotulos = {
+                'geracao_anual': 'Geração Anual',
+                'tarifa_cheia': 'Tarifa Cheia',
+                'tarifa_fio_b': 'Tarifa Fio B',
+                'simultaneidade_percent': 'Simultaneidade',
+                'investimento': 'Investimento',
+                'degradacao': 'Degradação',
+            }
+            with PROFILER.span('financeiro.sensibilidade'):
+                payback_base, tornado = sensibilidade_payback(
+                    parametros_base, variacao, vida_util,
+                    ano_inicio=data_instalacao.year, reajuste_tarifa=reajuste_tarifa / 100
+                )
+            tornado['Parâmetro'] = tornado['Parâmetro'].map(rotulos)
+            tornado = tornado.replace([np.inf, -np.inf], np.nan)
+            
+            st.markdown(f"**Payback base:** {payback_base:.1f} anos — barras mostram o payback com cada parâmetro a −{variacao:.0%} e +{variacao:.0%}.")
+            tornado_chart = alt.Chart(tornado).mark_bar(
+                color='#ec4899',
+                cornerRadius=2
+            ).encode(
+                y=alt.Y('Parâmetro:N', sort=None, title=''),
+                x=alt.X('Baixo:Q', title='', scale=alt.Scale(zero=False)),
+                x2='Alto:Q',
+                tooltip=[
+                    alt.Tooltip('Parâmetro:N'),
+                    alt.Tooltip('Baixo:Q', title=f'−{variacao:.0%}', format='.1f'),
+                    alt.Tooltip('Alto:Q', title=f'+{variacao:.0%}', format='.1f')
+                ]
+            )
+            linha_base = alt.Chart(pd.DataFrame({'base': [payback_base]})).mark_rule(
+                color='red', strokeDash=[5, 5]
+            ).encode(x='base:Q')
+            st.altair_chart((tornado_chart + linha_base).properties(height=250), use_container_width=True)
+            
+            # Grade tarifa × simultaneidade: centenas de cenários numa única chamada
+            st.markdown("**Payback (anos) por Tarifa Cheia × Simultaneidade**")
+            grade_tarifa, grade_simult = np.meshgrid(
+                np.linspace(tarifa_cheia * (1 - variacao), tarifa_cheia * (1 + variacao), 21),
+                np.arange(0, 101, 5)
+            )
+            with PROFILER.span('financeiro.grade'):
+                grade = projetar_cenarios(year_total, grade_tarifa, tarifa_fio_b, grade_simult,
+                                          investimento_inicial, degradacao_anual / 100, vida_util,
+                                          ano_inicio=data_instalacao.year,
+                                          reajuste_tarifa=reajuste_tarifa / 100)
+            grade_df = pd.DataFrame({
+                'Tarifa (R$/kWh)': grade_tarifa.ravel().round(4),
+                'Simultaneidade (%)': grade_simult.ravel(),
+                'Payback (anos)': np.where(np.isfinite(grade['payback']), grade['payback'], np.nan).ravel(),
+            })
+            grade_chart = alt.Chart(grade_df).mark_rect().encode(
+                x=alt.X('Tarifa (R$/kWh):O', title='', axis=alt.Axis(format='.2f', labelAngle=-45)),
+                y=alt.Y('Simultaneidade (%):O', title='', sort='descending'),
+                color=alt.Color('Payback (anos):Q', scale=alt.Scale(scheme='redyellowgreen', reverse=True)),
+                tooltip=[
+                    alt.Tooltip('Tarifa (R$/kWh):Q', format='.4f'),
+                    alt.Tooltip('Simultaneidade (%):Q'),
+                    alt.Tooltip('Payback (anos):Q', format='.1f')
+                ]
+            ).properties(height=300)
+            st.altair_chart(grade_chart, use_container_width=True)
         
-        st.altair_chart(fluxo_final, use_container_width=True)
+        # Simulação de risco de geração (Monte Carlo sobre o histórico diário)
+        with st.expander("🎲 Simulação de Risco de Geração (Monte Carlo)"):
+            col_mc1, col_mc2 = st.columns([1, 3])
+            with col_mc1:
+                n_caminhos = st.selectbox("Trajetórias", [1000, 5000, 10000, 20000], index=1)
+                rodar_mc = st.toggle("Executar simulação", value=False)
+            with col_mc2:
+                st.caption("Cada trajetória sorteia, para cada um dos 25 anos, dias reais do histórico "
+                           "do mesmo mês do ano — preserva a sazonalidade e a variabilidade observadas.")
+            if rodar_mc:
+                with PROFILER.span('financeiro.monte_carlo'):
+                    mc = simular_monte_carlo(
+                        plant,
+                        get_dataset_revision(plant).current(), n_caminhos, vida_util,
+                        tarifa_cheia, tarifa_fio_b, fator_simultaneidade,
+                        investimento_inicial, degradacao_anual / 100,
+                        data_instalacao.year, reajuste_tarifa / 100
+                    )
+                col_p1, col_p2, col_p3, col_p4 = st.columns(4)
+                for col_p, rotulo in zip((col_p1, col_p2, col_p3), ('P10', 'P50', 'P90')):
+                    valor = mc['payback'][rotulo]
+                    col_p.metric(f"⏱️ Payback {rotulo}", f"{valor:.1f} anos" if np.isfinite(valor) else "—")
+                col_p4.metric("✅ Chance de Payback", f"{mc['prob_payback'] * 100:.0f}%")
+                
+                faixa_chart = alt.Chart(mc['faixas']).mark_area(
+                    color='#10b981', opacity=0.25
+                ).encode(
+                    x=alt.X('Ano:O', title=''),
+                    y=alt.Y('P10:Q', title=''),
+                    y2='P90:Q',
+                    tooltip=[
+                        alt.Tooltip('Ano:O', title='Ano'),
+                        alt.Tooltip('P10:Q', format=',.0f'),
+                        alt.Tooltip('P50:Q', format=',.0f'),
+                        alt.Tooltip('P90:Q', format=',.0f')
+                    ]
+                )
+                mediana_chart = alt.Chart(mc['faixas']).mark_line(
+                    color='#10b981', strokeWidth=2
+                ).encode(x='Ano:O', y='P50:Q')
+                linha_zero = alt.Chart(pd.DataFrame({'zero': [0]})).mark_rule(
+                    color='red', strokeWidth=1, strokeDash=[5, 5]
+                ).encode(y='zero:Q')
+                st.altair_chart((faixa_chart + mediana_chart + linha_zero).properties(height=300),
+                                use_container_width=True)
         
         # Análises Complementares
         st.markdown("##### 🔍 Indicadores de Performance")
@@ -1184,8 +1441,7 @@ else:
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            vpl_simples = economia_total_25_anos - investimento_inicial
-            st.metric("💎 VPL Simples", f"R$ {format_number_br(vpl_simples)}")
+            st.metric(f"💎 VPL ({taxa_desconto:.1f}% a.a.)", f"R$ {format_number_br(indicadores['vpl'])}")
         
         with col2:
             custo_energia_rede_25_anos = 363.88 * 12 * tarifa_cheia * vida_util # Usando média fixa antiga ou poderia ser input
@@ -1198,9 +1454,82 @@ else:
             st.metric("⚡ Produtividade", f"{format_number_br(produtividade_anual)} kWh/kW.ano")
         
         with col4:
-            tempo_restante_payback = max(0, payback_simples - (meses_funcionamento / 12))
+            tempo_restante_payback = indicadores['restante_payback']
             st.metric("⏳ Restam p/ Payback", f"{tempo_restante_payback:.1f} anos")
 
+# — Curva do Inversor (intraday) —
+st.markdown("""
+<div class="subheader-container orange">
+    <h2>⚡ Curva do Inversor</h2>
+</div>
+""", unsafe_allow_html=True)
+
+intraday = get_intraday_store(plant)
+with st.expander("📤 Importar leituras do inversor (CSV)"):
+    st.caption("Colunas 'data' (dd/mm/aaaa hh:mm) e 'potencia' (kW) ou 'energia' (kWh do intervalo), "
+               "como exportadas pelo inversor. Leituras já importadas são substituídas.")
+    arquivo = st.file_uploader("Arquivo de leituras", type=['csv', 'txt'], key='intraday_upload')
+    if arquivo is not None:
+        try:
+            with PROFILER.span('intraday.validacao'):
+                leituras, descartadas = read_intraday_csv(arquivo)
+        except ValueError as e:
+            st.error(f"⚠️ **Arquivo inválido**: {str(e)}")
+        else:
+            # O arquivo continua no uploader a cada rerun: grava só na primeira vez
+            upload_key = (plant, arquivo.file_id)
+            if st.session_state.get('intraday_imported') != upload_key:
+                with PROFILER.span('intraday.gravacao'):
+                    intraday.ingest(leituras)
+                st.session_state.intraday_imported = upload_key
+            st.success(f"✅ {len(leituras)} leituras importadas"
+                       + (f" ({descartadas} linha(s) inválida(s) ignorada(s))" if descartadas else ""))
+
+            diario_inversor = integrar_diario(leituras['Instante'], leituras['Potência (kW)'],
+                                              energia=leituras.get('Energia (kWh)'))
+            novos, conflitos = dias_para_lancar(diario_inversor, df)
+            if not novos.empty:
+                st.markdown(f"**{len(novos)} dia(s) sem registro diário**, com a energia integrada das leituras:")
+                st.dataframe(novos, hide_index=True, use_container_width=True,
+                             column_config={'Data': st.column_config.DateColumn(format="DD/MM/YYYY")})
+                if st.button(f"📥 Lançar {len(novos)} dia(s) no histórico", key='intraday_lancar'):
+                    if append_days(novos):
+                        st.success("✅ Dias enfileirados para gravação!")
+                        st.rerun()
+            if not conflitos.empty:
+                st.warning(f"⚠️ {len(conflitos)} dia(s) já registrados com valor diferente do integrado "
+                           "(não são alterados):")
+                st.dataframe(conflitos, hide_index=True, use_container_width=True,
+                             column_config={'Data': st.column_config.DateColumn(format="DD/MM/YYYY")})
+
+intraday_span = intraday.span()
+if intraday_span is None:
+    st.info("🔌 Nenhuma leitura do inversor importada para esta usina.")
+else:
+    periodo = st.date_input(
+        "📅 Período da curva", value=(intraday_span[1], intraday_span[1]),
+        min_value=intraday_span[0], max_value=intraday_span[1], format="DD/MM/YYYY"
+    )
+    inicio = periodo[0] if periodo else intraday_span[1]
+    fim = periodo[1] if len(periodo) > 1 else inicio
+    with PROFILER.span('intraday.curva'):
+        instantes, potencia, n_leituras, energia_periodo = intraday_curve(
+            plant, intraday.revision(), pd.Timestamp(inicio),
+            pd.Timestamp(fim) + timedelta(days=1, seconds=-1)
+        )
+    if not n_leituras:
+        st.info("Sem leituras no período selecionado.")
+    else:
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("🔋 Energia no Período", f"{format_number_br(energia_periodo['Energia Gerada (kWh)'].sum())} kWh")
+        with col2:
+            st.metric("⚡ Pico de Potência", f"{format_number_br(max(potencia))} kW")
+        with col3:
+            st.metric("📈 Leituras", f"{n_leituras}")
+        render_chart('intraday', None, instantes=instantes, potencia=potencia)
+        st.caption(f"{n_leituras} leituras exibidas como {len(instantes)} pontos (redução LTTB).")
+
 # — Footer —
 st.divider()
 st.markdown(f"""
@@ -1225,9 +1554,65 @@ if not df.empty:
     st.sidebar.metric("📆 Período", f"{df['Data'].min().strftime('%m/%Y')} - {df['Data'].max().strftime('%m/%Y')}")
     st.sidebar.metric("⚡ Total", f"{format_number_br(df['Energia Gerada (kWh)'].sum())} kWh")
 
+data_sync = get_sheet_sync(plant)
+if data_sync.age() is not None:
+    minutes = int(data_sync.age() // 60)
+    age_text = "agora há pouco" if minutes < 1 else f"há {minutes} min"
+    status_text = " · 🔄 revalidando…" if data_sync.refreshing else ""
+    st.sidebar.caption(f"🕒 Dados atualizados {age_text}{status_text}")
+    if data_sync.last_error:
+        st.sidebar.warning(f"⚠️ Última revalidação falhou: {data_sync.last_error}")
+
+rejected_rows = data_sync.rejected
+if len(rejected_rows):
+    with st.sidebar.expander(f"🚫 {len(rejected_rows)} linha(s) ignorada(s) na planilha"):
+        st.dataframe(rejected_rows, hide_index=True, use_container_width=True)
+
+if pending_writes:
+    st.sidebar.info(f"⏳ {len(pending_writes)} gravação(ões) pendente(s)")
+    write_error = get_write_queue(plant).last_error
+    if write_error:
+        st.sidebar.warning(f"🔁 Nova tentativa em andamento: {write_error}")
+
+failed_writes = get_write_queue(plant).dead()
+if failed_writes:
+    with st.sidebar.expander(f"❌ {len(failed_writes)} gravação(ões) com falha", expanded=True):
+        st.caption("Saíram da fila para não travar as gravações seguintes.")
+        for i, falha in enumerate(failed_writes):
+            datas = ', '.join(falha['op'].get('dates', [])[:5]) or 'planilha inteira'
+            st.markdown(f"**{falha['op'].get('op', '?')}** · {datas}  \n{falha['erro']} "
+                        f"({falha['tentativas']} tentativa(s), {falha['em']})")
+            col1, col2 = st.columns(2)
+            if col1.button("🔁 Tentar de novo", key=f"dead_retry_{i}", use_container_width=True):
+                get_write_queue(plant).retry_dead(i)
+                st.rerun()
+            if col2.button("🗑️ Descartar", key=f"dead_discard_{i}", use_container_width=True):
+                get_write_queue(plant).discard_dead(i)
+                st.rerun()
+
+discarded_writes = get_write_queue(plant).discarded
+if discarded_writes:
+    st.sidebar.warning(
+        f"⚠️ Edição/exclusão descartada: registro de {', '.join(discarded_writes)} não existe mais na planilha."
+    )
+
 st.sidebar.markdown("### 🔧 Controles")
+duplicate_rows = data_sync.duplicate_rows
+if duplicate_rows >= COMPACT_MIN_DUPLICATES:
+    # Compactação automática, na thread da fila de escrita (uma por vez)
+    get_write_queue(plant).request_compaction()
+if st.sidebar.button(f"🧹 Compactar planilha ({duplicate_rows} duplicada(s))", disabled=not duplicate_rows):
+    if get_write_queue(plant).request_compaction():
+        st.sidebar.success("✅ Compactação agendada.")
+
 if st.sidebar.button("🔄 Atualizar"):
-    st.cache_data.clear()
+    get_sheet_sync(plant).invalidate()
+    with st.spinner("📊 Carregando dados…"):
+        try:
+            get_sheet_sync(plant).refresh()
+        except Exception as e:
+            st.error(f"🚨 **Erro ao carregar dados**: {str(e)}")
+    get_dataset_revision(plant).bump()
     configure_altair_theme()
     st.rerun()
 
@@ -1235,3 +1620,25 @@ if st.session_state.edit_mode:
     if st.sidebar.button("❌ Sair do Modo Edição"):
         st.session_state.edit_mode = False
         st.rerun()
+
+# — Painel de Desempenho —
+st.sidebar.markdown("### ⏱️ Desempenho")
+st.sidebar.toggle("Painel de desempenho", key="perf_debug",
+                  help="Mede leitura da planilha, agregações, gráficos e gravações a cada execução")
+if perf_run is not None and st.session_state.get('perf_debug'):
+    with st.sidebar.expander("🐞 Spans desta execução", expanded=True):
+        spans = pd.DataFrame(perf_run, columns=['span', 'ms', 'nivel'])
+        spans['span'] = ['\u2003' * nivel + nome for nome, nivel in zip(spans['span'], spans['nivel'])]
+        st.dataframe(spans[['span', 'ms']], hide_index=True, use_container_width=True)
+    with st.sidebar.expander("📈 p50 / p95 por span"):
+        resumo = pd.DataFrame.from_dict(PROFILER.summary(), orient='index')
+        st.dataframe(resumo.round(2), use_container_width=True)
+        cota = SHEETS_QUOTA.stats
+        st.caption(f"API do Sheets: {cota['requisicoes']} requisições, {cota['novas_tentativas']} novas tentativas, "
+                   f"{cota['coalescidas']} leituras coalescidas, {cota['espera_s']:.1f} s de espera pela cota")
+        st.download_button("📥 OpenMetrics", PROFILER.openmetrics(), file_name='solar_metrics.txt',
+                           mime='application/openmetrics-text', use_container_width=True)
+        if st.button("🧹 Zerar medições", use_container_width=True):
+            PROFILER.reset()
+
+PROFILER.end_run(usina=plant)
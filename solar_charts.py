@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""Gráficos do painel (Altair), montados a partir do cubo de agregados.
+
+Sem dependência do Streamlit: o painel guarda as especificações em cache e os
+benchmarks medem a montagem diretamente.
+"""
+
+import pandas as pd
+import numpy as np
+import altair as alt
+
+from solar_core import MONTH_NAMES, calendar_grid, format_number_br
+
+# — Gráficos —
+def chart_daily(cube, year, month):
+    """Geração diária do mês (barras largas) com a linha da média"""
+    bar_chart = alt.Chart(cube.month_frame(year, month)[['Data', 'Energia Gerada (kWh)']]).mark_bar(
+        color="green",
+        cornerRadiusTopLeft=3,
+        cornerRadiusTopRight=3,
+        stroke="black",
+        strokeWidth=1,
+    ).encode(
+        x=alt.X(
+            'Data:O',  # Ordinal
+            timeUnit='date', # Dia (1, 2, 3...)
+            title='', 
+            axis=alt.Axis(labelAngle=0), 
+            scale=alt.Scale(padding=0.05) # 0.05 = Barras largas
+        ),
+        y=alt.Y('Energia Gerada (kWh):Q', title=''),
+        tooltip=[
+            alt.Tooltip('Data:T', title='Data', format='%d/%m/%Y'), 
+            alt.Tooltip('Energia Gerada (kWh):Q', title='Energia', format='.2f')
+        ]
+    )
+
+    media_diaria = cube.months[(year, month)]['mean']
+    linha_media = alt.Chart(pd.DataFrame({'media': [media_diaria]})).mark_rule(
+        color='red',
+        strokeWidth=2,
+    ).encode(
+        y=alt.Y('media:Q'),
+        tooltip=alt.value(f'Média: {format_number_br(media_diaria)} kWh')
+    )
+
+    return (bar_chart + linha_media).properties(
+        height=400,
+        title=''
+    )
+
+def chart_month_cumulative(cube, year, month):
+    """Geração acumulada ao longo do mês"""
+    return alt.Chart(cube.month_frame(year, month)).mark_area(
+        line={'color':'darkgreen'},
+        color=alt.Gradient(
+            gradient='linear',
+            stops=[alt.GradientStop(color='white', offset=0),
+                   alt.GradientStop(color='darkgreen', offset=1)],
+            x1=1,
+            x2=1,
+            y1=1,
+            y2=0
+        ),
+        interpolate='monotone'
+    ).encode(
+        x=alt.X('Data:T', title=''),
+        y=alt.Y('Acumulado:Q', title=''),
+        tooltip=[
+            alt.Tooltip('Data:T', title='Data', format='%d/%m/%Y'),
+            alt.Tooltip('Energia Gerada (kWh):Q', title='Geração', format='.2f'),
+            alt.Tooltip('Acumulado:Q', title='Acumulado', format='.2f')
+        ]
+    ).properties(
+        height=400,
+        title=''
+    )
+
+def chart_year_cumulative(cube, year):
+    """Geração acumulada ao longo do ano"""
+    return alt.Chart(cube.year_frame(year)).mark_area(
+        line={'color':'#8b5cf6'},
+        color=alt.Gradient(
+            gradient='linear',
+            stops=[alt.GradientStop(color='white', offset=0),
+                   alt.GradientStop(color='#8b5cf6', offset=1)],
+            x1=1,
+            x2=1,
+            y1=1,
+            y2=0
+        ),
+        interpolate='monotone'
+    ).encode(
+        x=alt.X('Data:T', title=''),
+        y=alt.Y('Acumulado Anual:Q', title=''),
+        tooltip=[
+            alt.Tooltip('Data:T', title='Data', format='%d/%m/%Y'),
+            alt.Tooltip('Energia Gerada (kWh):Q', title='Geração do Dia', format='.2f'),
+            alt.Tooltip('Acumulado Anual:Q', title='Acumulado no Ano', format='.2f')
+        ]
+    ).properties(
+        height=400,
+        title=''
+    )
+
+def chart_monthly(cube, year):
+    """Total por mês do ano (barras largas) com a linha da média mensal"""
+    monthly_summary = cube.monthly_summary(year)
+    monthly_summary['Nome Mês'] = monthly_summary['Mês'].map(lambda m: MONTH_NAMES[m][:3])
+    media_mensal = cube.years[year]['monthly_mean']
+
+    monthly_bars = alt.Chart(monthly_summary[['Nome Mês', 'Energia Gerada (kWh)']]).mark_bar(
+        color="#f59e0b",
+        cornerRadiusTopLeft=2,
+        cornerRadiusTopRight=2,
+        stroke="black",
+        strokeWidth=1,
+    ).encode(
+        x=alt.X(
+            'Nome Mês:N', 
+            title='',
+            sort=[m[:3] for m in MONTH_NAMES.values()],
+            scale=alt.Scale(padding=0.05) # Barras largas
+        ),
+        y=alt.Y('Energia Gerada (kWh):Q', title=''),
+        tooltip=[
+            alt.Tooltip('Nome Mês:N', title='Mês'), 
+            alt.Tooltip('Energia Gerada (kWh):Q', title='Total', format='.2f')
+        ]
+    )
+
+    linha_media_mensal = alt.Chart(pd.DataFrame({'media': [media_mensal]})).mark_rule(
+        color='red',
+        strokeWidth=2,
+    ).encode(
+        y=alt.Y('media:Q'),
+        tooltip=alt.value(f'Média Mensal: {format_number_br(media_mensal)} kWh')
+    )
+
+    return (monthly_bars + linha_media_mensal).properties(
+        height=400,
+        title=''
+    )
+
+def chart_heatmap(cube, years):
+    """Heatmap de calendário de um ou mais anos"""
+    heatmap_df, month_starts = calendar_grid(cube, years)
+    month_starts['month_name'] = month_starts['month'].map(lambda m: MONTH_NAMES[m][:3])
+
+    heatmap_rows = []
+    for heat_year in sorted(years, reverse=True):
+        # Heatmap (retângulos dos dias)
+        year_grid = heatmap_df.loc[heatmap_df['year'] == heat_year, ['date', 'Energia Gerada (kWh)', 'day_of_week', 'week_num']]
+        heatmap_grid = alt.Chart(year_grid).mark_rect(
+            cornerRadius=2,
+            stroke='#d3d3d3',
+            strokeWidth=0.5
+        ).encode(
+            x=alt.X(
+                'week_num:O',
+                title=None,
+                axis=alt.Axis(labels=False, ticks=False, domain=False),
+                scale=alt.Scale(padding=0.02)
+            ),
+            y=alt.Y(
+                'day_of_week:O',
+                title=None,
+                axis=alt.Axis(
+                    labelExpr="['Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom'][datum.value]",
+                    ticks=False,
+                    domain=False 
+                ),
+                scale=alt.Scale(padding=0.04)
+            ),
+            color=alt.condition(
+                alt.datum['Energia Gerada (kWh)'] > 0,
+                alt.Color(
+                    'Energia Gerada (kWh):Q',
+                    scale=alt.Scale(
+                        scheme='yellowgreen', # Corrigido para yellowgreen (seguro)
+                        domainMin=7, # Ajustado para 7 (claro)
+                        domainMax=28 # Ajustado para 28 (escuro)
+                    ),
+                    legend=alt.Legend(title="kWh Gerado")
+                ),
+                alt.value('#eeeeee')
+            ),
+            tooltip=[
+                alt.Tooltip('date:T', title='Data', format='%d/%m/%Y'),
+                alt.Tooltip('Energia Gerada (kWh):Q', title='Geração', format='.2f')
+            ]
+        ).properties(height=250)
+
+        # Rótulos dos meses acima do primeiro dia de cada mês (vêm prontos do layout)
+        year_label = f"{heat_year} · " if len(years) > 1 else ""
+        year_starts = month_starts[month_starts['year'] == heat_year].copy()
+        year_starts.loc[year_starts['month'] == 1, 'month_name'] = year_label + MONTH_NAMES[1][:3]
+        month_labels_chart = alt.Chart(year_starts[['first_week', 'month_name']]).mark_text(
+            align='left', baseline='bottom', dx=1,
+            font='Nunito', fontSize=11, color='#6b7280'
+        ).encode(
+            x=alt.X('first_week:O', title=None, axis=None),
+            text='month_name:N'
+        ).properties(height=15)
+
+        heatmap_rows.append(alt.vconcat(
+            month_labels_chart,
+            heatmap_grid,
+            spacing=25
+        ).resolve_scale(
+            x='shared'
+        ))
+
+    # Combinação final
+    return alt.vconcat(
+        *heatmap_rows,
+        spacing=35
+    ).properties(
+        title=''
+    ).configure_view(
+        strokeWidth=0
+    )
+
+def chart_cash_flow(cube, fluxo):
+    """Fluxo de caixa acumulado projetado com a linha de break-even"""
+    fluxo_chart = alt.Chart(pd.DataFrame({
+        'Ano': np.arange(len(fluxo)),
+        'Fluxo de Caixa Acumulado': fluxo
+    })).mark_line(
+        color='#10b981',
+        strokeWidth=2,
+        point={'filled': True, 'size': 50}
+    ).encode(
+        x=alt.X('Ano:O', title=''),
+        y=alt.Y('Fluxo de Caixa Acumulado:Q', title=''),
+        tooltip=[
+            alt.Tooltip('Ano:O', title='Ano'),
+            alt.Tooltip('Fluxo de Caixa Acumulado:Q', title='Acumulado', format=',.0f')
+        ]
+    )
+
+    # Linha do zero (break-even)
+    linha_zero = alt.Chart(pd.DataFrame({'zero': [0]})).mark_rule(
+        color='red',
+        strokeWidth=1,
+        strokeDash=[5, 5]
+    ).encode(
+        y=alt.Y('zero:Q'),
+        tooltip=alt.value('Break-even')
+    )
+
+    return (fluxo_chart + linha_zero).properties(
+        height=350,
+        title=''
+    )
+
+def chart_intraday(cube, instantes, potencia):
+    """Curva de potência do inversor (já reduzida por LTTB); instantes em ms desde a época"""
+    return alt.Chart(pd.DataFrame({
+        'Instante': pd.to_datetime(np.asarray(instantes, dtype=np.int64), unit='ms'),
+        'Potência (kW)': potencia
+    })).mark_area(
+        line={'color': '#f59e0b'},
+        color=alt.Gradient(
+            gradient='linear',
+            stops=[alt.GradientStop(color='white', offset=0),
+                   alt.GradientStop(color='#f59e0b', offset=1)],
+            x1=1,
+            x2=1,
+            y1=1,
+            y2=0
+        ),
+        interpolate='linear'
+    ).encode(
+        x=alt.X('Instante:T', title=''),
+        y=alt.Y('Potência (kW):Q', title=''),
+        tooltip=[
+            alt.Tooltip('Instante:T', title='Horário', format='%d/%m/%Y %H:%M'),
+            alt.Tooltip('Potência (kW):Q', title='Potência', format='.2f')
+        ]
+    ).properties(
+        height=350,
+        title=''
+    )
+
+CHART_BUILDERS = {
+    'diario': chart_daily,
+    'acumulado_mes': chart_month_cumulative,
+    'acumulado_ano': chart_year_cumulative,
+    'mensal': chart_monthly,
+    'heatmap': chart_heatmap,
+    'fluxo': chart_cash_flow,
+    'intraday': chart_intraday,
+}
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""Linha de comando do SolarAnalytics: métricas e indicadores financeiros sem o Streamlit.
+
+Exemplos:
+    python solar_cli.py --inicio 2024-01-01 --fim 2024-12-31
+    python solar_cli.py --sqlite solar.db --formato csv --saida mensal.csv
+    python solar_cli.py --config secrets.toml --usina Casa --usina Sítio
+    python solar_cli.py --exportar diario.parquet --nivel diario
+
+A configuração usa o mesmo formato do .streamlit/secrets.toml do painel
+(lista `usinas` e a conta de serviço em `gcp_service_account`).
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from solar_core import (
+    FLEET_MAX_WORKERS, plant_configs, authorize_gspread, open_storage, IncrementalSheetSync,
+    RollupCube, filtrar_periodo, metricas_periodo, metricas_mensais, calcular_economia_lei14300,
+    indicadores_financeiros, PROFILER, configure_perf_logging, EXPORT_LEVELS, export_chunks, write_export,
+)
+
+DEFAULT_CONFIG = os.path.join('.streamlit', 'secrets.toml')
+
+def load_config(path):
+    """Lê a configuração (TOML, ou JSON pela extensão); arquivo ausente = usina única padrão"""
+    if not path or not os.path.exists(path):
+        return {}
+    if path.endswith('.json'):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    import tomllib
+    with open(path, 'rb') as f:
+        return tomllib.load(f)
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d')
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Métricas de geração e indicadores da Lei 14.300 por usina, em JSON ou CSV."
+    )
+    parser.add_argument('--config', default=DEFAULT_CONFIG,
+                        help="arquivo com `usinas` e `gcp_service_account` (padrão: %(default)s)")
+    parser.add_argument('--sqlite', metavar='ARQUIVO',
+                        help="analisa só este banco SQLite, ignorando a configuração")
+    parser.add_argument('--usina', action='append', metavar='NOME',
+                        help="usina a analisar (repetível; padrão: todas)")
+    parser.add_argument('--inicio', type=parse_date, metavar='AAAA-MM-DD')
+    parser.add_argument('--fim', type=parse_date, metavar='AAAA-MM-DD')
+    parser.add_argument('--formato', choices=('json', 'csv'), default='json',
+                        help="json: resumo completo; csv: uma linha por usina e mês")
+    parser.add_argument('--saida', metavar='ARQUIVO', help="grava no arquivo em vez da saída padrão")
+    parser.add_argument('--exportar', metavar='ARQUIVO',
+                        help="grava também o relatório do período (Parquet se terminar em .parquet, senão CSV)")
+    parser.add_argument('--nivel', choices=EXPORT_LEVELS, default='diario',
+                        help="granularidade do relatório exportado (padrão: %(default)s)")
+    parser.add_argument('--perfil', action='store_true',
+                        help="mede leitura, validação e cálculos; log JSON e resumo OpenMetrics na saída de erro")
+
+    financeiro = parser.add_argument_group('parâmetros financeiros (mesmos padrões do painel)')
+    financeiro.add_argument('--tarifa', type=float, default=0.9555, help="tarifa cheia (R$/kWh)")
+    financeiro.add_argument('--fio-b', type=float, default=0.4900, help="tarifa Fio B (R$/kWh)")
+    financeiro.add_argument('--simultaneidade', type=float, default=30, help="fator de simultaneidade (%%)")
+    financeiro.add_argument('--investimento', type=float, default=15000.0, help="investimento (R$)")
+    financeiro.add_argument('--degradacao', type=float, default=0.5, help="degradação anual (%%)")
+    financeiro.add_argument('--reajuste', type=float, default=5.0, help="reajuste tarifário anual (%%)")
+    financeiro.add_argument('--taxa-desconto', type=float, default=8.0, help="taxa de desconto do VPL (%% a.a.)")
+    financeiro.add_argument('--instalacao', type=parse_date, default=datetime(2025, 5, 1),
+                            metavar='AAAA-MM-DD', help="data de instalação")
+    return parser
+
+def _finite(value):
+    """Arredonda; não finitos (TIR indefinida, payback nunca atingido) viram null no JSON"""
+    value = float(value)
+    return round(value, 4) if math.isfinite(value) else None
+
+def analisar_usina(cfg, client, args):
+    """Carrega o histórico da usina e calcula as métricas do período pedido"""
+    sync = IncrementalSheetSync(open_storage(cfg, client))
+    with PROFILER.span('cli.carregar'):
+        df = sync.sync()
+    if len(sync.rejected):
+        print(f"{cfg['nome']}: {len(sync.rejected)} linha(s) ignorada(s) na leitura", file=sys.stderr)
+    with PROFILER.span('cli.agregacao'):
+        periodo = filtrar_periodo(df, args.inicio, args.fim)
+        cube = RollupCube(periodo)
+        metricas = metricas_periodo(cube)
+        mensal = metricas_mensais(cube)
+
+    resultado = {
+        'usina': cfg['nome'],
+        'inicio': (args.inicio or (periodo['Data'].min() if not periodo.empty else None)),
+        'fim': (args.fim or (periodo['Data'].max() if not periodo.empty else None)),
+        'metricas': metricas,
+        'mensal': mensal,
+        'rejeitadas': sync.rejected,
+        'cubo': cube,
+    }
+    if periodo.empty:
+        return resultado
+
+    # Geração anual do período (anualizada quando o intervalo passa de um ano)
+    dias = (pd.Timestamp(resultado['fim']) - pd.Timestamp(resultado['inicio'])).days + 1
+    geracao_anual = metricas['total'] * min(1.0, 365 / dias)
+    with PROFILER.span('cli.financeiro'):
+        indicadores = indicadores_financeiros(
+            geracao_anual, df.groupby(df['Data'].dt.year)['Energia Gerada (kWh)'].sum().to_dict(),
+            args.tarifa, args.fio_b, args.simultaneidade, args.investimento, args.degradacao / 100,
+            args.instalacao, reajuste_tarifa=args.reajuste / 100, taxa_desconto=args.taxa_desconto / 100,
+            ano=pd.Timestamp(resultado['fim']).year
+        )
+    resultado['financeiro'] = {
+        'geracao_anual': geracao_anual,
+        **{k: v for k, v in indicadores.items() if k != 'fluxo_acumulado'},
+        'fluxo_acumulado': np.round(indicadores['fluxo_acumulado'], 2).tolist(),
+    }
+    mensal['Economia Líquida (R$)'] = [
+        calcular_economia_lei14300(total, args.tarifa, args.fio_b, args.simultaneidade, ano=ano)['economia_reais']
+        for ano, total in zip(mensal['Ano'], mensal['Total (kWh)'])
+    ]
+    return resultado
+
+def to_json(resultados):
+    def default(value):
+        if isinstance(value, (datetime, pd.Timestamp)):
+            return value.strftime('%Y-%m-%d')
+        if isinstance(value, pd.DataFrame):
+            return value.to_dict(orient='records')
+        if isinstance(value, np.generic):
+            return value.item()
+        raise TypeError(f"Tipo não serializável: {type(value).__name__}")
+
+    def clean(value):
+        if isinstance(value, dict):
+            return {k: clean(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [clean(v) for v in value]
+        if isinstance(value, (float, np.floating)):
+            return _finite(value)
+        return value
+
+    payload = json.loads(json.dumps(resultados, default=default))
+    return json.dumps(clean(payload), ensure_ascii=False, indent=2)
+
+def to_csv(resultados):
+    frames = [r['mensal'].assign(Usina=r['usina']) for r in resultados if 'erro' not in r]
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return ''
+    mensal = pd.concat(frames, ignore_index=True)
+    return mensal[['Usina'] + [c for c in mensal.columns if c != 'Usina']].to_csv(index=False, float_format='%.4f')
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.perfil:
+        # As usinas são analisadas em threads: grava os spans de todas, não só da principal
+        PROFILER.always = True
+        configure_perf_logging()
+        PROFILER.start_run(run_id='cli')
+
+    if args.sqlite:
+        config = {}
+        plants = plant_configs([{'nome': 'Principal', 'backend': 'sqlite', 'path': args.sqlite}])
+    else:
+        config = load_config(args.config)
+        plants = plant_configs(config.get('usinas'))
+    if args.usina:
+        desconhecidas = [u for u in args.usina if u not in plants]
+        if desconhecidas:
+            print(f"Usina(s) não configurada(s): {', '.join(desconhecidas)}", file=sys.stderr)
+            return 2
+        plants = {nome: plants[nome] for nome in args.usina}
+
+    client = None
+    if any(cfg['backend'] != 'sqlite' for cfg in plants.values()) and 'gcp_service_account' in config:
+        client = authorize_gspread(config['gcp_service_account'])
+
+    with ThreadPoolExecutor(max_workers=min(FLEET_MAX_WORKERS, len(plants))) as pool:
+        futures = {nome: pool.submit(analisar_usina, cfg, client, args) for nome, cfg in plants.items()}
+
+    resultados, falhas = [], 0
+    for nome, future in futures.items():
+        try:
+            resultados.append(future.result())
+        except Exception as e:
+            falhas += 1
+            print(f"{nome}: {e}", file=sys.stderr)
+            resultados.append({'usina': nome, 'erro': str(e)})
+
+    if args.exportar:
+        # Um bloco por ano e usina: o arquivo cresce sem montar o relatório inteiro em memória
+        formato = 'parquet' if args.exportar.lower().endswith('.parquet') else 'csv'
+        chunks = itertools.chain.from_iterable(
+            export_chunks(r['cubo'], r['usina'], args.nivel, args.tarifa, args.fio_b, args.simultaneidade)
+            for r in resultados if 'cubo' in r
+        )
+        try:
+            linhas = write_export(chunks, args.exportar, formato)
+        except ValueError as e:
+            print(str(e), file=sys.stderr)
+            return 2
+        print(f"{linhas} linha(s) exportada(s) para {args.exportar}", file=sys.stderr)
+    for r in resultados:
+        r.pop('cubo', None)
+
+    saida = to_json(resultados) if args.formato == 'json' else to_csv(resultados)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8', newline='') as f:
+            f.write(saida)
+    else:
+        sys.stdout.write(saida if saida.endswith('\n') or not saida else saida + '\n')
+    if args.perfil:
+        PROFILER.end_run(usinas=len(plants))
+        sys.stderr.write(PROFILER.openmetrics())
+    return 1 if falhas else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,2594 @@
+# -*- coding: utf-8 -*-
+"""Núcleo de análise do SolarAnalytics, sem dependência do Streamlit.
+
+Armazenamento (Google Sheets / SQLite), leitura e validação dos registros, cubo de
+agregados, heatmap, cálculo financeiro da Lei 14.300, projeções e Monte Carlo.
+Usado pelo painel (solar.py) e pela linha de comando (solar_cli.py).
+"""
+
+import pandas as pd
+import numpy as np
+import gspread
+import os
+import json
+import csv
+import io
+import random
+import time
+import sqlite3
+import threading
+import logging
+import contextlib
+import bisect
+import itertools
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from functools import lru_cache, wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from google.oauth2.service_account import Credentials
+import requests
+from requests.adapters import HTTPAdapter
+
+# — Constantes de Configuração —
+SPREADSHEET_ID = '1WI2tZ94lVV9GfaaWerdSfuChFLzWfMbU4v2m6QrwTdY'
+WORKSHEET_NAME = 'solardaily'
+
+# Backend de armazenamento: 'gsheets' (padrão) ou 'sqlite' (local, funciona offline)
+STORAGE_BACKEND = os.environ.get('SOLAR_STORAGE', 'gsheets').lower()
+SQLITE_PATH = os.environ.get('SOLAR_SQLITE_PATH', 'solar.db')
+# Leituras de 5 min dos inversores (curva intraday), sempre num SQLite local
+INTRADAY_PATH = os.environ.get('SOLAR_INTRADAY_PATH', 'solar_intraday.db')
+
+# Escritas pendentes ficam registradas aqui até serem gravadas no backend
+WRITE_JOURNAL_PATH = os.environ.get('SOLAR_WRITE_JOURNAL', '.solar_pending.json')
+WRITE_FLUSH_DELAY = 0.5      # segundos para acumular escritas num mesmo lote
+WRITE_MAX_BACKOFF = 60       # teto do intervalo entre novas tentativas (s)
+WRITE_MAX_ATTEMPTS = 8       # tentativas de uma operação antes de ela sair da fila (falhas transitórias)
+
+# Várias usinas: conexões HTTP reaproveitadas pelo cliente gspread e threads de carga
+GSHEETS_POOL_SIZE = 16
+FLEET_MAX_WORKERS = 8
+
+# Cota da API do Sheets (~60 requisições por minuto por usuário) e novas tentativas
+GSHEETS_REQUESTS_PER_MIN = int(os.environ.get('SOLAR_GSHEETS_RPM', 60))
+GSHEETS_BURST = 10           # requisições seguidas antes de o limitador começar a espaçar
+GSHEETS_MAX_RETRIES = 5
+GSHEETS_BACKOFF_MAX = 32.0   # teto do intervalo entre tentativas (s)
+GSHEETS_RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+GSHEETS_BATCH_GET_MAX = 200  # intervalos por values:batchGet (vão na URL, que tem limite de tamanho)
+
+MONTH_NAMES = {
+    1: 'Janeiro', 2: 'Fevereiro', 3: 'Março', 4: 'Abril',
+    5: 'Maio', 6: 'Junho', 7: 'Julho', 8: 'Agosto',
+    9: 'Setembro', 10: 'Outubro', 11: 'Novembro', 12: 'Dezembro'
+}
+
+# — Instrumentação (spans por execução) —
+PROFILE_ENABLED = os.environ.get('SOLAR_PROFILE', '').lower() in ('1', 'true', 'sim')
+PROFILE_WINDOW = 512         # durações guardadas por span para p50/p95
+
+perf_logger = logging.getLogger('solar.perf')
+logger = logging.getLogger('solar')
+
+class SpanRecorder:
+    """Mede trechos nomeados do código e guarda as últimas durações de cada um.
+
+    Cada execução (rerun do painel, comando da CLI) chama `start_run`; os spans
+    daquela thread vão para a lista da execução e para a janela global usada nos
+    percentis. Sem execução ativa (ou com ela desligada) `span` devolve um contexto
+    vazio compartilhado, então o custo desligado é um getattr por span.
+    """
+
+    def __init__(self, window=PROFILE_WINDOW, always=PROFILE_ENABLED):
+        self.window = window
+        self.always = always     # grava também fora de uma execução (threads de fundo)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._durations = {}     # nome -> deque das últimas durações (s)
+        self._counts = {}        # nome -> total de medições desde o início
+        self._null = contextlib.nullcontext()
+        self._run_ids = itertools.count(1)
+
+    def start_run(self, enabled=True, run_id=None):
+        """Começa a coletar os spans desta thread; devolve a lista que vai recebê-los"""
+        run = [] if enabled or self.always else None
+        self._local.run = run
+        self._local.run_id = run_id if run_id is not None else next(self._run_ids)
+        self._local.started = time.perf_counter()
+        return run
+
+    def end_run(self, name='execucao', **fields):
+        """Encerra a execução da thread, mede o total como `name` e registra um log JSON"""
+        run = getattr(self._local, 'run', None)
+        if run is None:
+            return None
+        elapsed = time.perf_counter() - self._local.started
+        self.record(name, elapsed)
+        self._local.run = None
+        perf_logger.info(json.dumps({
+            'evento': name, 'execucao': self._local.run_id, **fields,
+            'total_ms': round(elapsed * 1000, 3), 'spans': run,
+        }, ensure_ascii=False, default=str))
+        return run
+
+    @property
+    def active(self):
+        return getattr(self._local, 'run', None) is not None or self.always
+
+    def span(self, name):
+        if getattr(self._local, 'run', None) is None and not self.always:
+            return self._null
+        return self._measure(name)
+
+    @contextlib.contextmanager
+    def _measure(self, name):
+        depth = getattr(self._local, 'depth', 0)
+        entry = {'span': name, 'ms': None, 'nivel': depth}
+        run = getattr(self._local, 'run', None)
+        if run is not None:
+            run.append(entry)    # ordem de início: o painel mostra a hierarquia
+        self._local.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._local.depth = depth
+            entry['ms'] = round(elapsed * 1000, 3)
+            self.record(name, elapsed)
+
+    def record(self, name, seconds):
+        with self._lock:
+            if name not in self._durations:
+                self._durations[name] = deque(maxlen=self.window)
+                self._counts[name] = 0
+            self._durations[name].append(seconds)
+            self._counts[name] += 1
+
+    def timed(self, name):
+        """Decorador: mede cada chamada da função como o span `name`"""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def summary(self):
+        """nome -> contagem, p50, p95, máximo e total (ms) sobre a janela de cada span"""
+        with self._lock:
+            snapshot = {name: (np.array(d), self._counts[name]) for name, d in self._durations.items()}
+        stats = {}
+        for name, (durations, count) in sorted(snapshot.items()):
+            ms = durations * 1000
+            stats[name] = {
+                'contagem': count,
+                'p50_ms': float(np.percentile(ms, 50)),
+                'p95_ms': float(np.percentile(ms, 95)),
+                'max_ms': float(ms.max()),
+                'total_ms': float(ms.sum()),
+            }
+        return stats
+
+    def openmetrics(self):
+        """Resumo no formato texto do OpenMetrics (quantis 0.5/0.95 em segundos)"""
+        lines = [
+            '# TYPE solar_span_seconds summary',
+            '# UNIT solar_span_seconds seconds',
+            '# HELP solar_span_seconds Duração dos spans instrumentados (últimas medições).',
+        ]
+        for name, s in self.summary().items():
+            label = name.replace('\\', '\\\\').replace('"', '\\"')
+            for q, key in (('0.5', 'p50_ms'), ('0.95', 'p95_ms')):
+                lines.append(f'solar_span_seconds{{span="{label}",quantile="{q}"}} {s[key] / 1000:.6f}')
+            lines.append(f'solar_span_seconds_sum{{span="{label}"}} {s["total_ms"] / 1000:.6f}')
+            lines.append(f'solar_span_seconds_count{{span="{label}"}} {s["contagem"]}')
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+            self._counts.clear()
+
+PROFILER = SpanRecorder()
+
+def configure_perf_logging(stream=None):
+    """Envia os logs JSON de desempenho (uma linha por execução) para `stream` (padrão: stderr)"""
+    if not perf_logger.handlers:
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        perf_logger.addHandler(handler)
+        perf_logger.setLevel(logging.INFO)
+        perf_logger.propagate = False
+    return perf_logger
+
+def serve_metrics(recorder, port, host='127.0.0.1'):
+    """Servidor HTTP em thread própria com GET /metrics no formato OpenMetrics"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = recorder.openmetrics().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/openmetrics-text; version=1.0.0; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # sem log de acesso no console
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='solar-metrics', daemon=True).start()
+    return server
+
+# — Usinas —
+def plant_configs(configured=None):
+    """Normaliza a lista de usinas configuradas (ou a usina única das constantes)"""
+    if not configured:
+        configured = [{'nome': 'Principal', 'backend': STORAGE_BACKEND}]
+
+    plants = {}
+    for i, cfg in enumerate(configured):
+        cfg = dict(cfg)
+        nome = cfg.get('nome') or f'Usina {i + 1}'
+        plants[nome] = {
+            'nome': nome,
+            'backend': str(cfg.get('backend', 'gsheets')).lower(),
+            'spreadsheet_id': cfg.get('spreadsheet_id', SPREADSHEET_ID),
+            'worksheet': cfg.get('worksheet', WORKSHEET_NAME),
+            'path': cfg.get('path', SQLITE_PATH),
+            'intraday_path': cfg.get('intraday_path', INTRADAY_PATH),
+            'decimal': cfg.get('decimal'),
+        }
+    return plants
+
+# — Conexão com Google Sheets —
+def authorize_gspread(creds_info, pool_size=GSHEETS_POOL_SIZE):
+    """Cliente gspread autorizado pela conta de serviço, com pool de conexões dimensionado"""
+    scopes = [
+        'https://spreadsheets.google.com/feeds',
+        'https://www.googleapis.com/auth/drive'
+    ]
+    creds = Credentials.from_service_account_info(dict(creds_info), scopes=scopes)
+    client = gspread.authorize(creds)
+
+    # Pool de conexões do tamanho das cargas concorrentes (o padrão do requests é 10)
+    session = getattr(getattr(client, 'http_client', client), 'session', None)
+    if session is not None:
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+    return client
+
+class SheetsQuota:
+    """Cota de requisições à API do Sheets, compartilhada pelas abas de um mesmo usuário.
+
+    Um balde de fichas espaça as chamadas: rajadas de até `burst` e reposição de
+    per_minute - burst por minuto, então nenhuma janela de 60 s passa de per_minute;
+    429 e 5xx são repetidos com backoff exponencial e jitter (respeitando Retry-After);
+    leituras idênticas simultâneas esperam a mesma requisição (single-flight).
+    """
+
+    def __init__(self, per_minute=GSHEETS_REQUESTS_PER_MIN, burst=GSHEETS_BURST,
+                 max_retries=GSHEETS_MAX_RETRIES, backoff_max=GSHEETS_BACKOFF_MAX,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.rate = max(per_minute - burst, 1) / 60
+        self.capacity = burst
+        self.max_retries = max_retries
+        self.backoff_max = backoff_max
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._inflight = {}      # chave da leitura -> Future da requisição em andamento
+        self.stats = {'requisicoes': 0, 'novas_tentativas': 0, 'coalescidas': 0, 'espera_s': 0.0}
+
+    def acquire(self):
+        """Espera uma ficha do balde; devolve quanto esperou (s)"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1 - 1e-9:   # tolerância: o arredondamento não deixa a ficha a 1e-16 de 1
+                    self._tokens = max(self._tokens - 1, 0.0)
+                    self.stats['requisicoes'] += 1
+                    self.stats['espera_s'] += waited
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            self._sleep(delay)
+            waited += delay
+
+    @staticmethod
+    def _status(error):
+        """Status HTTP do erro (None se não for da API nem de rede)"""
+        if isinstance(error, gspread.exceptions.APIError):
+            return error.code if error.code != -1 else getattr(error.response, 'status_code', None)
+        if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+            return 503
+        return None
+
+    def _backoff(self, attempt, error):
+        delay = min(self.backoff_max, 2 ** attempt + random.uniform(0, 1))
+        response = getattr(error, 'response', None)
+        retry_after = getattr(response, 'headers', {}).get('Retry-After') if response is not None else None
+        if retry_after and str(retry_after).isdigit():
+            delay = max(delay, min(float(retry_after), self.backoff_max))
+        return delay
+
+    def call(self, fn, *args, retry_on=GSHEETS_RETRY_STATUS, **kwargs):
+        """Executa uma chamada à API dentro da cota, repetindo os erros em `retry_on`"""
+        for attempt in itertools.count():
+            waited = self.acquire()
+            if waited:
+                PROFILER.record('planilha.cota', waited)
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if self._status(e) not in retry_on or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e)
+                with self._lock:
+                    self.stats['novas_tentativas'] += 1
+                PROFILER.record('planilha.backoff', delay)
+                self._sleep(delay)
+
+    def read(self, key, fn, *args, **kwargs):
+        """Leitura coalescida: quem chega com a mesma chave aguarda a requisição em andamento"""
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.stats['coalescidas'] += 1
+        if not leader:
+            return future.result()
+        try:
+            result = self.call(fn, *args, **kwargs)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+SHEETS_QUOTA = SheetsQuota()
+
+def is_retryable(error):
+    """Falha transitória (cota, 5xx, rede, banco ocupado) que vale tentar de novo.
+
+    Validação, dado corrompido e aba/planilha inexistente falham igual na próxima vez.
+    """
+    status = SheetsQuota._status(error)
+    if status is not None:
+        return status in GSHEETS_RETRY_STATUS or status == 408
+    if isinstance(error, (gspread.exceptions.GSpreadException, ValueError, KeyError, TypeError, IndexError)):
+        return False
+    return True
+
+class QuotaAwareWorksheet:
+    """Aba do gspread cujas chamadas passam pela cota (SheetsQuota).
+
+    Leituras são coalescidas e repetidas em 429/5xx. Escritas só são repetidas em 429,
+    que a API rejeita antes de aplicar; num 5xx não se sabe se a escrita entrou, então
+    o erro sobe para a fila de escrita, que recarrega a planilha antes de tentar de novo.
+    Cada escrita muda a geração da aba: leituras iniciadas depois dela não pegam
+    carona numa leitura anterior.
+    """
+    READS = frozenset({'get_all_values', 'get', 'batch_get', 'row_values'})
+    WRITES = frozenset({'append_rows', 'update', 'batch_update', 'delete_rows'})
+
+    def __init__(self, sheet, quota=None):
+        self.sheet = sheet
+        self.quota = quota or SHEETS_QUOTA
+        self._generation = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self.sheet, name)
+        if name in self.READS:
+            def read(*args, **kwargs):
+                key = (id(self.sheet), self._generation, name, repr(args), repr(sorted(kwargs.items())))
+                return self.quota.read(key, attr, *args, **kwargs)
+            return read
+        if name in self.WRITES:
+            def write(*args, **kwargs):
+                self._generation += 1
+                return self.quota.call(attr, *args, retry_on={429}, **kwargs)
+            return write
+        return attr
+
+def open_worksheet(client, spreadsheet_id=SPREADSHEET_ID, worksheet_name=WORKSHEET_NAME, quota=None):
+    """Abre a aba (com controle de cota) e confere os cabeçalhos; ValueError se faltar 'data' ou 'gerado'"""
+    quota = quota or SHEETS_QUOTA
+    sheet = QuotaAwareWorksheet(
+        quota.call(lambda: client.open_by_key(spreadsheet_id).worksheet(worksheet_name)), quota
+    )
+    headers = sheet.row_values(1)
+    if not headers:
+        raise ValueError("A planilha está vazia ou sem cabeçalhos.")
+    headers_lower = [h.lower().strip() for h in headers]
+    if 'data' not in headers_lower or 'gerado' not in headers_lower:
+        raise ValueError("A planilha deve conter as colunas 'data' e 'gerado'.")
+    return sheet
+
+# — Backends de Armazenamento —
+# Todos os backends trocam linhas no formato da planilha: ['dd/mm/aaaa', '12,5'],
+# com a linha física 1 sendo o cabeçalho e os dados começando na linha 2.
+class StorageBackend:
+    """Interface comum de leitura e escrita dos registros diários"""
+    name = ''
+    decimal = None   # separador decimal dos valores lidos (None = decide valor a valor)
+
+    def get_all_values(self):
+        """Retorna cabeçalho + todas as linhas brutas"""
+        raise NotImplementedError
+
+    def get_tail(self, first_row, ncols):
+        """Retorna as linhas brutas a partir da linha física first_row"""
+        raise NotImplementedError
+
+    def get_rows(self, rows, ncols):
+        """Conteúdo atual das linhas físicas pedidas ({linha: valores}; inexistentes vêm vazias)"""
+        raise NotImplementedError
+
+    def append_rows(self, rows):
+        raise NotImplementedError
+
+    def update_row(self, row, values):
+        raise NotImplementedError
+
+    def batch_update_rows(self, updates):
+        """Atualiza várias linhas ({linha: valores}) de uma só vez"""
+        for row, values in updates.items():
+            self.update_row(row, values)
+
+    def delete_rows(self, start, end=None):
+        raise NotImplementedError
+
+    def rewrite_rows(self, rows, previous_count):
+        """Substitui todas as linhas de dados (previous_count = quantas havia) numa só gravação"""
+        raise NotImplementedError
+
+class GoogleSheetsBackend(StorageBackend):
+    """Backend sobre uma aba do Google Sheets (gspread)"""
+    name = 'Google Sheets'
+
+    def __init__(self, sheet, decimal=None):
+        self.sheet = sheet
+        # get_all_values devolve os números formatados na localidade da planilha
+        self.decimal = decimal or decimal_separator(sheet_locale(sheet))
+
+    def get_all_values(self):
+        return self.sheet.get_all_values()
+
+    def get_tail(self, first_row, ncols):
+        last_col = gspread.utils.rowcol_to_a1(1, ncols)[:-1]
+        return self.sheet.get(f"A{first_row}:{last_col}")
+
+    def get_rows(self, rows, ncols):
+        # Linhas consecutivas viram um só intervalo; os intervalos vão em lotes de
+        # GSHEETS_BATCH_GET_MAX por chamada (values:batchGet)
+        last_col = gspread.utils.rowcol_to_a1(1, ncols)[:-1]
+        runs = []
+        for row in sorted(set(rows)):
+            if runs and runs[-1][1] == row - 1:
+                runs[-1][1] = row
+            else:
+                runs.append([row, row])
+        result = {}
+        for i in range(0, len(runs), GSHEETS_BATCH_GET_MAX):
+            chunk = runs[i:i + GSHEETS_BATCH_GET_MAX]
+            values = self.sheet.batch_get([f"A{first}:{last_col}{last}" for first, last in chunk])
+            for (first, last), block in zip(chunk, values):
+                # A API omite as linhas vazias do fim do intervalo
+                for row in range(first, last + 1):
+                    offset = row - first
+                    result[row] = list(block[offset]) if offset < len(block) else []
+        return result
+
+    def append_rows(self, rows):
+        self.sheet.append_rows(rows, value_input_option='USER_ENTERED')
+
+    def update_row(self, row, values):
+        last_col = gspread.utils.rowcol_to_a1(1, len(values))[:-1]
+        self.sheet.update(range_name=f"A{row}:{last_col}{row}", values=[values],
+                          value_input_option='USER_ENTERED')
+
+    def batch_update_rows(self, updates):
+        data = []
+        for row, values in updates.items():
+            last_col = gspread.utils.rowcol_to_a1(1, len(values))[:-1]
+            data.append({'range': f"A{row}:{last_col}{row}", 'values': [values]})
+        if data:
+            self.sheet.batch_update(data, value_input_option='USER_ENTERED')
+
+    def delete_rows(self, start, end=None):
+        self.sheet.delete_rows(start, end)
+
+    def rewrite_rows(self, rows, previous_count):
+        # Um update cobrindo toda a área de dados; as linhas que sobram no fim são cortadas
+        if rows:
+            ncols = max(len(r) for r in rows)
+            last_col = gspread.utils.rowcol_to_a1(1, ncols)[:-1]
+            values = [list(r) + [''] * (ncols - len(r)) for r in rows]
+            self.sheet.update(range_name=f"A2:{last_col}{len(rows) + 1}", values=values,
+                              value_input_option='USER_ENTERED')
+        if previous_count > len(rows):
+            self.sheet.delete_rows(len(rows) + 2, previous_count + 1)
+
+class SQLiteBackend(StorageBackend):
+    """Backend local embarcado (SQLite); as linhas seguem a ordem de inserção (id), como na planilha"""
+    name = 'SQLite'
+    decimal = ','
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS registros ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, data TEXT NOT NULL, gerado REAL NOT NULL)"
+            )
+            # Nenhuma consulta filtra por data (o app e o CLI leem o histórico inteiro): o
+            # índice criado por versões anteriores só encarecia as escritas
+            self.conn.execute("DROP INDEX IF EXISTS idx_registros_data")
+
+    # Datas ficam em ISO; a troca com o app usa o formato da planilha
+    _COLUMNS = "strftime('%d/%m/%Y', data), replace(CAST(gerado AS TEXT), '.', ',')"
+    _SELECT = f"SELECT {_COLUMNS} FROM registros"
+    _MAX_PARAMS = 900   # abaixo do limite de parâmetros por consulta do SQLite
+
+    @staticmethod
+    def _to_db(values):
+        date = datetime.strptime(str(values[0]).strip(), '%d/%m/%Y').date().isoformat()
+        return date, parse_br_number(values[1])
+
+    def _ids(self, offset, limit):
+        cur = self.conn.execute("SELECT id FROM registros ORDER BY id LIMIT ? OFFSET ?", (limit, offset))
+        return [r[0] for r in cur.fetchall()]
+
+    def get_all_values(self):
+        with self._lock:
+            rows = self.conn.execute(f"{self._SELECT} ORDER BY id").fetchall()
+        return [['data', 'gerado']] + [list(r) for r in rows]
+
+    def get_tail(self, first_row, ncols):
+        with self._lock:
+            rows = self.conn.execute(
+                f"{self._SELECT} ORDER BY id LIMIT -1 OFFSET ?", (max(first_row - 2, 0),)
+            ).fetchall()
+        if first_row == 1:
+            return [['data', 'gerado']] + [list(r) for r in rows]
+        return [list(r) for r in rows]
+
+    def _row_ids(self, rows):
+        """id de cada linha da planilha pedida (linha 2 = primeiro registro), numa só leitura do índice"""
+        ids = [r[0] for r in self.conn.execute("SELECT id FROM registros ORDER BY id")]
+        return {row: ids[row - 2] for row in rows if 2 <= row < len(ids) + 2}
+
+    def get_rows(self, rows, ncols):
+        with self._lock:
+            row_ids = self._row_ids(rows)
+            by_id = {}
+            ids = list(row_ids.values())
+            for i in range(0, len(ids), self._MAX_PARAMS):
+                chunk = ids[i:i + self._MAX_PARAMS]
+                cur = self.conn.execute(
+                    f"SELECT id, {self._COLUMNS} FROM registros WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+                )
+                by_id.update((r[0], list(r[1:])) for r in cur.fetchall())
+        return {row: by_id.get(row_ids.get(row), []) for row in rows}
+
+    def append_rows(self, rows):
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO registros (data, gerado) VALUES (?, ?)", [self._to_db(r) for r in rows]
+            )
+
+    def update_row(self, row, values):
+        self.batch_update_rows({row: values})
+
+    def batch_update_rows(self, updates):
+        with self._lock, self.conn:
+            row_ids = self._row_ids(updates)
+            self.conn.executemany(
+                "UPDATE registros SET data = ?, gerado = ? WHERE id = ?",
+                [(*self._to_db(values), row_ids[row]) for row, values in updates.items() if row in row_ids]
+            )
+
+    def delete_rows(self, start, end=None):
+        end = start if end is None else end
+        with self._lock, self.conn:
+            ids = self._ids(start - 2, end - start + 1)
+            self.conn.executemany("DELETE FROM registros WHERE id = ?", [(i,) for i in ids])
+
+    def rewrite_rows(self, rows, previous_count):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM registros")
+            self.conn.executemany(
+                "INSERT INTO registros (data, gerado) VALUES (?, ?)", [self._to_db(r) for r in rows]
+            )
+
+def open_storage(cfg, client=None):
+    """Backend de armazenamento da usina; client (gspread) só é usado pelo Google Sheets"""
+    if cfg['backend'] == 'sqlite':
+        return SQLiteBackend(cfg['path'])
+    if client is None:
+        raise ValueError(f"Usina '{cfg['nome']}' usa Google Sheets e não há credenciais configuradas.")
+    return GoogleSheetsBackend(open_worksheet(client, cfg['spreadsheet_id'], cfg['worksheet']), cfg.get('decimal'))
+
+# — Funções de Dados —
+# A cada N sincronizações incrementais força uma recarga completa, para captar
+# edições feitas diretamente na planilha no meio do histórico.
+SYNC_FULL_RELOAD_EVERY = 12
+# Idade a partir da qual os dados são revalidados em segundo plano (s)
+DATA_MAX_AGE = 300
+# Linhas duplicadas (relançamentos ocultos pela leitura) que disparam a compactação da planilha
+COMPACT_MIN_DUPLICATES = int(os.environ.get('SOLAR_COMPACT_MIN_DUPLICATES', 10))
+
+# Formatos de data aceitos, na ordem de tentativa (o primeiro é o que o app grava)
+DATE_FORMATS = ('%d/%m/%Y', '%d/%m/%y', '%Y-%m-%d', '%d-%m-%Y')
+
+# Números sem separador decimal declarado: com vírgula seguem o padrão brasileiro ('1.234,5'),
+# sem vírgula o ponto é decimal ('0.125', '12.345'); '1,234.5' só pode ser milhar com vírgula.
+# Com o separador declarado (localidade da planilha, configuração da usina), o outro sinal
+# formando grupos de milhar é milhar: numa planilha pt-BR o Sheets mostra 1234 como '1.234'.
+_GROUPED = {',': r'-?[1-9]\d{0,2}(?:\.\d{3})+', '.': r'-?[1-9]\d{0,2}(?:,\d{3})+'}
+# Idioma da localidade -> separador decimal; as demais localidades decidem valor a valor
+LOCALE_DECIMAL = {'pt': ',', 'en': '.'}
+
+def sheet_locale(sheet):
+    """Localidade da planilha da aba (p.ex. 'pt_BR'), ou None se não estiver disponível"""
+    try:
+        return sheet.spreadsheet.locale
+    except (AttributeError, KeyError):
+        return None
+
+def decimal_separator(locale):
+    """Separador decimal dos números formatados numa localidade ('pt_BR' -> ','); None se desconhecida"""
+    return LOCALE_DECIMAL.get(str(locale or '').split('_')[0])
+
+def _factorize_text(values):
+    """Códigos e valores distintos (sem espaços nas pontas); as conversões rodam só nos distintos"""
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    return codes, pd.Series(uniques, dtype='string').str.strip()
+
+def _expand(codes, parsed, fill):
+    """Leva o resultado dos valores distintos de volta a todas as linhas (código -1 = vazio)"""
+    if not len(parsed):
+        return np.full(len(codes), fill, dtype=parsed.dtype)
+    out = parsed[np.maximum(codes, 0)]
+    out[codes < 0] = fill
+    return out
+
+def _dates_from_text(text, formats):
+    parsed = pd.Series(pd.NaT, index=text.index, dtype='datetime64[ns]')
+    pending = (text.notna() & (text != '')).to_numpy()
+    for fmt in formats:
+        if not pending.any():
+            break
+        attempt = pd.to_datetime(text[pending], format=fmt, errors='coerce')
+        ok = attempt.notna()
+        parsed[attempt.index[ok]] = attempt[ok]
+        pending[attempt.index[ok]] = False
+    return parsed.to_numpy()
+
+def _numbers_from_text(text, decimal=None):
+    text = text.str.replace('\u00a0', '', regex=False).str.replace(' ', '', regex=False)
+    comma_thousands = text.str.fullmatch(_GROUPED['.'] + (r'(?:\.\d+)?' if decimal == '.' else r'\.\d+'))
+    text = text.where(~comma_thousands.fillna(False), text.str.replace(',', '', regex=False))
+    brazilian = text.str.contains(',', regex=False).fillna(False)
+    if decimal == ',':
+        brazilian |= text.str.fullmatch(_GROUPED[',']).fillna(False)
+    text = text.where(~brazilian, text.str.replace('.', '', regex=False)).str.replace(',', '.', regex=False)
+    return pd.to_numeric(text, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+
+def _blank_from_text(text):
+    return (text.fillna('') == '').to_numpy(dtype=bool)
+
+def parse_br_dates(values, formats=DATE_FORMATS):
+    """Datas nos formatos declarados; cada valor distinto é convertido uma única vez.
+
+    Valores que falham num formato seguem para o próximo sem reprocessar os já
+    convertidos. Retorna datetime64 com NaT onde nenhum formato serviu.
+    """
+    codes, text = _factorize_text(values)
+    return _expand(codes, _dates_from_text(text, formats), np.datetime64('NaT'))
+
+def parse_br_numbers(values, decimal=None):
+    """Números no padrão brasileiro ('12,5', '1.234,5') ou com ponto decimal ('12.5', '0.125').
+
+    `decimal` declara o separador decimal da fonte; só então '1.234' (com ',') ou
+    '1,234.5' (com '.') são lidos como milhar.
+    """
+    codes, text = _factorize_text(values)
+    return _expand(codes, _numbers_from_text(text, decimal), np.nan)
+
+def parse_br_number(value):
+    """Versão escalar de parse_br_numbers (ValueError se não for número)"""
+    number = parse_br_numbers([value])[0]
+    if np.isnan(number):
+        raise ValueError(f"Valor inválido: {value!r}")
+    return float(number)
+
+def empty_rejected():
+    return pd.DataFrame({'Linha': pd.Series(dtype=int), 'Data': pd.Series(dtype=object),
+                         'Gerado': pd.Series(dtype=object), 'Motivo': pd.Series(dtype=object)})
+
+def parse_sheet_values(header, rows, first_row=2, decimal=None):
+    """Converte linhas brutas da planilha num único passe vetorizado.
+
+    `decimal` é o separador decimal da fonte (ver parse_br_numbers). Retorna (válidas, rejeitadas): as válidas indexadas pela linha física, com 'Data'
+    e 'Energia Gerada (kWh)'; as rejeitadas com a linha, os valores brutos e o motivo.
+    """
+    columns = [str(col).lower().strip() for col in header]
+    if 'data' not in columns or 'gerado' not in columns:
+        raise ValueError("A planilha deve conter as colunas 'data' e 'gerado'.")
+    i_data, i_gerado = columns.index('data'), columns.index('gerado')
+
+    raw_dates = [r[i_data] if len(r) > i_data else '' for r in rows]
+    raw_values = [r[i_gerado] if len(r) > i_gerado else '' for r in rows]
+    date_codes, date_text = _factorize_text(raw_dates)
+    value_codes, value_text = _factorize_text(raw_values)
+    dates = _expand(date_codes, _dates_from_text(date_text, DATE_FORMATS), np.datetime64('NaT'))
+    values = _expand(value_codes, _numbers_from_text(value_text, decimal), np.nan)
+    date_missing = _expand(date_codes, _blank_from_text(date_text), True)
+    value_missing = _expand(value_codes, _blank_from_text(value_text), True)
+    index = pd.RangeIndex(first_row, first_row + len(rows))
+
+    # Motivo da rejeição, do mais grave para o menos grave (o primeiro que se aplica vale)
+    reasons = np.select(
+        [date_missing, np.isnat(dates), value_missing, np.isnan(values), values < 0],
+        ['data vazia', 'data inválida', 'valor vazio', 'valor inválido', 'valor negativo'],
+        default=''
+    )
+    valid = reasons == ''
+
+    parsed = pd.DataFrame({'Data': dates[valid], 'Energia Gerada (kWh)': values[valid]}, index=index[valid])
+    bad = np.flatnonzero(~valid)
+    rejected = pd.DataFrame({
+        'Linha': index[bad],
+        'Data': [raw_dates[i] for i in bad],
+        'Gerado': [raw_values[i] for i in bad],
+        'Motivo': reasons[bad],
+    })
+    return parsed, rejected
+
+def changed_dates(old, new):
+    """Datas incluídas, removidas ou alteradas entre dois DataFrames finais"""
+    merged = pd.merge(
+        old[['Data', 'Energia Gerada (kWh)']], new[['Data', 'Energia Gerada (kWh)']],
+        on='Data', how='outer', suffixes=(' antes', ' depois')
+    )
+    antes = merged['Energia Gerada (kWh) antes'].to_numpy(dtype=float)
+    depois = merged['Energia Gerada (kWh) depois'].to_numpy(dtype=float)
+    mudou = ~np.isclose(antes, depois, equal_nan=True)
+    return merged.loc[mudou, 'Data']
+
+def finalize_data(parsed):
+    """Ordena por data e mantém apenas o último registro de cada dia"""
+    if parsed is None or parsed.empty:
+        return pd.DataFrame()
+    df = parsed.sort_values(by='Data', kind='mergesort').drop_duplicates(subset=['Data'], keep='last')
+    return df.reset_index(drop=True)
+
+def _day_key(date):
+    """Dia como inteiro (dias desde 1970); aceita Timestamp, date ou 'dd/mm/aaaa'"""
+    if isinstance(date, str):
+        date = datetime.strptime(date.strip(), '%d/%m/%Y')
+    date = pd.Timestamp(date)
+    return day_number(date.year, date.month, date.day)
+
+class RowIndex:
+    """Índice data → linhas físicas da planilha, montado a partir das linhas válidas lidas.
+
+    Um dia pode estar em mais de uma linha (relançamentos); a leitura fica com a última,
+    mas editar ou excluir o dia precisa de todas. A consulta é O(1); edições no lugar
+    atualizam o índice, exclusões (que deslocam as linhas de baixo) o reconstroem.
+    """
+
+    def __init__(self, parsed=None):
+        self._rows = {}   # dia -> linhas físicas em ordem crescente
+        if parsed is not None and not parsed.empty:
+            self.add(parsed)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def add(self, parsed):
+        """Registra linhas válidas (indexadas pela linha física, abaixo das já conhecidas)"""
+        days = parsed['Data'].to_numpy().astype('datetime64[D]').astype(np.int64)
+        for day, row in zip(days.tolist(), parsed.index.tolist()):
+            self._rows.setdefault(day, []).append(row)
+
+    def rows(self, date):
+        """Linhas do dia (a última é a que vale); lista vazia se o dia não existe"""
+        return list(self._rows.get(_day_key(date), ()))
+
+    def move(self, row, old_date, new_date):
+        """A linha passou a conter outro dia (edição no lugar)"""
+        if old_date is not None:
+            old = self._rows.get(_day_key(old_date), [])
+            if row in old:
+                old.remove(row)
+                if not old:
+                    del self._rows[_day_key(old_date)]
+        if new_date is not None:
+            bisect.insort(self._rows.setdefault(_day_key(new_date), []), row)
+
+class IncrementalSheetSync:
+    """Mantém o DataFrame já processado e busca no backend apenas as linhas novas.
+
+    A sonda relê somente a última linha conhecida e o que vier depois dela. Se
+    a última linha continua igual, as linhas seguintes são novas e entram no
+    DataFrame; se mudou (edição ou exclusão acima dela), faz recarga completa.
+
+    O último resultado válido fica em `snapshot` e é servido imediatamente; quando
+    envelhece, a revalidação roda numa thread e chamadas concorrentes compartilham
+    a mesma requisição em andamento (single-flight).
+    """
+
+    def __init__(self, storage, revisions=None):
+        self.storage = storage
+        self.revisions = revisions
+        self._lock = threading.Lock()
+        self._flight_lock = threading.Lock()
+        self._inflight = None    # Future da atualização em andamento
+        self.snapshot = None
+        self.fetched_at = None
+        self.last_error = None
+        self.header = None
+        self.n_rows = 0          # linhas de dados já lidas (sem o cabeçalho)
+        self.last_row = None     # conteúdo bruto da última linha lida
+        self.parsed = None       # linhas válidas, indexadas pela linha física
+        self.rejected = empty_rejected()  # linhas ignoradas na leitura, com o motivo
+        self.row_index = RowIndex()       # dia -> linhas físicas, atualizado a cada leitura e escrita
+        self.syncs_since_full = 0
+        self.needs_full = True
+
+    def invalidate(self):
+        """Força recarga completa na próxima sincronização"""
+        self.needs_full = True
+
+    def sync(self):
+        """Sincroniza com a planilha e devolve o DataFrame final"""
+        with self._lock:
+            if (self.needs_full or self.parsed is None
+                    or self.syncs_since_full >= SYNC_FULL_RELOAD_EVERY):
+                self._full_reload()
+            elif not self._delta_sync():
+                self._full_reload()
+            with PROFILER.span('planilha.finalizar'):
+                return finalize_data(self.parsed)
+
+    @property
+    def refreshing(self):
+        return self._inflight is not None
+
+    def age(self):
+        """Segundos desde a última atualização bem-sucedida"""
+        return None if self.fetched_at is None else time.time() - self.fetched_at
+
+    def refresh(self):
+        """Atualiza o snapshot; chamadas concorrentes aguardam a mesma requisição"""
+        with self._flight_lock:
+            future = self._inflight
+            leader = future is None
+            if leader:
+                future = self._inflight = Future()
+        if not leader:
+            return future.result()
+
+        try:
+            previous = self.snapshot
+            df = self.sync()
+            self.snapshot, self.fetched_at, self.last_error = df, time.time(), None
+            if self.revisions is not None and previous is not None:
+                if previous.empty or df.empty:
+                    self.revisions.bump()
+                else:
+                    dates = changed_dates(previous, df)
+                    if len(dates):
+                        self.revisions.bump(dates)
+            future.set_result(df)
+            return df
+        except Exception as e:
+            self.last_error = str(e)
+            future.set_exception(e)
+            raise
+        finally:
+            with self._flight_lock:
+                self._inflight = None
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception:
+            pass  # mantém o último snapshot válido; o erro fica em last_error
+
+    def refresh_if_stale(self, max_age=DATA_MAX_AGE):
+        """Dispara a revalidação em segundo plano se o snapshot estiver velho ou se a primeira carga falhou"""
+        if self.refreshing:
+            return
+        if self.snapshot is None:
+            if self.last_error is None:
+                return  # primeira carga ainda não tentada: get() bloqueia nela
+        elif self.age() <= max_age:
+            return
+        threading.Thread(target=self._background_refresh, name='solar-refresh', daemon=True).start()
+
+    def get(self):
+        """Último snapshot válido; só bloqueia na primeira carga"""
+        if self.snapshot is None:
+            return self.refresh()
+        return self.snapshot
+
+    def _pad(self, row):
+        width = len(self.header)
+        return list(row[:width]) + [''] * (width - len(row))
+
+    def _full_reload(self):
+        with PROFILER.span('planilha.leitura'):
+            values = self.storage.get_all_values()
+        self.syncs_since_full = 0
+        self.needs_full = False
+
+        if len(values) < 2:
+            self.header = values[0] if values else None
+            self.n_rows = 0
+            self.last_row = None
+            self.parsed = None
+            self.rejected = empty_rejected()
+            self.row_index = RowIndex()
+            return
+
+        self.header = values[0]
+        rows = values[1:]
+        with PROFILER.span('planilha.validacao'):
+            self.parsed, self.rejected = parse_sheet_values(self.header, rows, decimal=self.storage.decimal)
+            self.row_index = RowIndex(self.parsed)
+        self.n_rows = len(rows)
+        self.last_row = self._pad(rows[-1])
+
+    def _delta_sync(self):
+        """Busca só o final da planilha; retorna False se não for possível concluir o que mudou"""
+        if not self.header or self.last_row is None:
+            return False
+
+        last_physical = self.n_rows + 1
+        with PROFILER.span('planilha.leitura_incremental'):
+            tail = self.storage.get_tail(last_physical, len(self.header))
+        self.syncs_since_full += 1
+
+        if not tail or self._pad(tail[0]) != self.last_row:
+            return False
+
+        new_rows = tail[1:]
+        if new_rows:
+            delta, rejected = parse_sheet_values(self.header, new_rows, first_row=last_physical + 1,
+                                                 decimal=self.storage.decimal)
+            self.parsed = pd.concat([self.parsed, delta])
+            self.row_index.add(delta)
+            if len(rejected):
+                self.rejected = pd.concat([self.rejected, rejected], ignore_index=True)
+            self.n_rows += len(new_rows)
+            self.last_row = self._pad(new_rows[-1])
+        return True
+
+    # Escritas por data: a linha física vem do índice, nunca da posição no DataFrame final
+    def _confirm(self, rows):
+        """Relê as linhas no backend e confere data e valor com os da última leitura"""
+        if not rows:
+            return True
+        current = self.storage.get_rows(rows, len(self.header))
+        found, rejected = parse_sheet_values(self.header, [current[row] for row in rows], first_row=0,
+                                             decimal=self.storage.decimal)
+        if len(rejected):
+            return False
+        expected = self.parsed.loc[rows]
+        return (np.array_equal(found['Data'].to_numpy(), expected['Data'].to_numpy())
+                and np.allclose(found['Energia Gerada (kWh)'].to_numpy(),
+                                expected['Energia Gerada (kWh)'].to_numpy()))
+
+    def _locate(self, dates):
+        """{data: linhas físicas}; se o backend mudou desde a leitura, recarrega e procura de novo"""
+        if self.needs_full or self.parsed is None:
+            self._full_reload()
+        located = {date: self.row_index.rows(date) for date in dates}
+        if self.parsed is None or self._confirm(sorted({r for rows in located.values() for r in rows})):
+            return located
+        self._full_reload()
+        return {date: self.row_index.rows(date) for date in dates}
+
+    def _apply_updates(self, updates):
+        """Reflete no estado lido as linhas reescritas no lugar"""
+        written, _ = parse_sheet_values(self.header, [self._pad(v) for v in updates.values()], first_row=0,
+                                        decimal=self.storage.decimal)
+        for pos, (row, values) in enumerate(updates.items()):
+            old_date = self.parsed.at[row, 'Data']
+            if pos in written.index:
+                new_date = written.at[pos, 'Data']
+                self.parsed.loc[row, ['Data', 'Energia Gerada (kWh)']] = [
+                    new_date, written.at[pos, 'Energia Gerada (kWh)']
+                ]
+            else:
+                # Valor gravado não passa na validação: a próxima leitura completa o rejeita
+                new_date = None
+                self.parsed = self.parsed.drop(index=row)
+                self.needs_full = True
+            self.row_index.move(row, old_date, new_date)
+            if row == self.n_rows + 1:
+                self.last_row = self._pad(values)
+
+    def _delete_rows(self, rows):
+        """Exclui linhas físicas e desloca o estado lido sem reler a planilha.
+
+        Linhas consecutivas saem numa única chamada (um intervalo), de baixo para cima
+        para que as posições ainda não tratadas continuem valendo.
+        """
+        rows = sorted(set(rows))
+        runs = []
+        for row in rows:
+            if runs and row == runs[-1][1] + 1:
+                runs[-1][1] = row
+            else:
+                runs.append([row, row])
+        for start, end in reversed(runs):
+            self.storage.delete_rows(start, end)
+        deleted = np.asarray(rows)
+        if self.n_rows + 1 in rows:
+            self.needs_full = True    # a nova última linha (sonda do delta) não é conhecida
+        kept = self.parsed.drop(index=rows, errors='ignore')
+        kept.index = kept.index - np.searchsorted(deleted, kept.index.to_numpy())
+        self.parsed = kept
+        linhas = self.rejected['Linha'].to_numpy()
+        self.rejected = self.rejected.assign(Linha=linhas - np.searchsorted(deleted, linhas))
+        self.n_rows -= len(rows)
+        self.row_index = RowIndex(self.parsed)
+
+    def write_batch(self, upserts=(), moves=(), deletes=()):
+        """Grava um lote de alterações por data, com as linhas vindas do índice.
+
+        upserts: linhas ['dd/mm/aaaa', valor] gravadas no seu dia (no lugar, se o dia já
+        existe; vale a última de cada dia). moves: (data atual, novos valores), edição
+        no lugar que pode trocar a data. deletes: dias a excluir por inteiro.
+
+        As linhas são conferidas com o conteúdo atual antes da escrita. Relançamentos
+        antigos dos dias gravados saem junto; linhas excluídas são reaproveitadas pelos
+        dias novos antes de acrescentar ao fim. Retorna as datas de moves/deletes que
+        não existem mais no backend (alteração descartada).
+        """
+        with self._lock:
+            moves, deletes = list(moves), list(deletes)
+            upserts = list({_day_key(values[0]): values for values in upserts}.values())
+            targets = [values[0] for values in upserts] + [values[0] for _, values in moves]
+            located = self._locate(list(dict.fromkeys([d for d, _ in moves] + deletes + targets)))
+
+            updates, drop, appends, missing = {}, set(), [], []
+            for date in deletes:
+                if not located[date]:
+                    missing.append(date)
+                drop.update(located[date])
+            for date, values in moves:
+                rows = located[date]
+                if not rows:
+                    missing.append(date)
+                    continue
+                updates[rows[-1]] = values
+                drop.update(rows[:-1])
+                if _day_key(values[0]) != _day_key(date):
+                    drop.update(located[values[0]])    # o dia de destino passa a ser esta linha
+            for values in upserts:
+                rows = located[values[0]]
+                if rows:
+                    updates[rows[-1]] = values
+                    drop.update(rows[:-1])
+                else:
+                    appends.append(values)
+
+            drop -= set(updates)
+            free = sorted(drop)
+            while appends and free:
+                updates[free.pop()] = appends.pop(0)
+            drop = set(free)
+
+            try:
+                if updates:
+                    self.storage.batch_update_rows(updates)
+                    self._apply_updates(updates)
+                if drop:
+                    self._delete_rows(drop)
+                if appends:
+                    # Entram no estado pela próxima sincronização incremental (leitura do fim)
+                    self.storage.append_rows(appends)
+            except Exception:
+                # Parte do lote pode ter sido aplicada: a próxima tentativa parte de uma leitura nova
+                self.needs_full = True
+                raise
+            return missing
+
+    @property
+    def duplicate_rows(self):
+        """Linhas válidas ocultas na leitura por um relançamento posterior do mesmo dia"""
+        return 0 if self.parsed is None else len(self.parsed) - len(self.row_index)
+
+    def compact(self):
+        """Reescreve o backend ordenado por data, com uma linha por dia, numa só gravação.
+
+        Fica a última linha de cada dia, com o texto original; linhas inválidas vão
+        intactas para o fim, para correção manual. Retorna quantas linhas saíram.
+        """
+        with self._lock:
+            with PROFILER.span('planilha.compactacao'):
+                values = self.storage.get_all_values()
+                if len(values) < 2:
+                    return 0
+                raw = values[1:]
+                parsed, rejected = parse_sheet_values(values[0], raw, decimal=self.storage.decimal)
+                kept = parsed.sort_values(by='Data', kind='mergesort').drop_duplicates(subset=['Data'], keep='last')
+                rows = [raw[r - 2] for r in kept.index] + [raw[r - 2] for r in rejected['Linha']]
+                if rows == raw:
+                    return 0
+                self.needs_full = True    # vale também se a gravação falhar no meio
+                self.storage.rewrite_rows(rows, len(raw))
+            return len(raw) - len(rows)
+
+class DatasetRevision:
+    """Revisões do conjunto de dados, usadas como parte das chaves de cache.
+
+    Uma escrita incrementa a revisão global e a das partições (ano, mês) afetadas;
+    funções em cache recebem a revisão como argumento, então só as entradas ligadas
+    aos dados alterados deixam de ser reaproveitadas, sem limpar o cache de ninguém.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.epoch = 0           # incrementada quando não se sabe o que mudou
+        self.revision = 0
+        self.partitions = {}
+
+    def bump(self, dates=None):
+        """Registra uma alteração; sem datas, invalida todas as partições"""
+        with self._lock:
+            self.revision += 1
+            if dates is None:
+                self.epoch += 1
+                return
+            for date in dates:
+                date = pd.Timestamp(date)
+                key = (date.year, date.month)
+                self.partitions[key] = self.partitions.get(key, 0) + 1
+
+    def current(self):
+        return (self.epoch, self.revision)
+
+    def partition(self, year, month):
+        return (self.epoch, self.partitions.get((year, month), 0))
+
+# — Frota (várias usinas) —
+def resumo_usina(nome, df, ano_atual=None):
+    """Linha de resumo da usina e totais por ano (visão da frota)"""
+    if df.empty:
+        return {'Usina': nome, 'Status': "Sem dados"}, pd.DataFrame()
+    ano_atual = datetime.now().year if ano_atual is None else ano_atual
+    energia = df['Energia Gerada (kWh)']
+    anos = df['Data'].dt.year
+    resumo = {
+        'Usina': nome,
+        'Status': "✅",
+        'Registros': len(df),
+        'Início': df['Data'].min().strftime('%d/%m/%Y'),
+        'Último Registro': df['Data'].max().strftime('%d/%m/%Y'),
+        'Total (kWh)': energia.sum(),
+        f'{ano_atual} (kWh)': energia[anos == ano_atual].sum(),
+        'Média Diária (kWh)': energia.mean(),
+    }
+    por_ano = energia.groupby(anos).sum()
+    return resumo, pd.DataFrame({'Usina': nome, 'Ano': por_ano.index, 'Energia Gerada (kWh)': por_ano.values})
+
+# — Fila de Escrita em Segundo Plano —
+class WriteBehindQueue:
+    """Fila de escritas gravadas em lote por uma thread em segundo plano.
+
+    As operações ficam num diário local até serem confirmadas pelo backend, então
+    sobrevivem a falhas transitórias da API (e a reinícios do processo). Cada lote
+    agrupa operações consecutivas do mesmo tipo numa única chamada.
+
+    'append' grava por data (upsert): um dia que já está na planilha é reescrito no
+    lugar. 'compact' reescreve a planilha inteira, ordenada e sem duplicatas, na mesma
+    thread, então nunca se intercala com outras escritas.
+
+    Uma operação que não tem como dar certo (erro de validação, aba apagada, entrada
+    corrompida no diário) ou que esgota WRITE_MAX_ATTEMPTS sai da fila para a lista de
+    falhas (`dead`, também no diário), para não travar as escritas seguintes; de lá ela
+    pode ser reenfileirada ou descartada.
+    """
+
+    def __init__(self, storage, sync, revisions, journal_path):
+        self.storage = storage
+        self.sync = sync
+        self.revisions = revisions
+        self.journal_path = journal_path
+        self._cond = threading.Condition()
+        self._pending, self._dead = self._load_journal()
+        self._attempts = 0       # falhas seguidas do lote no início da fila
+        self._isolate = False    # após uma falha definitiva de um lote, grava uma operação por vez
+        self.last_error = None
+        self.discarded = deque(maxlen=50)   # datas de edições/exclusões cujo registro já não existia
+        self._worker = threading.Thread(target=self._run, name='solar-write-behind', daemon=True)
+        self._worker.start()
+
+    def _load_journal(self):
+        """(pendentes, falhas) do diário; diários antigos são só a lista de pendentes"""
+        try:
+            with open(self.journal_path, encoding='utf-8') as f:
+                journal = json.load(f)
+        except (OSError, ValueError):
+            return [], []
+        if isinstance(journal, list):
+            return journal, []
+        return journal.get('pending', []), journal.get('dead', [])
+
+    def _save_journal(self):
+        tmp = f"{self.journal_path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'pending': self._pending, 'dead': self._dead}, f)
+        os.replace(tmp, self.journal_path)
+
+    def enqueue(self, op):
+        """Adiciona uma operação ('append', 'update', 'delete', 'edit' ou 'compact') à fila.
+
+        Edições e exclusões apontam o registro pela data ('date', 'dd/mm/aaaa'); a linha
+        física só é resolvida na gravação, pelo índice do sincronizador. 'edit' leva um
+        lote inteiro ('upserts', 'moves', 'deletes'), gravado e invalidado de uma vez.
+        """
+        with self._cond:
+            self._pending.append(op)
+            self._save_journal()
+            self._cond.notify()
+
+    def enqueue_many(self, ops):
+        """Adiciona várias operações de uma vez (um único registro no diário)"""
+        if not ops:
+            return
+        with self._cond:
+            self._pending.extend(ops)
+            self._save_journal()
+            self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return list(self._pending)
+
+    def dead(self):
+        """Operações que saíram da fila por falha: [{'op', 'erro', 'tentativas', 'em'}]"""
+        with self._cond:
+            return list(self._dead)
+
+    def retry_dead(self, index=None):
+        """Devolve à fila (no fim) a falha `index`, ou todas; retorna quantas voltaram"""
+        with self._cond:
+            chosen = self._dead if index is None else self._dead[index:index + 1]
+            self._pending.extend(entry['op'] for entry in chosen)
+            count = len(chosen)
+            self._dead = [] if index is None else self._dead[:index] + self._dead[index + 1:]
+            self._save_journal()
+            self._cond.notify()
+        return count
+
+    def discard_dead(self, index=None):
+        """Descarta a falha `index`, ou todas"""
+        with self._cond:
+            self._dead = [] if index is None else self._dead[:index] + self._dead[index + 1:]
+            self._save_journal()
+
+    def request_compaction(self):
+        """Agenda a compactação da planilha, se ainda não houver uma na fila"""
+        with self._cond:
+            if any(op['op'] == 'compact' for op in self._pending):
+                return False
+        self.enqueue({'op': 'compact', 'dates': []})
+        return True
+
+    def _run(self):
+        backoff = 1
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            time.sleep(WRITE_FLUSH_DELAY)
+            try:
+                self._flush()
+                self.last_error = None
+                backoff = 1
+            except Exception as e:
+                self.last_error = str(e)
+                if self._fail(e):
+                    backoff = 1
+                    continue
+                time.sleep(backoff + random.uniform(0, backoff))
+                backoff = min(backoff * 2, WRITE_MAX_BACKOFF)
+
+    def _fail(self, error):
+        """Registra a falha do lote no início da fila; True se ela foi definitiva.
+
+        Num lote de várias operações não se sabe qual falhou: elas passam a ser gravadas
+        uma a uma, e só a que falhar sozinha vai para a lista de falhas.
+        """
+        self._attempts += 1
+        attempts = self._attempts
+        if is_retryable(error) and attempts < WRITE_MAX_ATTEMPTS:
+            return False
+        self._attempts = 0
+        if not self._isolate and len(self._next_group()) > 1:
+            self._isolate = True
+            return True
+        with self._cond:
+            if self._pending:
+                self._dead.append({'op': self._pending.pop(0), 'erro': str(error), 'tentativas': attempts,
+                                   'em': datetime.now().isoformat(timespec='seconds')})
+                self._save_journal()
+        self.revisions.bump()
+        return True
+
+    def _next_group(self):
+        """Operações consecutivas do mesmo tipo no início da fila"""
+        with self._cond:
+            if not self._pending:
+                return []
+            if self._isolate:
+                return self._pending[:1]
+            kind = self._pending[0]['op']
+            group, touched = [], set()
+            for op in self._pending:
+                # Uma edição que depende de outra do mesmo lote (mesmo dia) fica para o próximo
+                if op['op'] != kind or (kind != 'append' and touched.intersection(op.get('dates', []))):
+                    break
+                group.append(op)
+                if kind != 'append':
+                    touched.update(op.get('dates', []))
+            return group
+
+    def _flush_positional(self, ops):
+        """Operações por linha física ('row'), de diários gravados antes do índice por data"""
+        if not ops:
+            return
+        updates = {op['row']: op['values'] for op in ops if op['op'] == 'update'}
+        if updates:
+            self.storage.batch_update_rows(updates)
+        for row in sorted({op['row'] for op in ops if op['op'] == 'delete'}, reverse=True):
+            self.storage.delete_rows(row)
+        self.sync.invalidate()
+
+    def _flush(self):
+        while True:
+            group = self._next_group()
+            if not group:
+                break
+            kind = group[0]['op']
+            with PROFILER.span(f'fila.{kind}'):
+                if kind == 'compact':
+                    self.sync.compact()
+                else:
+                    upserts, moves, deletes = [], [], []
+                    for op in group:
+                        if op['op'] == 'append':
+                            upserts.append(op['values'])
+                        elif op['op'] == 'update' and 'date' in op:
+                            moves.append((op['date'], op['values']))
+                        elif op['op'] == 'delete' and 'date' in op:
+                            deletes.append(op['date'])
+                        elif op['op'] == 'edit':
+                            upserts.extend(op['upserts'])
+                            moves.extend(tuple(move) for move in op['moves'])
+                            deletes.extend(op['deletes'])
+                    self.discarded.extend(self.sync.write_batch(upserts, moves, deletes))
+                    self._flush_positional([op for op in group if 'row' in op])
+
+            # Atualiza o snapshot antes de tirar as operações da fila, para a
+            # escrita não "sumir" da tela entre a gravação e a próxima revalidação
+            try:
+                self.sync.refresh()
+            except Exception:
+                pass
+
+            with self._cond:
+                del self._pending[:len(group)]
+                self._save_journal()
+            self._attempts = 0
+            self._isolate = False
+
+            dates = [d for op in group for d in op.get('dates', [])]
+            if any(not op.get('dates') for op in group):
+                self.revisions.bump()
+            else:
+                self.revisions.bump(pd.to_datetime(dates, format='%d/%m/%Y'))
+
+def pending_effects(op):
+    """Efeito de uma operação da fila sobre os dias, em ordem: ('remove', 'dd/mm/aaaa')
+    ou ('set', ['dd/mm/aaaa', valor]). Operações antigas, por linha física, trazem as
+    datas afetadas em 'dates'."""
+    dates = op.get('dates', [])
+    if op['op'] == 'edit':
+        for date in op['deletes']:
+            yield 'remove', date
+        for date, values in op['moves']:
+            yield 'remove', date
+            yield 'set', values
+        for values in op['upserts']:
+            yield 'set', values
+        return
+    if op['op'] in ('update', 'delete'):
+        target = op.get('date') or (dates[-1] if dates else None)
+        if target is not None:
+            yield 'remove', target
+    if op['op'] in ('append', 'update'):
+        yield 'set', op['values']
+
+def apply_pending_writes(df, pending):
+    """Aplica de forma otimista as escritas ainda não gravadas ao DataFrame exibido.
+
+    Tudo vale pela data do registro, com a mesma regra da gravação (pending_effects).
+    """
+    if not pending:
+        return df
+    dropped = set()
+    added = {}    # dia -> kWh, na ordem em que foram lançados
+    for op in pending:
+        for effect, value in pending_effects(op):
+            if effect == 'remove':
+                date = pd.to_datetime(value, format='%d/%m/%Y')
+                dropped.add(date)
+                added.pop(date, None)
+            else:
+                date = pd.to_datetime(value[0], format='%d/%m/%Y')
+                added.pop(date, None)
+                added[date] = float(value[1].replace(',', '.'))
+    if dropped and not df.empty:
+        df = df[~df['Data'].isin(dropped)]
+    if added:
+        df = pd.concat([df, pd.DataFrame({'Data': list(added), 'Energia Gerada (kWh)': list(added.values())})],
+                       ignore_index=True)
+    return finalize_data(df)
+
+# — Edição em Grade —
+def _sheet_row(date, energy):
+    return [pd.Timestamp(date).strftime('%d/%m/%Y'), str(round(float(energy), 4)).replace('.', ',')]
+
+def diff_registros(original, editado):
+    """Diferença entre a grade exibida e a editada, já como um lote de escritas por data.
+
+    As linhas são casadas pelo índice: o editor preserva o das linhas existentes e dá
+    índices novos às incluídas. Linhas sem data ou com valor inválido ficam de fora (em
+    'invalidas'), assim como dias repetidos na grade (em 'repetidas'); com qualquer um
+    dos dois o lote não deve ser gravado. Retorna também 'upserts', 'moves' e 'deletes'
+    no formato da operação 'edit' da fila e as contagens de cada tipo de mudança.
+    """
+    cols = ['Data', 'Energia Gerada (kWh)']
+    editado = editado.reindex(columns=cols)
+    editado = editado.assign(
+        Data=pd.to_datetime(editado['Data'], errors='coerce'),
+        **{cols[1]: pd.to_numeric(editado[cols[1]], errors='coerce')}
+    )
+    bad = (editado['Data'].isna() | editado[cols[1]].isna() | (editado[cols[1]] < 0)).to_numpy()
+    invalidas, editado = editado[bad], editado[~bad]
+    repetidas = editado.loc[editado['Data'].duplicated(), 'Data'].drop_duplicates().tolist()
+
+    comuns = original.index.intersection(editado.index)
+    antes, depois = original.loc[comuns, cols], editado.loc[comuns]
+    nova_data = antes['Data'].to_numpy() != depois['Data'].to_numpy()
+    novo_valor = ~np.isclose(antes[cols[1]].to_numpy(dtype=float), depois[cols[1]].to_numpy(dtype=float))
+
+    moves = [(_sheet_row(a, 0)[0], _sheet_row(d, v))
+             for a, d, v in zip(antes['Data'][nova_data], depois['Data'][nova_data], depois[cols[1]][nova_data])]
+    alterados = depois[~nova_data & novo_valor]
+    incluidos = editado.loc[editado.index.difference(original.index)]
+    upserts = [_sheet_row(d, v) for d, v in zip(alterados['Data'], alterados[cols[1]])]
+    upserts += [_sheet_row(d, v) for d, v in zip(incluidos['Data'], incluidos[cols[1]])]
+
+    # Excluídos da grade; linhas que só ficaram inválidas não contam como exclusão
+    removidos = original.loc[original.index.difference(editado.index).difference(invalidas.index)]
+    gravados = {values[0] for values in upserts} | {values[0] for _, values in moves}
+    deletes = [d for d in (_sheet_row(d, 0)[0] for d in removidos['Data']) if d not in gravados]
+    return {
+        'upserts': upserts,
+        'moves': moves,
+        'deletes': deletes,
+        'alterados': int(nova_data.sum() + len(alterados)),
+        'incluidos': len(incluidos),
+        'excluidos': len(deletes),
+        'invalidas': invalidas,
+        'repetidas': repetidas,
+    }
+
+# — Importação de Histórico (CSV/XLSX) —
+IMPORT_CHUNK_ROWS = 50_000   # linhas lidas e validadas por vez
+
+def _sniff_delimiter(sample):
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=',;\t|').delimiter
+    except csv.Error:
+        return ','
+
+def _cell_text(value):
+    """Célula do Excel no formato da planilha ('dd/mm/aaaa', '12,5')"""
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime('%d/%m/%Y')
+    if isinstance(value, float):
+        return repr(value).replace('.', ',')
+    return str(value)
+
+def _iter_xlsx(source, chunk_rows):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("Para importar XLSX instale o pacote openpyxl (ou salve a planilha como CSV).")
+    book = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = book.worksheets[0].iter_rows(values_only=True)
+        header = [_cell_text(v) for v in next(rows, ())]
+        chunk = []
+        for row in rows:
+            chunk.append([_cell_text(v) for v in row])
+            if len(chunk) >= chunk_rows:
+                yield header, chunk
+                chunk = []
+        if chunk:
+            yield header, chunk
+    finally:
+        book.close()
+
+def _iter_csv(source, chunk_rows):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            yield from _iter_csv(f, chunk_rows)
+        return
+    sample = source.read(8192)
+    source.seek(0)
+    if isinstance(sample, bytes):
+        sample = sample.decode('utf-8-sig', errors='ignore')
+    reader = pd.read_csv(source, sep=_sniff_delimiter(sample), dtype=str, keep_default_na=False,
+                         encoding='utf-8-sig', chunksize=chunk_rows)
+    with reader:
+        for chunk in reader:
+            yield list(chunk.columns), chunk.to_numpy().tolist()
+
+def iter_import_chunks(source, name=None, chunk_rows=IMPORT_CHUNK_ROWS):
+    """Lê um CSV (separador detectado) ou XLSX em blocos de (cabeçalho, linhas) no formato da planilha"""
+    name = str(name if name is not None else source).lower()
+    if name.endswith(('.xlsx', '.xlsm')):
+        return _iter_xlsx(source, chunk_rows)
+    return _iter_csv(source, chunk_rows)
+
+def planejar_importacao(chunks, existentes):
+    """Valida os blocos com as regras da leitura e compara com o histórico atual.
+
+    Dentro do arquivo vale o último lançamento de cada dia, como na planilha. Retorna
+    `novos` (dias sem registro), `conflitos` (dias já registrados com outro valor, com
+    'Registrado (kWh)'), `iguais` (já registrados com o mesmo valor), `duplicadas`
+    (lançamentos repetidos no arquivo), `rejeitadas` (linha do arquivo e motivo) e `linhas`.
+    """
+    parsed, rejected, first_row = [], [], 2
+    for header, rows in chunks:
+        valid, bad = parse_sheet_values(header, rows, first_row)
+        parsed.append(valid)
+        if len(bad):
+            rejected.append(bad)
+        first_row += len(rows)
+
+    valid = pd.concat(parsed) if parsed else None
+    incoming = finalize_data(valid)
+    plano = {
+        'linhas': first_row - 2,
+        'duplicadas': (len(valid) if valid is not None else 0) - len(incoming),
+        'rejeitadas': pd.concat(rejected, ignore_index=True) if rejected else empty_rejected(),
+    }
+    if incoming.empty:
+        vazio = pd.DataFrame({'Data': pd.Series(dtype='datetime64[ns]'), 'Energia Gerada (kWh)': pd.Series(dtype=float)})
+        return {**plano, 'novos': vazio, 'conflitos': vazio.assign(**{'Registrado (kWh)': 0.0}), 'iguais': 0}
+
+    atual = (existentes.set_index('Data')['Energia Gerada (kWh)'] if not existentes.empty
+             else pd.Series(dtype=float))
+    registrado = incoming['Data'].map(atual)
+    igual = registrado.notna() & np.isclose(registrado.fillna(0), incoming['Energia Gerada (kWh)'], atol=0.005)
+    conflito = registrado.notna() & ~igual
+    return {
+        **plano,
+        'novos': incoming[registrado.isna()].reset_index(drop=True),
+        'conflitos': incoming[conflito].assign(**{'Registrado (kWh)': registrado[conflito]}).reset_index(drop=True),
+        'iguais': int(igual.sum()),
+    }
+
+# — Leituras Intraday do Inversor —
+INTRADAY_TIME_COLUMNS = ('data', 'instante', 'data/hora', 'timestamp', 'horario', 'horário')
+INTRADAY_MAX_GAP = 15 * 60   # intervalos maiores (s) são falha de leitura e não entram na integral
+INTRADAY_MAX_POINTS = 2000   # pontos enviados ao navegador por curva
+
+def parse_br_datetimes(values):
+    """Data e hora ('dd/mm/aaaa hh:mm[:ss]', também ISO com 'T').
+
+    Data e hora são convertidas separadamente: um ano de leituras de 5 min tem 105 mil
+    instantes, mas só 365 datas e 288 horários distintos.
+    """
+    text = pd.Series(np.asarray(values, dtype=object), dtype='string').str.strip()
+    parts = text.str.replace('T', ' ', n=1, regex=False).str.partition(' ')
+    dates = parse_br_dates(parts[0].to_numpy(dtype=object, na_value=''))
+    codes, clock = _factorize_text(parts[2].to_numpy(dtype=object, na_value=''))
+    clock = clock.where(clock.str.count(':') != 1, clock + ':00')
+    times = pd.to_timedelta(clock, errors='coerce').to_numpy(dtype='timedelta64[ns]')
+    times[(times < np.timedelta64(0)) | (times >= np.timedelta64(1, 'D'))] = np.timedelta64('NaT')
+    return dates + _expand(codes, times, np.timedelta64('NaT'))
+
+def detect_decimal(values):
+    """Separador decimal de uma coluna exportada: ',' se é o último sinal de algum valor, senão '.'.
+
+    Exportações de inversor trazem a coluna inteira num só padrão; decidir pela coluna
+    evita ler '1.500' (1,5 kWh) como milhar só porque tem três casas.
+    """
+    text = pd.Series(np.asarray(values, dtype=object), dtype='string')
+    return ',' if text.str.contains(r',\d*$', regex=True).fillna(False).any() else '.'
+
+def parse_intraday_values(header, rows, decimal=None):
+    """Leituras do inversor -> DataFrame ['Instante', 'Potência (kW)'] ordenado e sem repetidos.
+
+    Aceita uma coluna de potência ('potencia', kW) ou de energia do intervalo ('energia',
+    kWh); a energia fica em 'Energia (kWh)' e a potência passa a ser a média do intervalo
+    até a leitura anterior (só para a curva). `decimal` é o separador decimal do arquivo
+    (None = detectado pela coluna). Retorna também quantas linhas foram descartadas por
+    data/hora ou valor inválidos.
+    """
+    columns = [str(col).lower().strip() for col in header]
+    i_time = next((columns.index(c) for c in INTRADAY_TIME_COLUMNS if c in columns), None)
+    i_value = next((i for i, c in enumerate(columns) if c.startswith(('potencia', 'potência', 'energia'))), None)
+    if i_time is None or i_value is None:
+        raise ValueError("As leituras devem ter uma coluna de data/hora ('data') e uma de 'potencia' ou 'energia'.")
+    energy = columns[i_value].startswith('energia')
+
+    width = len(header)
+    rows = [list(r[:width]) + [''] * (width - len(r)) for r in rows]
+    table = np.array(rows, dtype=object).reshape(len(rows), width)
+    instants = parse_br_datetimes(table[:, i_time])
+    column = table[:, i_value]
+    values = parse_br_numbers(column, decimal or detect_decimal(column))
+    ok = ~np.isnat(instants) & np.isfinite(values) & (values >= 0)
+
+    df = pd.DataFrame({'Instante': instants[ok], 'Potência (kW)': values[ok]})
+    df = df.drop_duplicates('Instante', keep='last').sort_values('Instante', kind='stable').reset_index(drop=True)
+    if energy:
+        df['Energia (kWh)'] = df['Potência (kW)']
+        step = np.diff(df['Instante'].to_numpy()).astype('timedelta64[s]').astype(float)
+        step = np.concatenate([[np.median(step) if len(step) else 300.0], step])
+        df['Potência (kW)'] = df['Energia (kWh)'] / (np.clip(step, 1, INTRADAY_MAX_GAP) / 3600)
+    return df, int((~ok).sum())
+
+def read_intraday_csv(source, decimal=None):
+    """Lê a exportação CSV do inversor (separador de campos e decimal detectados) e valida as leituras"""
+    raw = pd.read_csv(source, dtype=str, sep=None, engine='python', keep_default_na=False)
+    return parse_intraday_values(list(raw.columns), raw.to_numpy().tolist(), decimal)
+
+def integrar_diario(instantes, potencia, max_gap=INTRADAY_MAX_GAP, energia=None):
+    """Energia diária (kWh) pela regra do trapézio sobre as leituras de potência (kW).
+
+    Só integra pares de leituras do mesmo dia separados por até `max_gap` segundos:
+    buracos de comunicação não viram geração inventada. Leituras com a energia do
+    intervalo medida (`energia`, NaN onde não há) entram somadas, sem integrar a
+    potência: o trapézio perderia metade do primeiro e do último intervalo do dia.
+    """
+    t = np.asarray(instantes, dtype='datetime64[s]').astype(np.int64)
+    p = np.asarray(potencia, dtype=float)
+    e = np.full(len(t), np.nan) if energia is None else np.asarray(energia, dtype=float)
+    measured = np.isfinite(e)
+    if len(t) < 2 and not measured.any():
+        return pd.DataFrame({'Data': pd.Series(dtype='datetime64[ns]'),
+                             'Energia Gerada (kWh)': pd.Series(dtype=float), 'Amostras': pd.Series(dtype=int)})
+    day = t // 86400
+    dt = np.diff(t)
+    keep = (day[1:] == day[:-1]) & (dt > 0) & (dt <= max_gap) & ~measured[1:]
+    area = (p[1:] + p[:-1]) / 2 * dt / 3600
+    days, which, samples = np.unique(day, return_inverse=True, return_counts=True)
+    energy = np.bincount(which[1:][keep], weights=area[keep], minlength=len(days)).astype(float)
+    energy += np.bincount(which[measured], weights=e[measured], minlength=len(days))
+    return pd.DataFrame({
+        'Data': pd.to_datetime(days, unit='D'),
+        'Energia Gerada (kWh)': energy.round(4),
+        'Amostras': samples,
+    })
+
+def lttb(x, y, n_out=INTRADAY_MAX_POINTS):
+    """Largest-Triangle-Three-Buckets: reduz a série a `n_out` pontos preservando a forma.
+
+    Mantém o primeiro e o último ponto; de cada balde escolhe o ponto que forma o maior
+    triângulo com o ponto já escolhido e a média do balde seguinte (picos e vales ficam).
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    # n_out - 2 baldes entre o primeiro e o último ponto; o último balde olha para o ponto final
+    edges = np.append(np.linspace(1, n - 1, n_out - 1).astype(np.int64), n)
+    chosen = np.empty(n_out, dtype=np.int64)
+    chosen[0], chosen[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt = slice(edges[i + 1], edges[i + 2])
+        cx, cy = x[nxt].mean(), y[nxt].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(area.argmax())
+        chosen[i + 1] = a
+    return chosen
+
+class IntradayStore:
+    """Leituras de potência das usinas num SQLite local, uma linha por (usina, instante).
+
+    Instantes ficam em segundos desde a época (hora local do inversor, sem fuso), o que
+    deixa a consulta por intervalo no índice da chave primária.
+    """
+
+    def __init__(self, path, plant):
+        self.path = path
+        self.plant = plant
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS leituras ("
+                "usina TEXT NOT NULL, instante INTEGER NOT NULL, potencia REAL NOT NULL, energia REAL, "
+                "PRIMARY KEY (usina, instante)) WITHOUT ROWID"
+            )
+            # Bancos criados antes da coluna de energia do intervalo
+            columns = [r[1] for r in self.conn.execute("PRAGMA table_info(leituras)")]
+            if 'energia' not in columns:
+                self.conn.execute("ALTER TABLE leituras ADD COLUMN energia REAL")
+
+    def ingest(self, df):
+        """Grava (ou substitui) as leituras; retorna quantas foram gravadas"""
+        seconds = df['Instante'].to_numpy(dtype='datetime64[s]').astype(np.int64)
+        energia = df['Energia (kWh)'].astype(float).tolist() if 'Energia (kWh)' in df else [None] * len(df)
+        rows = zip([self.plant] * len(df), seconds.tolist(), df['Potência (kW)'].astype(float).tolist(), energia)
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO leituras (usina, instante, potencia, energia) VALUES (?, ?, ?, ?)", rows
+            )
+        return len(df)
+
+    def revision(self):
+        """(leituras, último instante): muda a cada importação, serve de chave de cache"""
+        with self._lock:
+            return tuple(self.conn.execute(
+                "SELECT COUNT(*), COALESCE(MAX(instante), 0) FROM leituras WHERE usina = ?", (self.plant,)
+            ).fetchone())
+
+    def span(self):
+        """(primeiro, último) dia com leituras, ou None"""
+        with self._lock:
+            first, last = self.conn.execute(
+                "SELECT MIN(instante), MAX(instante) FROM leituras WHERE usina = ?", (self.plant,)
+            ).fetchone()
+        if first is None:
+            return None
+        return pd.Timestamp(first, unit='s').normalize(), pd.Timestamp(last, unit='s').normalize()
+
+    def samples(self, start=None, end=None):
+        """(instantes datetime64[s], potência kW, energia kWh do intervalo ou NaN) em [start, end], ordenados"""
+        lo = -2**62 if start is None else int(pd.Timestamp(start).timestamp())
+        hi = 2**62 if end is None else int(pd.Timestamp(end).timestamp())
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT instante, potencia, energia FROM leituras WHERE usina = ? AND instante BETWEEN ? AND ? "
+                "ORDER BY instante", (self.plant, lo, hi)
+            ).fetchall()
+        data = np.array(rows, dtype=float).reshape(len(rows), 3)
+        return data[:, 0].astype(np.int64).astype('datetime64[s]'), data[:, 1], data[:, 2]
+
+    def daily_energy(self, start=None, end=None):
+        instantes, potencia, energia = self.samples(start, end)
+        return integrar_diario(instantes, potencia, energia=energia)
+
+def curva_intraday(instantes, potencia, max_points=INTRADAY_MAX_POINTS):
+    """Curva reduzida por LTTB: (instantes em ms desde a época, kW), no máximo `max_points`"""
+    ms = np.asarray(instantes, dtype='datetime64[ms]').astype(np.int64)
+    idx = lttb(ms, potencia, max_points)
+    return ms[idx], np.round(np.asarray(potencia, dtype=float)[idx], 3)
+
+def dias_para_lancar(diario, existentes):
+    """Separa os dias integrados em novos (sem registro diário) e conflitos (valor diferente)"""
+    atual = existentes.set_index('Data')['Energia Gerada (kWh)'] if not existentes.empty else pd.Series(dtype=float)
+    diario = diario[diario['Energia Gerada (kWh)'] > 0]
+    registrado = diario['Data'].map(atual)
+    novos = diario[registrado.isna()].reset_index(drop=True)
+    conflitos = diario.assign(**{'Registrado (kWh)': registrado})
+    conflitos = conflitos[registrado.notna() & ((registrado - diario['Energia Gerada (kWh)']).abs() > 0.01)]
+    return novos, conflitos.reset_index(drop=True)
+
+# — Série Diária Densa —
+EPOCH = datetime(1970, 1, 1)
+
+def day_number(year, month=1, day=1):
+    """Dias desde 01/01/1970 (mesma contagem de datetime64[D])"""
+    return (datetime(year, month, day) - EPOCH).days
+
+def month_span(year, month):
+    """Intervalo [início, fim) do mês em dias desde a época"""
+    start = day_number(year, month)
+    return start, start + pd.Timestamp(year, month, 1).days_in_month
+
+def to_kwh(values):
+    """float32 armazenado -> float64 exibido, sem o ruído da conversão (12.34, não 12.3400001)"""
+    return np.round(np.asarray(values, dtype=np.float64), 4)
+
+class DailySeries:
+    """Geração diária densa, um float32 por dia desde a primeira leitura.
+
+    `values[i]` é a geração do dia `origin + i` (0 nos dias sem leitura) e `valid[i]`
+    marca se houve leitura. Meses e anos são fatias dos vetores, sem cópia; somas e
+    contagens de qualquer intervalo vêm de prefixos acumulados, em O(1), refeitos só
+    na primeira consulta depois de uma alteração. Os vetores são vistas de uma reserva
+    que dobra quando falta espaço. Uma década ocupa algumas dezenas de KB.
+    """
+
+    def __init__(self, dates=None, values=None):
+        self.origin = None
+        self.values = np.zeros(0, dtype=np.float32)
+        self.valid = np.zeros(0, dtype=bool)
+        self._prefix = None
+        self._count = None
+        if dates is not None and len(dates):
+            days = np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+            self.origin = int(days.min())
+            n = int(days.max()) - self.origin + 1
+            self.values = np.zeros(n, dtype=np.float32)
+            self.valid = np.zeros(n, dtype=bool)
+            self.values[days - self.origin] = values
+            self.valid[days - self.origin] = True
+        self._data, self._flags, self._base = self.values, self.valid, 0
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def end(self):
+        """Dia seguinte ao último do vetor"""
+        return self.origin + len(self.values) if self.origin is not None else None
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self._data, self._flags, self._prefix, self._count) if a is not None)
+
+    def prefix(self):
+        """Soma acumulada (float64) com 0 na frente: total de [a, b) = p[b] - p[a]"""
+        if self._prefix is None:
+            self._prefix = np.concatenate([[0.0], np.cumsum(to_kwh(self.values))])
+        return self._prefix
+
+    def count_prefix(self):
+        if self._count is None:
+            self._count = np.concatenate([[0], np.cumsum(self.valid, dtype=np.int32)])
+        return self._count
+
+    def _clip(self, start, end):
+        """Posições [lo, hi) no vetor para os dias [start, end), limitadas ao que existe"""
+        if self.origin is None:
+            return 0, 0
+        lo = min(max(start - self.origin, 0), len(self.values))
+        hi = min(max(end - self.origin, lo), len(self.values))
+        return lo, hi
+
+    def view(self, start, end):
+        """(primeiro dia, valores, validade) de [start, end) — fatias sem cópia"""
+        lo, hi = self._clip(start, end)
+        return (self.origin or 0) + lo, self.values[lo:hi], self.valid[lo:hi]
+
+    def total(self, start, end):
+        lo, hi = self._clip(start, end)
+        p = self.prefix()
+        return float(p[hi] - p[lo])
+
+    def count(self, start, end):
+        lo, hi = self._clip(start, end)
+        c = self.count_prefix()
+        return int(c[hi] - c[lo])
+
+    def cumulative(self, start, end):
+        """Acumulado desde `start` para cada dia de [start, end) dentro do vetor"""
+        lo, hi = self._clip(start, end)
+        p = self.prefix()
+        return p[lo + 1:hi + 1] - p[lo]
+
+    def window(self, start, end):
+        """Valores de [start, end) num vetor novo do tamanho do intervalo (0 fora do histórico)"""
+        out = np.zeros(end - start)
+        first, values, _ = self.view(start, end)
+        out[first - start:first - start + len(values)] = values
+        return out
+
+    def calendar_months(self):
+        """Mês do calendário (1-12) de cada posição do vetor"""
+        days = np.arange(self.origin or 0, self.end or 0).astype('datetime64[D]')
+        return days.astype('datetime64[M]').astype(np.int64) % 12 + 1
+
+    def _grow(self, day):
+        """Estende os vetores para incluir `day`.
+
+        Realoca só quando a reserva acaba, com o dobro do tamanho e a folga do lado que
+        cresceu: acrescentar dias um a um custa O(1) amortizado.
+        """
+        if self.origin is None:
+            lo, hi = day, day + 1
+        elif self.origin <= day < self.end:
+            return
+        else:
+            lo, hi = min(day, self.origin), max(day + 1, self.end)
+        size = hi - lo
+        base = self._base - (self.origin - lo) if self.origin is not None else 0
+        if base < 0 or base + size > len(self._data):
+            capacity = max(2 * size, 32)
+            base = capacity - size if self.origin is not None and lo < self.origin else 0
+            data = np.zeros(capacity, dtype=np.float32)
+            flags = np.zeros(capacity, dtype=bool)
+            if self.origin is not None:
+                shift = base + self.origin - lo
+                data[shift:shift + len(self.values)] = self.values
+                flags[shift:shift + len(self.valid)] = self.valid
+            self._data, self._flags = data, flags
+        self._base, self.origin = base, lo
+        self.values = self._data[base:base + size]
+        self.valid = self._flags[base:base + size]
+
+    def set(self, day, value):
+        self._grow(day)
+        self.values[day - self.origin] = value
+        self.valid[day - self.origin] = True
+        self._prefix = self._count = None
+
+    def clear(self, day):
+        if self.origin is None or not self.origin <= day < self.end:
+            return
+        self.values[day - self.origin] = 0
+        self.valid[day - self.origin] = False
+        self._prefix = self._count = None
+
+# — Cubo de Agregados (dia → mês → ano) —
+class RollupCube:
+    """Totais, médias e extremos por mês e por ano sobre uma DailySeries.
+
+    Alterar um dia recalcula só o seu mês (O(dias do mês)) e o ano correspondente
+    (O(12)), sem tocar no resto do histórico; totais e acumulados de intervalos
+    saem dos prefixos da série.
+    """
+
+    def __init__(self, df=None):
+        self.series = DailySeries()
+        self.months = {}    # (ano, mês) -> estatísticas do mês
+        self.years = {}     # ano -> estatísticas do ano
+        if df is not None and not df.empty:
+            self._build(df)
+
+    def _build(self, df):
+        self.series = DailySeries(df['Data'].to_numpy(), df['Energia Gerada (kWh)'].to_numpy())
+        first = pd.Timestamp(self.series.origin, unit='D')
+        last = pd.Timestamp(self.series.end - 1, unit='D')
+        year, month = first.year, first.month
+        while (year, month) <= (last.year, last.month):
+            self._refresh_month(year, month, refresh_year=False)
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        for year in {y for y, _ in self.months}:
+            self._refresh_year(year)
+
+    def _refresh_month(self, year, month, refresh_year=True):
+        start, end = month_span(year, month)
+        # Direto da fatia do mês: os prefixos da série ficam para a próxima consulta
+        first, values, valid = self.series.view(start, end)
+        count = int(np.count_nonzero(valid))
+        if not count:
+            self.months.pop((year, month), None)
+        else:
+            offset = first - start
+            masked = np.where(valid, values, np.nan)
+            max_day = int(np.nanargmax(masked))
+            min_day = int(np.nanargmin(masked))
+            total = float(to_kwh(values).sum())
+            self.months[(year, month)] = {
+                'total': total,
+                'count': count,
+                'mean': total / count,
+                'max': float(to_kwh(values[max_day])),
+                'max_date': datetime(year, month, offset + max_day + 1),
+                'min': float(to_kwh(values[min_day])),
+                'min_date': datetime(year, month, offset + min_day + 1),
+            }
+        if refresh_year:
+            self._refresh_year(year)
+
+    def _refresh_year(self, year):
+        months = sorted(m for y, m in self.months if y == year)
+        if not months:
+            self.years.pop(year, None)
+            return
+        totals = np.array([self.months[(year, m)]['total'] for m in months])
+        self.years[year] = {
+            'months': months,
+            'totals': totals,
+            'total': float(totals.sum()),
+            'count': sum(self.months[(year, m)]['count'] for m in months),
+            'monthly_mean': float(totals.mean()),
+            'best_month': months[int(totals.argmax())],
+            'worst_month': months[int(totals.argmin())],
+            # Acumulado do ano até o início de cada mês
+            'offsets': dict(zip(months, np.concatenate([[0.0], np.cumsum(totals)[:-1]]))),
+        }
+
+    @staticmethod
+    def _day(date):
+        date = pd.Timestamp(date)
+        return day_number(date.year, date.month, date.day), date
+
+    def set_day(self, date, value):
+        """Define a geração de um dia e atualiza mês e ano"""
+        day, date = self._day(date)
+        self.series.set(day, value)
+        self._refresh_month(date.year, date.month)
+
+    def remove_day(self, date):
+        """Remove a leitura de um dia"""
+        day, date = self._day(date)
+        self.series.clear(day)
+        self._refresh_month(date.year, date.month)
+
+    def apply_pending(self, pending):
+        """Aplica as escritas ainda na fila (mesma semântica de apply_pending_writes)"""
+        for op in pending:
+            for effect, value in pending_effects(op):
+                if effect == 'remove':
+                    self.remove_day(pd.to_datetime(value, format='%d/%m/%Y'))
+                else:
+                    self.set_day(pd.to_datetime(value[0], format='%d/%m/%Y'),
+                                 float(value[1].replace(',', '.')))
+
+    @property
+    def grand_total(self):
+        return self.series.total(self.series.origin or 0, self.series.end or 0)
+
+    def year_list(self):
+        return sorted(self.years, reverse=True)
+
+    def month_list(self, year):
+        return list(self.years[year]['months']) if year in self.years else []
+
+    def total_until(self, year, month):
+        """Acumulado do ano até o fim do mês informado"""
+        return self.series.total(day_number(year), month_span(year, month)[1])
+
+    def _frame(self, start, end):
+        first, values, valid = self.series.view(start, end)
+        idx = np.flatnonzero(valid)
+        return pd.DataFrame({
+            'Data': pd.to_datetime(first + idx, unit='D'),
+            'Energia Gerada (kWh)': to_kwh(values[idx]),
+            'Acumulado': self.series.cumulative(start, end)[idx],
+        })
+
+    def month_frame(self, year, month):
+        """Dias com leitura do mês, com a geração e o acumulado do mês"""
+        return self._frame(*month_span(year, month))
+
+    def year_frame(self, year):
+        """Dias com leitura do ano, com a geração e o acumulado anual"""
+        return self._frame(day_number(year), day_number(year + 1)).rename(columns={'Acumulado': 'Acumulado Anual'})
+
+    def monthly_summary(self, year):
+        """Total por mês do ano (mesmo formato do antigo groupby)"""
+        stats = self.years[year]
+        return pd.DataFrame({'Mês': stats['months'], 'Energia Gerada (kWh)': stats['totals']})
+
+# — Grade do Calendário (Heatmap) —
+@lru_cache(maxsize=32)
+def calendar_layout(year):
+    """Posição (semana, dia da semana) de cada dia do ano, calculada uma vez por ano"""
+    dates = pd.date_range(datetime(year, 1, 1), datetime(year, 12, 31), freq='D')
+    weekday = dates.dayofweek.to_numpy()
+    # Coluna 0 é a semana (seg-dom) que contém 1º de janeiro
+    week = (np.arange(len(dates)) + weekday[0]) // 7
+    month_offsets = np.flatnonzero(dates.day.to_numpy() == 1)
+    return {
+        'dates': dates,
+        'weekday': weekday,
+        'week': week,
+        'month': dates.month.to_numpy(),
+        'month_offsets': month_offsets,
+        'month_first_week': week[month_offsets],
+    }
+
+def calendar_grid(cube, years):
+    """Grade do heatmap para um ou mais anos, preenchida por dia do ano a partir do cubo"""
+    grids, labels = [], []
+    for year in years:
+        layout = calendar_layout(year)
+        start = day_number(year)
+        values = to_kwh(cube.series.window(start, start + len(layout['dates'])))
+        grids.append(pd.DataFrame({
+            'date': layout['dates'],
+            'Energia Gerada (kWh)': values,
+            'day_of_week': layout['weekday'],
+            'month': layout['month'],
+            'week_num': layout['week'],
+            'year': year,
+        }))
+        labels.append(pd.DataFrame({
+            'month': np.arange(1, 13),
+            'first_week': layout['month_first_week'],
+            'year': year,
+        }))
+    return pd.concat(grids, ignore_index=True), pd.concat(labels, ignore_index=True)
+
+def format_number_br(number, decimals=2):
+    """Formata números no padrão brasileiro"""
+    return f"{number:,.{decimals}f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+# — Métricas do Período —
+def filtrar_periodo(df, inicio=None, fim=None):
+    """Registros com data entre inicio e fim (inclusive; None = sem limite)"""
+    if df.empty:
+        return df
+    mask = np.ones(len(df), dtype=bool)
+    if inicio is not None:
+        mask &= (df['Data'] >= pd.Timestamp(inicio)).to_numpy()
+    if fim is not None:
+        mask &= (df['Data'] <= pd.Timestamp(fim)).to_numpy()
+    return df[mask].reset_index(drop=True)
+
+def metricas_mensais(cube):
+    """Uma linha por mês com total, dias com leitura, média e extremos"""
+    rows = []
+    for (year, month), stats in sorted(cube.months.items()):
+        rows.append({
+            'Ano': year,
+            'Mês': month,
+            'Total (kWh)': stats['total'],
+            'Dias': stats['count'],
+            'Média Diária (kWh)': stats['mean'],
+            'Melhor Dia': stats['max_date'].strftime('%d/%m/%Y'),
+            'Melhor Dia (kWh)': stats['max'],
+            'Menor Dia': stats['min_date'].strftime('%d/%m/%Y'),
+            'Menor Dia (kWh)': stats['min'],
+        })
+    return pd.DataFrame(rows)
+
+def metricas_periodo(cube):
+    """Totais do período coberto pelo cubo (mesmos indicadores do painel)"""
+    if not cube.months:
+        return {'registros': 0, 'total': 0.0}
+    months = cube.months.values()
+    melhor = max(months, key=lambda s: s['max'])
+    pior = min(months, key=lambda s: s['min'])
+    registros = sum(s['count'] for s in months)
+    return {
+        'registros': registros,
+        'total': cube.grand_total,
+        'media_diaria': cube.grand_total / registros,
+        'melhor_dia': {'data': melhor['max_date'].strftime('%d/%m/%Y'), 'kwh': melhor['max']},
+        'menor_dia': {'data': pior['min_date'].strftime('%d/%m/%Y'), 'kwh': pior['min']},
+        'por_ano': {str(y): s['total'] for y, s in sorted(cube.years.items())},
+    }
+
+# — NOVA FUNÇÃO: Cálculo Financeiro Lei 14.300 —
+# Regra de Transição: % cobrado sobre o Fio B (antes de 2023 nada; a partir de 2029, 100%)
+FIO_B_TRANSICAO = {2023: 0.15, 2024: 0.30, 2025: 0.45, 2026: 0.60, 2027: 0.75, 2028: 0.90}
+
+def percentual_fio_b(ano):
+    """Fração do Fio B cobrada no(s) ano(s) informado(s)"""
+    ano = np.asarray(ano)
+    percentual = np.where(ano < min(FIO_B_TRANSICAO), 0.0, 1.0)
+    for ano_tabela, fracao in FIO_B_TRANSICAO.items():
+        percentual = np.where(ano == ano_tabela, fracao, percentual)
+    return percentual if percentual.ndim else float(percentual)
+
+def calcular_economia_lei14300(geracao_total, tarifa_cheia, tarifa_fio_b, simultaneidade_percent, ano=None):
+    """Calcula a economia real considerando a taxação progressiva do Fio B."""
+    fator = simultaneidade_percent / 100.0
+    
+    # 1. Energia Autoconsumida (Isenta)
+    autoconsumo = geracao_total * fator
+    economia_autoconsumo = autoconsumo * tarifa_cheia
+    
+    # 2. Energia Injetada (Taxada)
+    injecao = geracao_total * (1 - fator)
+    
+    # Regra de Transição: % cobrado sobre o Fio B
+    percentual_taxa = percentual_fio_b(datetime.now().year if ano is None else ano)
+    
+    custo_pedagio = injecao * (tarifa_fio_b * percentual_taxa)
+    economia_injecao = (injecao * tarifa_cheia) - custo_pedagio
+    
+    return {
+        "economia_reais": economia_autoconsumo + economia_injecao,
+        "taxa_paga": custo_pedagio,
+        "kwh_autoconsumo": autoconsumo,
+        "percentual_taxa": percentual_taxa * 100
+    }
+
+# — Motor Financeiro Vetorizado —
+VIDA_UTIL_ANOS = 25
+
+def payback_do_fluxo(fluxo):
+    """Primeiro ano com fluxo acumulado >= 0, interpolado linearmente dentro do ano"""
+    anos = fluxo.shape[-1] - 1
+    positivo = fluxo >= 0
+    atinge = positivo.any(axis=-1)
+    k = np.clip(positivo.argmax(axis=-1), 1, anos)
+    antes = np.take_along_axis(fluxo, (k - 1)[..., None], axis=-1)[..., 0]
+    depois = np.take_along_axis(fluxo, k[..., None], axis=-1)[..., 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        payback = np.where(atinge, (k - 1) + (-antes) / (depois - antes), np.inf)
+    return np.where(fluxo[..., 0] >= 0, 0.0, payback)
+
+def fluxo_caixa_lei14300(geracao_anual, tarifa_cheia, tarifa_fio_b, simultaneidade_percent,
+                         investimento, degradacao=0.005, anos=VIDA_UTIL_ANOS, ano_inicio=None,
+                         reajuste_tarifa=0.0):
+    """Fluxos de caixa anuais (índice 0 = investimento) com degradação, reajuste e transição do Fio B.
+
+    Parâmetros escalares ou arrays NumPy (com broadcasting); retorna shape (..., anos + 1).
+    """
+    (geracao_anual, tarifa_cheia, tarifa_fio_b, simultaneidade_percent,
+     investimento, degradacao, reajuste_tarifa) = np.broadcast_arrays(*[
+        np.asarray(x, dtype=float) for x in (
+            geracao_anual, tarifa_cheia, tarifa_fio_b, simultaneidade_percent,
+            investimento, degradacao, reajuste_tarifa
+        )
+    ])
+    ano_inicio = datetime.now().year if ano_inicio is None else ano_inicio
+    t = np.arange(1, anos + 1)
+
+    # Degradação dos painéis e reajuste das tarifas ano a ano: (cenários, anos)
+    geracao = geracao_anual[..., None] * (1 - degradacao[..., None]) ** t
+    reajuste = (1 + reajuste_tarifa[..., None]) ** (t - 1)
+    economia = calcular_economia_lei14300(
+        geracao, tarifa_cheia[..., None] * reajuste, tarifa_fio_b[..., None] * reajuste,
+        simultaneidade_percent[..., None], ano=ano_inicio + t - 1
+    )['economia_reais']
+    return np.concatenate([-investimento[..., None], economia], axis=-1)
+
+def calcular_vpl(fluxos, taxa_desconto):
+    """Valor presente líquido de um ou vários vetores de fluxo de caixa"""
+    fluxos = np.asarray(fluxos, dtype=float)
+    t = np.arange(fluxos.shape[-1])
+    return (fluxos / (1 + np.asarray(taxa_desconto, dtype=float)[..., None]) ** t).sum(axis=-1)
+
+def calcular_tir(fluxos, tol=1e-9, max_iter=100):
+    """TIR de vários vetores de fluxo de caixa de uma vez (Newton com salvaguarda por bisseção).
+
+    Retorna NaN para os fluxos sem troca de sinal do VPL no intervalo (-99%, 1000%).
+    """
+    fluxos = np.asarray(fluxos, dtype=float)
+    forma = fluxos.shape[:-1]
+    fluxos = fluxos.reshape(-1, fluxos.shape[-1])
+    t = np.arange(fluxos.shape[-1])
+
+    def vpl_e_derivada(taxa):
+        desconto = (1 + taxa[:, None]) ** -t
+        vpl = (fluxos * desconto).sum(axis=1)
+        derivada = (-t * fluxos * desconto / (1 + taxa[:, None])).sum(axis=1)
+        return vpl, derivada
+
+    lo = np.full(len(fluxos), -0.99)
+    hi = np.full(len(fluxos), 10.0)
+    f_lo, _ = vpl_e_derivada(lo)
+    f_hi, _ = vpl_e_derivada(hi)
+    valido = np.sign(f_lo) * np.sign(f_hi) < 0
+
+    taxa = np.full(len(fluxos), 0.1)
+    for _ in range(max_iter):
+        f, df = vpl_e_derivada(taxa)
+        # Mantém o intervalo [lo, hi] com troca de sinal
+        lado_lo = np.sign(f) == np.sign(f_lo)
+        lo = np.where(lado_lo, taxa, lo)
+        f_lo = np.where(lado_lo, f, f_lo)
+        hi = np.where(lado_lo, hi, taxa)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            newton = taxa - f / df
+        fora = ~((newton > lo) & (newton < hi))
+        nova = np.where(fora, (lo + hi) / 2, newton)
+        convergiu = np.abs(nova - taxa) < tol
+        taxa = nova
+        if convergiu[valido].all():
+            break
+
+    return np.where(valido, taxa, np.nan).reshape(forma)
+
+def projetar_cenarios(geracao_anual, tarifa_cheia, tarifa_fio_b, simultaneidade_percent,
+                      investimento, degradacao=0.005, anos=VIDA_UTIL_ANOS, ano_inicio=None,
+                      reajuste_tarifa=0.0, taxa_desconto=0.0):
+    """Projeta vários cenários numa única chamada.
+
+    Cada parâmetro pode ser escalar ou array NumPy (com broadcasting). Retorna a
+    economia do 1º ano, payback (anos, interpolado), ROI no horizonte, VPL, TIR e o
+    fluxo de caixa acumulado de cada cenário, com shape (..., anos + 1).
+    """
+    fluxos = fluxo_caixa_lei14300(geracao_anual, tarifa_cheia, tarifa_fio_b, simultaneidade_percent,
+                                  investimento, degradacao, anos, ano_inicio, reajuste_tarifa)
+    fluxo = np.cumsum(fluxos, axis=-1)
+    investimento = -fluxos[..., 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        roi = np.where(investimento > 0, fluxo[..., -1] / investimento * 100, 0.0)
+
+    return {
+        'economia_ano1': fluxos[..., 1],
+        'payback': payback_do_fluxo(fluxo),
+        'roi': roi,
+        'vpl': calcular_vpl(fluxos, taxa_desconto),
+        'tir': calcular_tir(fluxos),
+        'fluxo_acumulado': fluxo,
+    }
+
+def sensibilidade_payback(base, variacao=0.2, anos=VIDA_UTIL_ANOS, **fixos):
+    """Payback com cada parâmetro variado ±variacao, para o gráfico de tornado"""
+    nomes = list(base)
+    n = len(nomes)
+    # Cenário 0 é a base; depois, para cada parâmetro, um cenário baixo e um alto
+    matriz = np.tile([base[nome] for nome in nomes], (2 * n + 1, 1)).astype(float)
+    for i, nome in enumerate(nomes):
+        matriz[1 + 2 * i, i] *= 1 - variacao
+        matriz[2 + 2 * i, i] *= 1 + variacao
+    coluna = dict(zip(nomes, matriz.T))
+    coluna['simultaneidade_percent'] = np.clip(coluna['simultaneidade_percent'], 0, 100)
+
+    payback = projetar_cenarios(anos=anos, **coluna, **fixos)['payback']
+    tornado = pd.DataFrame({
+        'Parâmetro': nomes,
+        'Baixo': payback[1::2],
+        'Alto': payback[2::2],
+    })
+    tornado['Amplitude'] = (tornado['Alto'] - tornado['Baixo']).abs()
+    return payback[0], tornado.sort_values('Amplitude', ascending=False).reset_index(drop=True)
+
+def indicadores_financeiros(geracao_anual, geracao_total, tarifa_cheia, tarifa_fio_b, simultaneidade_percent,
+                            investimento, degradacao=0.005, data_instalacao=None, reajuste_tarifa=0.0,
+                            taxa_desconto=0.0, anos=VIDA_UTIL_ANOS, hoje=None, ano=None):
+    """Indicadores da análise de viabilidade exibidos no painel.
+
+    geracao_anual é a geração do ano analisado (ano; padrão, o corrente) e geracao_total
+    a de todo o histórico, um total só ou {ano: kWh} para cobrar o Fio B de cada ano
+    como na exportação; degradação, reajuste e taxa de desconto em fração (0.05 = 5%).
+    """
+    hoje = datetime.now() if hoje is None else hoje
+    data_instalacao = hoje if data_instalacao is None else data_instalacao
+    ano = hoje.year if ano is None else ano
+
+    periodo = calcular_economia_lei14300(geracao_anual, tarifa_cheia, tarifa_fio_b, simultaneidade_percent, ano=ano)
+    economia = periodo['economia_reais']
+    payback_simples = investimento / economia if economia > 0 else 0
+    economia_vida_util = economia * anos
+    roi = ((economia_vida_util - investimento) / investimento) * 100 if investimento > 0 else 0
+
+    meses_funcionamento = max(1, (hoje.year - data_instalacao.year) * 12 + (hoje.month - data_instalacao.month))
+    por_ano = geracao_total if isinstance(geracao_total, dict) else {ano: geracao_total}
+    ja_economizado = float(np.sum(calcular_economia_lei14300(
+        np.asarray(list(por_ano.values()), dtype=float), tarifa_cheia, tarifa_fio_b, simultaneidade_percent,
+        ano=np.asarray(list(por_ano), dtype=int)
+    )['economia_reais']))
+
+    projecao = projetar_cenarios(geracao_anual, tarifa_cheia, tarifa_fio_b, simultaneidade_percent,
+                                 investimento, degradacao, anos,
+                                 ano_inicio=data_instalacao.year,
+                                 reajuste_tarifa=reajuste_tarifa,
+                                 taxa_desconto=taxa_desconto)
+    return {
+        'economia_reais': economia,
+        'taxa_paga': periodo['taxa_paga'],
+        'percentual_taxa': periodo['percentual_taxa'],
+        'payback_simples': payback_simples,
+        'economia_vida_util': economia_vida_util,
+        'roi': roi,
+        'ja_economizado': ja_economizado,
+        'percentual_recuperado': ja_economizado / investimento * 100 if investimento > 0 else 0,
+        'meses_funcionamento': meses_funcionamento,
+        'restante_payback': max(0, payback_simples - meses_funcionamento / 12),
+        'payback': float(projecao['payback']),
+        'vpl': float(projecao['vpl']),
+        'tir': float(projecao['tir']),
+        'fluxo_acumulado': projecao['fluxo_acumulado'],
+    }
+
+# — Exportação (CSV/Parquet) —
+EXPORT_LEVELS = ('diario', 'mensal', 'anual')
+
+def _economia_colunas(frame, total, ano, tarifa_cheia, tarifa_fio_b, simultaneidade_percent):
+    """Colunas de economia líquida e Fio B pago (Lei 14.300, percentual do ano de cada linha).
+
+    Arredonda tudo a 4 casas: o CSV sai com a representação curta dos floats, sem o
+    float_format do pandas, que formata valor a valor.
+    """
+    economia = calcular_economia_lei14300(np.asarray(total, dtype=float), tarifa_cheia, tarifa_fio_b,
+                                          simultaneidade_percent, ano=np.asarray(ano))
+    frame['Economia Líquida (R$)'] = economia['economia_reais']
+    frame['Fio B Pago (R$)'] = economia['taxa_paga']
+    return frame.round(dict.fromkeys(frame.select_dtypes('float').columns, 4))
+
+def export_chunks(cube, usina, nivel='diario', tarifa_cheia=0.9555, tarifa_fio_b=0.49, simultaneidade_percent=30):
+    """Linhas do relatório: no nível diário um DataFrame por ano, nos demais um só.
+
+    diario: cada dia com os acumulados e totais do mês e do ano; mensal: um mês por
+    linha; anual: um ano por linha. Todos os níveis trazem a economia da Lei 14.300.
+    """
+    if nivel not in EXPORT_LEVELS:
+        raise ValueError(f"Nível de exportação inválido: {nivel!r} (use {', '.join(EXPORT_LEVELS)})")
+    args = (tarifa_cheia, tarifa_fio_b, simultaneidade_percent)
+
+    if nivel == 'anual':
+        anos = sorted(cube.years)
+        if not anos:
+            return
+        stats = [cube.years[y] for y in anos]
+        frame = pd.DataFrame({
+            'Usina': usina,
+            'Ano': anos,
+            'Total (kWh)': [s['total'] for s in stats],
+            'Dias': [s['count'] for s in stats],
+            'Meses': [len(s['months']) for s in stats],
+            'Média Mensal (kWh)': [s['monthly_mean'] for s in stats],
+            'Melhor Mês': [s['best_month'] for s in stats],
+            'Pior Mês': [s['worst_month'] for s in stats],
+        })
+        yield _economia_colunas(frame, frame['Total (kWh)'], frame['Ano'], *args)
+        return
+
+    if nivel == 'mensal':
+        keys = sorted(cube.months)
+        if not keys:
+            return
+        stats = [cube.months[k] for k in keys]
+        frame = pd.DataFrame({
+            'Usina': usina,
+            'Ano': [y for y, _ in keys],
+            'Mês': [m for _, m in keys],
+            'Total (kWh)': [s['total'] for s in stats],
+            'Dias': [s['count'] for s in stats],
+            'Média Diária (kWh)': [s['mean'] for s in stats],
+        })
+        frame['Acumulado Anual (kWh)'] = frame.groupby('Ano')['Total (kWh)'].cumsum()
+        yield _economia_colunas(frame, frame['Total (kWh)'], frame['Ano'], *args)
+        return
+
+    for year in sorted(cube.years):
+        stats = cube.years[year]
+        days = cube.year_frame(year)
+        months = days['Data'].dt.month.to_numpy()
+        offsets = np.array([stats['offsets'][m] for m in months]) if len(days) else np.zeros(0)
+        frame = pd.DataFrame({
+            'Usina': usina,
+            'Data': days['Data'],
+            'Ano': year,
+            'Mês': months,
+            'Energia Gerada (kWh)': days['Energia Gerada (kWh)'],
+            'Acumulado Mensal (kWh)': days['Acumulado Anual'].to_numpy() - offsets,
+            'Acumulado Anual (kWh)': days['Acumulado Anual'],
+            'Total do Mês (kWh)': [cube.months[(year, m)]['total'] for m in months],
+            'Total do Ano (kWh)': stats['total'],
+        })
+        yield _economia_colunas(frame, frame['Energia Gerada (kWh)'], year, *args)
+
+def write_export(chunks, target, formato='csv'):
+    """Grava os blocos em `target` (caminho ou arquivo binário) à medida que são gerados.
+
+    CSV com cabeçalho só no primeiro bloco; Parquet com um row group por bloco (requer
+    pyarrow). Retorna o número de linhas gravadas.
+    """
+    if formato == 'parquet':
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Para exportar Parquet instale o pacote pyarrow (ou use CSV).")
+        writer, rows = None, 0
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(target, table.schema)
+                writer.write_table(table.cast(writer.schema))
+                rows += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows
+
+    if formato != 'csv':
+        raise ValueError(f"Formato de exportação inválido: {formato!r} (use csv ou parquet)")
+    if isinstance(target, (str, os.PathLike)):
+        with open(target, 'wb') as f:
+            return write_export(chunks, f, formato)
+    text = io.TextIOWrapper(target, encoding='utf-8', newline='')
+    rows, header = 0, True
+    try:
+        for chunk in chunks:
+            chunk.to_csv(text, header=header, index=False, date_format='%Y-%m-%d')
+            rows, header = rows + len(chunk), False
+    finally:
+        text.flush()
+        text.detach()    # devolve o arquivo binário aberto para quem chamou
+    return rows
+
+# — Simulação de Monte Carlo —
+MC_CHUNK = 500                 # caminhos sorteados por tarefa
+MC_PROCESS_THRESHOLD = 4000    # a partir daqui os lotes vão para um pool de processos
+
+def _bootstrap_geracao_anual(pools, n_caminhos, anos, seed):
+    """Geração anual sorteada (caminhos × anos) reamostrando dias históricos de cada mês"""
+    rng = np.random.default_rng(seed)
+    total = np.zeros((n_caminhos, anos))
+    for valores, dias in pools:
+        idx = rng.integers(0, len(valores), size=(n_caminhos, anos, dias))
+        total += valores[idx].sum(axis=-1)
+    return total
+
+def pools_mensais(cube):
+    """Dias históricos de cada mês do calendário (mês sem histórico usa todos os dias)"""
+    series = cube.series
+    todos = to_kwh(series.values[series.valid])
+    meses = series.calendar_months()[series.valid]
+    pools = []
+    for month in range(1, 13):
+        valores = todos[meses == month]
+        # Ano não bissexto de referência para a quantidade de dias
+        pools.append((valores if len(valores) else todos, pd.Timestamp(2001, month, 1).days_in_month))
+    return pools
+
+def simular_caminhos_geracao(pools, n_caminhos, anos, seed=42):
+    """Sorteia n_caminhos trajetórias de geração anual, em paralelo quando são muitas"""
+    tamanhos = [min(MC_CHUNK, n_caminhos - i) for i in range(0, n_caminhos, MC_CHUNK)]
+    seeds = np.random.SeedSequence(seed).spawn(len(tamanhos))
+    if n_caminhos >= MC_PROCESS_THRESHOLD:
+        # Nada de fork: o servidor tem threads (fila de escrita, revalidação, métricas) e um
+        # filho criado por fork herdaria travas presas por elas; forkserver/spawn partem limpos
+        metodo = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        try:
+            with ProcessPoolExecutor(mp_context=multiprocessing.get_context(metodo)) as pool:
+                partes = list(pool.map(
+                    _bootstrap_geracao_anual,
+                    [pools] * len(tamanhos), tamanhos, [anos] * len(tamanhos), seeds
+                ))
+            return np.concatenate(partes)
+        except Exception:
+            logger.warning("Monte Carlo: pool de processos (%s) indisponível, sorteando no processo atual",
+                           metodo, exc_info=True)
+    return np.concatenate([
+        _bootstrap_geracao_anual(pools, n, anos, sq) for n, sq in zip(tamanhos, seeds)
+    ])
+
+def faixas_monte_carlo(geracao, tarifa_cheia, tarifa_fio_b, simultaneidade_percent, investimento,
+                       degradacao, ano_inicio=None, reajuste_tarifa=0.0):
+    """Faixas P10/P50/P90 de payback e economia acumulada das trajetórias (caminhos × anos)"""
+    n_caminhos, anos = geracao.shape
+    ano_inicio = datetime.now().year if ano_inicio is None else ano_inicio
+    t = np.arange(1, anos + 1)
+    reajuste = (1 + reajuste_tarifa) ** (t - 1)
+    economia = calcular_economia_lei14300(
+        geracao * (1 - degradacao) ** t, tarifa_cheia * reajuste, tarifa_fio_b * reajuste,
+        simultaneidade_percent, ano=ano_inicio + t - 1
+    )['economia_reais']
+    fluxo = np.concatenate(
+        [np.full((n_caminhos, 1), -investimento), np.cumsum(economia, axis=1) - investimento], axis=1
+    )
+    payback = payback_do_fluxo(fluxo)
+    faixas = np.percentile(fluxo, [10, 50, 90], axis=0)
+    return {
+        'payback': dict(zip(('P10', 'P50', 'P90'), np.percentile(payback, [10, 50, 90], method='nearest'))),
+        'faixas': pd.DataFrame({
+            'Ano': np.arange(anos + 1), 'P10': faixas[0], 'P50': faixas[1], 'P90': faixas[2]
+        }),
+        'prob_payback': float(np.isfinite(payback).mean()),
+    }
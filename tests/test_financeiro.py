@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""Regra de transição do Fio B (Lei 14.300) e projeções que começam antes dela"""
+
+import numpy as np
+
+from datetime import datetime
+
+from solar_core import percentual_fio_b, fluxo_caixa_lei14300, indicadores_financeiros
+
+def test_fio_b_antes_de_2023_nao_e_cobrado():
+    assert percentual_fio_b([2021, 2022, 2023]).tolist() == [0.0, 0.0, 0.15]
+    assert percentual_fio_b(2022) == 0.0
+
+def test_fio_b_transicao_e_cobranca_integral():
+    assert percentual_fio_b([2028, 2029, 2040]).tolist() == [0.9, 1.0, 1.0]
+
+def test_projecao_de_instalacao_anterior_a_lei():
+    fluxo = fluxo_caixa_lei14300(5000.0, 1.0, 0.5, 30, 10000.0, degradacao=0.0, anos=4, ano_inicio=2021)
+    economia = fluxo[1:]
+    # 2021 e 2022 sem Fio B: economia cheia; 2023 já desconta 15% do Fio B sobre a injeção
+    assert np.allclose(economia[:2], 5000.0)
+    assert np.isclose(economia[2], 5000.0 - 3500 * 0.5 * 0.15)
+
+def test_indicadores_cobram_o_fio_b_do_ano_de_cada_geracao():
+    indicadores = indicadores_financeiros(1000.0, {2022: 1000.0, 2024: 1000.0}, 1.0, 0.5, 30, 10000.0,
+                                          data_instalacao=datetime(2022, 1, 1), hoje=datetime(2026, 6, 1),
+                                          ano=2024)
+    assert np.isclose(indicadores['percentual_taxa'], 30)
+    assert np.isclose(indicadores['economia_reais'], 1000.0 - 700 * 0.5 * 0.30)
+    assert np.isclose(indicadores['ja_economizado'], 1000.0 + 1000.0 - 700 * 0.5 * 0.30)
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""Leituras do inversor: separador decimal do arquivo e energia diária"""
+
+import numpy as np
+import pandas as pd
+
+from solar_core import IntradayStore, integrar_diario, parse_intraday_values
+
+def leituras_energia(valores, inicio='01/06/2024 10:00', passo_min=5):
+    instantes = pd.date_range(pd.to_datetime(inicio, dayfirst=True), periods=len(valores), freq=f'{passo_min}min')
+    return [[t.strftime('%d/%m/%Y %H:%M'), v] for t, v in zip(instantes, valores)]
+
+def test_energia_com_ponto_decimal_nao_vira_milhar():
+    df, descartadas = parse_intraday_values(['data', 'energia'], leituras_energia(['0.083', '0.125', '0.250']))
+    assert descartadas == 0
+    assert df['Energia (kWh)'].tolist() == [0.083, 0.125, 0.25]
+    assert np.allclose(df['Potência (kW)'], [0.996, 1.5, 3.0])
+
+def test_potencia_com_virgula_decimal_e_milhar():
+    rows = leituras_energia(['1.234,5', '0,5', '2'])
+    df, _ = parse_intraday_values(['data', 'potencia'], rows)
+    assert df['Potência (kW)'].tolist() == [1234.5, 0.5, 2.0]
+
+def test_separador_declarado():
+    df, _ = parse_intraday_values(['data', 'potencia'], leituras_energia(['1,500', '2,000']), decimal='.')
+    assert df['Potência (kW)'].tolist() == [1500.0, 2000.0]
+
+def test_energia_do_dia_e_a_soma_dos_intervalos():
+    df, _ = parse_intraday_values(['data', 'energia'], leituras_energia(['0.1', '0.2', '0.3', '0.4']))
+    diario = integrar_diario(df['Instante'], df['Potência (kW)'], energia=df['Energia (kWh)'])
+    assert diario['Energia Gerada (kWh)'].tolist() == [1.0]
+
+def test_potencia_segue_pelo_trapezio():
+    df, _ = parse_intraday_values(['data', 'potencia'], leituras_energia(['1'] * 5, passo_min=15))
+    diario = integrar_diario(df['Instante'], df['Potência (kW)'])
+    assert diario['Energia Gerada (kWh)'].tolist() == [1.0]
+
+def test_store_guarda_a_energia_do_intervalo(tmp_path):
+    store = IntradayStore(str(tmp_path / 'intraday.db'), 'Casa')
+    df, _ = parse_intraday_values(['data', 'energia'], leituras_energia(['0.1', '0.2', '0.3', '0.4']))
+    store.ingest(df)
+    assert store.daily_energy()['Energia Gerada (kWh)'].tolist() == [1.0]
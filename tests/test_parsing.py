@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""Leitura de números e linhas da planilha: separador decimal declarado ou decidido valor a valor"""
+
+import numpy as np
+
+from solar_core import decimal_separator, parse_br_numbers, parse_sheet_values
+
+def test_ponto_sem_virgula_e_decimal_quando_a_fonte_nao_declara():
+    assert parse_br_numbers(['0.125', '12.345', '2.500']).tolist() == [0.125, 12.345, 2.5]
+
+def test_padrao_brasileiro_com_virgula():
+    assert parse_br_numbers(['12,5', '1.234,5', '-1.234,5']).tolist() == [12.5, 1234.5, -1234.5]
+
+def test_milhar_com_ponto_so_em_fonte_pt_br():
+    assert parse_br_numbers(['12.345', '1.234', '0.125'], decimal=',').tolist() == [12345.0, 1234.0, 0.125]
+
+def test_milhar_com_virgula_em_fonte_com_ponto_decimal():
+    assert parse_br_numbers(['1,234', '1,234.5', '12,5'], decimal='.').tolist() == [1234.0, 1234.5, 12.5]
+
+def test_texto_invalido_vira_nan():
+    assert np.isnan(parse_br_numbers(['abc', '', '1.2.3'])).all()
+
+def test_separador_pela_localidade():
+    assert decimal_separator('pt_BR') == ','
+    assert decimal_separator('en_US') == '.'
+    assert decimal_separator('de_DE') is None
+    assert decimal_separator(None) is None
+
+def test_linhas_da_planilha_com_decimal_declarado():
+    rows = [['01/01/2024', '0.125'], ['02/01/2024', '12.345'], ['03/01/2024', '12,5']]
+    auto, _ = parse_sheet_values(['data', 'gerado'], rows)
+    pt_br, _ = parse_sheet_values(['data', 'gerado'], rows, decimal=',')
+    assert auto['Energia Gerada (kWh)'].tolist() == [0.125, 12.345, 12.5]
+    assert pt_br['Energia Gerada (kWh)'].tolist() == [0.125, 12345.0, 12.5]
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""Cubo de agregados: alterações dia a dia dão o mesmo resultado que reconstruir do zero"""
+
+import numpy as np
+import pandas as pd
+
+from solar_core import RollupCube
+
+def cubo(leituras):
+    return RollupCube(pd.DataFrame({'Data': list(leituras), 'Energia Gerada (kWh)': list(leituras.values())}))
+
+def test_alteracoes_incrementais_batem_com_a_reconstrucao():
+    rng = np.random.default_rng(7)
+    dias = pd.date_range('2023-03-10', '2024-02-01')
+    leituras = dict(zip(dias, rng.uniform(5, 30, len(dias)).round(2)))
+    cube = cubo(leituras)
+    for n in rng.integers(-400, 900, 500):
+        dia = pd.Timestamp('2023-01-01') + pd.Timedelta(days=int(n))
+        if n % 5 == 0:
+            cube.remove_day(dia)
+            leituras.pop(dia, None)
+        else:
+            leituras[dia] = round(float(n % 37) + 0.25, 2)
+            cube.set_day(dia, leituras[dia])
+    referencia = cubo(dict(sorted(leituras.items())))
+    assert cube.months.keys() == referencia.months.keys()
+    for chave, esperado in referencia.months.items():
+        obtido = cube.months[chave]
+        assert np.isclose(obtido['total'], esperado['total'])
+        assert (obtido['count'], obtido['max_date'], obtido['min_date']) == \
+            (esperado['count'], esperado['max_date'], esperado['min_date'])
+    assert np.isclose(cube.grand_total, referencia.grand_total)
+
+def test_dias_acrescentados_um_a_um_nao_realocam_a_cada_dia():
+    cube = cubo({pd.Timestamp('2024-01-01'): 10.0})
+    reservas = set()
+    for dia in pd.date_range('2024-01-02', '2026-12-31'):
+        cube.set_day(dia, 5.0)
+        reservas.add(id(cube.series._data))
+    assert len(reservas) <= 8
+    assert cube.series.count(cube.series.origin, cube.series.end) == 1096
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""Leitura de linhas avulsas da planilha: intervalos agrupados e em lotes limitados"""
+
+import solar_core
+from benchmarks.fake_sheet import FakeWorksheet
+from solar_core import GoogleSheetsBackend
+
+def planilha(n):
+    return FakeWorksheet([['data', 'gerado']] + [[f'{i:02d}/01/2024', f'{i},5'] for i in range(2, n + 1)])
+
+def test_linhas_espalhadas_vao_em_lotes(monkeypatch):
+    monkeypatch.setattr(solar_core, 'GSHEETS_BATCH_GET_MAX', 100)
+    ws = planilha(3000)
+    backend = GoogleSheetsBackend(ws, decimal=',')
+    rows = list(range(2, 1000, 2))     # 499 linhas isoladas: 499 intervalos
+    result = backend.get_rows(rows, 2)
+    assert ws.calls['batch_get'] == 5
+    assert result == {row: [f'{row:02d}/01/2024', f'{row},5'] for row in rows}
+
+def test_linhas_consecutivas_num_intervalo_so_com_vazias_e_inexistentes():
+    ws = planilha(20)
+    ws.values[9] = []                  # linha 10 vazia no meio do intervalo
+    backend = GoogleSheetsBackend(ws, decimal=',')
+    result = backend.get_rows([12, 9, 10, 11, 19, 20, 21, 22], 2)
+    assert ws.calls['batch_get'] == 1
+    assert result[10] == [] and result[21] == [] and result[22] == []
+    assert result[9] == ['09/01/2024', '9,5'] and result[20] == ['20/01/2024', '20,5']
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Controle de cota do Sheets contra a planilha falsa: espaçamento, novas tentativas e leituras coalescidas"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from gspread.exceptions import APIError
+
+from benchmarks.fake_sheet import FakeWorksheet
+from solar_core import GoogleSheetsBackend, IncrementalSheetSync, QuotaAwareWorksheet, SheetsQuota
+
+LINHAS = [['data', 'gerado']] + [[f'{d:02d}/{m:02d}/2024', f'{d},{m}'] for m in range(1, 13) for d in range(1, 29)]
+
+class Relogio:
+    """Relógio virtual: dormir só avança o tempo, então minutos de espera rodam na hora"""
+
+    def __init__(self):
+        self.t = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        return self.t
+
+    def sleep(self, seconds):
+        with self._lock:
+            self.t += seconds
+
+def aba(relogio, quota_per_min=None, error_rate=0.0, per_minute=60, burst=10):
+    ws = FakeWorksheet(LINHAS, quota_per_min=quota_per_min, error_rate=error_rate, seed=1, clock=relogio)
+    quota = SheetsQuota(per_minute=per_minute, burst=burst, clock=relogio, sleep=relogio.sleep)
+    return ws, quota, QuotaAwareWorksheet(ws, quota)
+
+def test_balde_espaca_as_chamadas_dentro_da_cota():
+    relogio = Relogio()
+    ws, quota, sheet = aba(relogio, quota_per_min=60)
+    for row in range(2, 202):
+        assert sheet.get(f'A{row}:B{row}') == [LINHAS[row - 1]]
+    assert not ws.rejected
+    assert quota.stats['novas_tentativas'] == 0
+    # 10 de rajada e o resto à reposição de 50 por minuto
+    assert relogio.t == pytest.approx(190 / 50 * 60, rel=0.01)
+
+def test_acima_da_cota_429_e_repetido_ate_passar():
+    relogio = Relogio()
+    ws, quota, sheet = aba(relogio, quota_per_min=60, per_minute=100000, burst=1000)
+    for row in range(2, 152):
+        assert sheet.get(f'A{row}:B{row}') == [LINHAS[row - 1]]
+    assert ws.rejected[429] > 0
+    assert quota.stats['novas_tentativas'] == ws.rejected[429]
+    assert ws.calls['get'] == 150 + ws.rejected[429]
+
+def test_leituras_com_503_sao_repetidas():
+    relogio = Relogio()
+    ws, quota, sheet = aba(relogio, error_rate=0.3, per_minute=6000, burst=100)
+    df = IncrementalSheetSync(GoogleSheetsBackend(sheet, decimal=',')).sync()
+    assert len(df) == len(LINHAS) - 1
+    assert ws.rejected[503] > 0
+    assert quota.stats['novas_tentativas'] == ws.rejected[503]
+
+def test_escrita_com_503_nao_e_repetida_e_com_429_e():
+    relogio = Relogio()
+    ws, quota, sheet = aba(relogio, error_rate=1.0)
+    with pytest.raises(APIError):
+        sheet.append_rows([['01/01/2030', '1,0']])
+    assert ws.calls['append_rows'] == 1
+    ws.error_rate, ws.quota_per_min = 0.0, 1
+    sheet.append_rows([['02/01/2030', '2,0']])
+    sheet.append_rows([['03/01/2030', '3,0']])
+    assert ws.rejected[429] > 0
+    assert ws.values[-2:] == [['02/01/2030', '2,0'], ['03/01/2030', '3,0']]
+
+def test_leituras_identicas_simultaneas_chegam_uma_vez():
+    ws = FakeWorksheet(LINHAS, latency=0.3)
+    quota = SheetsQuota()
+    sheet = QuotaAwareWorksheet(ws, quota)
+    with ThreadPoolExecutor(16) as pool:
+        results = list(pool.map(lambda _: sheet.get_all_values(), range(16)))
+    assert all(result == LINHAS for result in results)
+    assert ws.calls['get_all_values'] == 1
+    assert quota.stats['coalescidas'] == 15
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Fila de escrita: operações que falham saem da fila sem travar as seguintes"""
+
+import json
+import time
+
+import pytest
+
+import solar_core
+from solar_core import DatasetRevision, IncrementalSheetSync, SQLiteBackend, WriteBehindQueue
+
+@pytest.fixture(autouse=True)
+def sem_espera(monkeypatch):
+    monkeypatch.setattr(solar_core, 'WRITE_FLUSH_DELAY', 0)
+
+def append(date, value):
+    return {'op': 'append', 'values': [date, value], 'dates': [date]}
+
+def fila(tmp_path, storage=None):
+    storage = storage or SQLiteBackend(str(tmp_path / 'solar.db'))
+    sync = IncrementalSheetSync(storage)
+    sync.sync()
+    return storage, WriteBehindQueue(storage, sync, DatasetRevision(), str(tmp_path / 'pendentes.json'))
+
+def esperar(queue, timeout=10):
+    limite = time.monotonic() + timeout
+    while queue.pending() and time.monotonic() < limite:
+        time.sleep(0.05)
+    assert not queue.pending()
+
+def test_operacao_invalida_vai_para_falhas_e_as_outras_gravam(tmp_path):
+    storage, queue = fila(tmp_path)
+    queue.enqueue_many([append('01/01/2024', '1,0'), append('xx', '2,0'), append('03/01/2024', '3,0')])
+    esperar(queue)
+    assert storage.get_all_values()[1:] == [['01/01/2024', '1,0'], ['03/01/2024', '3,0']]
+    assert [falha['op']['dates'] for falha in queue.dead()] == [['xx']]
+    with open(tmp_path / 'pendentes.json', encoding='utf-8') as f:
+        assert json.load(f)['dead'][0]['op']['values'] == ['xx', '2,0']
+
+def test_falha_transitoria_tem_limite_de_tentativas(tmp_path, monkeypatch):
+    monkeypatch.setattr(solar_core, 'WRITE_MAX_ATTEMPTS', 2)
+    storage = SQLiteBackend(str(tmp_path / 'solar.db'))
+    monkeypatch.setattr(storage, 'append_rows', lambda rows: (_ for _ in ()).throw(OSError('rede fora')))
+    _, queue = fila(tmp_path, storage)
+    queue.enqueue(append('01/01/2024', '1,0'))
+    esperar(queue, timeout=15)
+    assert queue.dead()[0]['tentativas'] == 2
+    assert queue.dead()[0]['erro'] == 'rede fora'
+
+def test_reenfileirar_e_descartar_falhas(tmp_path):
+    storage, queue = fila(tmp_path)
+    queue.enqueue(append('xx', '2,0'))
+    esperar(queue)
+    assert queue.retry_dead(0) == 1
+    esperar(queue)
+    assert len(queue.dead()) == 1
+    queue.discard_dead()
+    assert queue.dead() == []
+
+def test_diario_antigo_em_lista(tmp_path):
+    with open(tmp_path / 'pendentes.json', 'w', encoding='utf-8') as f:
+        json.dump([append('05/01/2024', '5,0')], f)
+    storage, queue = fila(tmp_path)
+    esperar(queue)
+    assert storage.get_all_values()[1:] == [['05/01/2024', '5,0']]